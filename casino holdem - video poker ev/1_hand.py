@@ -83,6 +83,8 @@ def simulate_hand(hero_cards, flop_cards, evaluator, deck):
     villain_score = evaluator.evaluate(board, villain_cards)
     hero_class = evaluator.get_rank_class(hero_score)
     villain_qualifies = dealer_qualifies(board, villain_cards, evaluator)
+    # Showdown: 1 hero wins, 0 tie, -1 dealer wins
+    showdown = (hero_score < villain_score) - (hero_score > villain_score)
 
     ante_payout, bonus_payout = get_ante_bonus_payout(hero_class)
 
@@ -115,10 +117,10 @@ def simulate_hand(hero_cards, flop_cards, evaluator, deck):
             ante = 1  # Push on ante (1:1)
             play = 0  # Push on play
 
-    return ante, play, bonus
+    return ante, play, bonus, showdown, villain_qualifies
 
 
-def casino_holdem_simulation(hero_str, flop_str, simulations=10000):
+def casino_holdem_simulation(hero_str, flop_str, simulations=10000, evaluator=None):
     try:
         hero_cards = [parse_card(c) for c in hero_str.split()]
         flop_cards = [parse_card(c) for c in flop_str.split()]
@@ -130,18 +132,24 @@ def casino_holdem_simulation(hero_str, flop_str, simulations=10000):
         if len(set(card_strs)) != len(card_strs):
             raise ValueError("Duplicate cards detected.")
 
-        evaluator = Evaluator()
+        evaluator = evaluator or Evaluator()
         deck = create_deck_without_cards(all_cards)
 
         total_ante = 0
         total_play = 0
         total_bonus = 0
+        wins = 0
+        ties = 0
+        qualified = 0
 
         for _ in range(simulations):
-            ante, play, bonus = simulate_hand(hero_cards, flop_cards, evaluator, deck)
+            ante, play, bonus, showdown, villain_qualifies = simulate_hand(hero_cards, flop_cards, evaluator, deck)
             total_ante += ante
             total_play += play
             total_bonus += bonus
+            wins += showdown == 1
+            ties += showdown == 0
+            qualified += villain_qualifies
 
         avg_ante = total_ante / simulations
         avg_play = total_play / simulations
@@ -156,7 +164,12 @@ def casino_holdem_simulation(hero_str, flop_str, simulations=10000):
             'bonus_ev': avg_bonus,
             'call_ev': call_ev,
             'fold_ev': fold_ev,
-            'recommendation': 'CALL' if call_ev > fold_ev else 'FOLD'
+            'recommendation': 'CALL' if call_ev > fold_ev else 'FOLD',
+            # Showdown odds from the same deals, under this file's qualifier
+            'win_probability': wins / simulations,
+            'tie_probability': ties / simulations,
+            'loss_probability': (simulations - wins - ties) / simulations,
+            'dealer_qualify_probability': qualified / simulations
         }
 
     except Exception as e:
@@ -164,23 +177,30 @@ def casino_holdem_simulation(hero_str, flop_str, simulations=10000):
         raise e
 
 def main():
-    try:
-        hero_str = input("Enter your two hole cards (e.g., 'As Kd'):\n")
-        flop_str = input("Enter the three flop cards (e.g., '2c Jh 9s'):\n")
-
-        print("Running simulations... (this may take a few seconds)")
-        results = casino_holdem_simulation(hero_str, flop_str)
-
-        print("\n--- Simulation Results ---")
-        print(f"EV from Ante payout:  {results['ante_ev']:.4f}")
-        print(f"EV from Play decision: {results['play_ev']:.4f}")
-        print(f"EV from Bonus payout: {results['bonus_ev']:.4f}")
-        print(f"Total EV if Call:      {results['call_ev']:.4f}")
-        print(f"Total EV if Fold:      {results['fold_ev']:.4f}")
-        print(f"\nRecommendation: {results['recommendation']}")
-
-    except Exception as e:
-        print(f"Error: {e}")
+    # One hand after another until a blank line, with one evaluator
+    evaluator = Evaluator()
+    while True:
+        try:
+            hero_str = input("\nEnter your two hole cards (e.g., 'As Kd'), or a blank line to quit:\n")
+            if not hero_str.strip():
+                break
+            flop_str = input("Enter the three flop cards (e.g., '2c Jh 9s'):\n")
+
+            print("Running simulations... (this may take a few seconds)")
+            results = casino_holdem_simulation(hero_str, flop_str, evaluator=evaluator)
+
+            print("\n--- Simulation Results ---")
+            print(f"EV from Ante payout:  {results['ante_ev']:.4f}")
+            print(f"EV from Play decision: {results['play_ev']:.4f}")
+            print(f"EV from Bonus payout: {results['bonus_ev']:.4f}")
+            print(f"Total EV if Call:      {results['call_ev']:.4f}")
+            print(f"Total EV if Fold:      {results['fold_ev']:.4f}")
+            print(f"\nRecommendation: {results['recommendation']}")
+
+        except (EOFError, KeyboardInterrupt):
+            break
+        except Exception as e:
+            print(f"Error: {e}")
 
 if __name__ == "__main__":
     main()
@@ -1,6 +1,63 @@
 from treys import Card, Evaluator
+import bisect
+import math
+import itertools
 import random
 
+# Highest (worst) treys score in each hand class, best class first.  Classes
+# are numbered from the score directly so the payout tables below don't depend
+# on how a given treys release numbers its rank classes:
+# 1=Royal Flush, 2=Straight Flush, ... 8=Two Pair, 9=Pair, 10=High Card
+HAND_CLASS_MAX_SCORES = (1, 10, 166, 322, 1599, 1609, 2467, 3325, 6185, 7462)
+
+# treys orders one-pair scores by pair rank, aces first, 220 kicker combos each
+PAIR_SCORES_PER_RANK = 220
+PAIR_OF_ACES_MAX_SCORE = HAND_CLASS_MAX_SCORES[7] + PAIR_SCORES_PER_RANK
+# Pair of 4s or better (4s are the 11th pair rank counting down from aces)
+DEALER_QUALIFY_MAX_SCORE = HAND_CLASS_MAX_SCORES[7] + 11 * PAIR_SCORES_PER_RANK
+
+# Two-sided 95% normal quantile for the confidence intervals
+Z_95 = 1.959964
+
+# Quads or better: the hands importance sampling oversamples, in at most
+# this share of the draws
+RARE_HAND_CLASS = 3
+MAX_RARE_SHARE = 0.5
+
+HAND_FREQUENCY_NAMES = [
+    "Royal Flush",
+    "Straight Flush",
+    "Four of a Kind",
+    "Full House",
+    "Flush",
+    "Straight",
+    "Three of a Kind",
+    "Two Pair",
+    "Pair",
+    "Pair of Aces",
+    "High Card"
+]
+
+# Outcomes carry a hand code (an index into HAND_FREQUENCY_NAMES) instead of
+# the name; names are only looked up when the result dict is built
+HAND_CODE_BY_CLASS = [None, 0, 1, 2, 3, 4, 5, 6, 7, 8, 10]
+PAIR_OF_ACES_CODE = HAND_FREQUENCY_NAMES.index("Pair of Aces")
+
+# Every card once, rank major (2s 2h 2d 2c 3s ... Ac, as in exact_ev).  Bit i
+# of a card mask stands for FULL_DECK[i], so a set of known or dead cards is
+# a single int: exclusion is one AND and duplicates show up as lost bits.
+FULL_DECK = [Card.new(rank + suit) for rank in "23456789TJQKA" for suit in "shdc"]
+CARD_BITS = {card: 1 << i for i, card in enumerate(FULL_DECK)}
+
+def card_mask(cards):
+    mask = 0
+    for card in cards:
+        mask |= CARD_BITS[card]
+    return mask
+
+def mask_to_cards(mask):
+    return [card for i, card in enumerate(FULL_DECK) if mask >> i & 1]
+
 def print_card(card):
     return Card.int_to_str(card)
 
@@ -14,14 +71,11 @@ def parse_card(card_str):
     return Card.new(card_str)
 
 def create_deck_without_cards(excluded_cards):
-    full_deck = []
-    for rank in "23456789TJQKA":
-        for suit in "shdc":
-            card_str = f"{rank}{suit}"
-            card = Card.new(card_str)
-            if card not in excluded_cards:
-                full_deck.append(card)
-    return full_deck
+    dead = card_mask(excluded_cards)
+    return [card for i, card in enumerate(FULL_DECK) if not dead >> i & 1]
+
+def get_hand_class(score):
+    return bisect.bisect_left(HAND_CLASS_MAX_SCORES, score) + 1
 
 def get_ante_payout(rank_class):
     # Payouts for the ANTE bet (from the image)
@@ -50,22 +104,24 @@ def get_bonus_payout(rank_class, hero_cards, board):
         return 7
     elif rank_class == 7:  # Three of a Kind
         return 7
-    elif rank_class == 8:  # Pair (must be Aces)
+    elif rank_class == 8:  # Two Pair
+        return 7
+    elif rank_class == 9:  # Pair (must be Aces)
         hand = hero_cards + board
         ranks = [Card.get_rank_int(c) for c in hand]
-        if ranks.count(14) >= 2:
+        if ranks.count(12) >= 2:  # treys ranks run 0=2 .. 12=A
             return 7  # Pair of Aces to Straight
         else:
             return 0
-    elif rank_class == 9:
-        return 0
     return 0
 
 def dealer_qualifies(board, dealer_hand, evaluator):
     score = evaluator.evaluate(board, dealer_hand)
-    hand_class = evaluator.get_rank_class(score)
-    # Pair or better
+    hand_class = get_hand_class(score)
+    # Two pair or better always beats a pair of 4s
     if hand_class <= 8:
+        return True
+    if hand_class == 9:
         hand = dealer_hand + board
         ranks = [Card.get_rank_int(c) for c in hand]
         for rank, count in {r: ranks.count(r) for r in set(ranks)}.items():
@@ -83,27 +139,47 @@ def hand_name(rank_class, hero_cards, board):
         5: "Flush",
         6: "Straight",
         7: "Three of a Kind",
-        8: "Pair",
-        9: "High Card"
+        8: "Two Pair",
+        9: "Pair",
+        10: "High Card"
     }
-    if rank_class == 8:
+    if rank_class == 9:
         ranks = [Card.get_rank_int(c) for c in hero_cards + board]
-        if ranks.count(14) >= 2:
+        if ranks.count(12) >= 2:
             return "Pair of Aces"
     return names[rank_class]
 
-def simulate_hand(hero_cards, flop_cards, evaluator, deck):
-    villain_cards = random.sample(deck, 2)
-    remaining_deck = [c for c in deck if c not in villain_cards]
-    turn_river = random.sample(remaining_deck, 2)
+def hand_code(rank_class, score):
+    # hand_name as a code; one-pair scores run aces first, so a pair of aces
+    # shows in the score without looking at the cards
+    if rank_class == 9 and score <= PAIR_OF_ACES_MAX_SCORE:
+        return PAIR_OF_ACES_CODE
+    return HAND_CODE_BY_CLASS[rank_class]
+
+def simulate_hand(hero_cards, flop_cards, evaluator, deck, rng=None, sink=None):
+    # One draw of the four unknown cards: dealer first, then turn and river.
+    # Same distribution as drawing the dealer and then the board from what
+    # is left, without rebuilding the deck every trial.
+    cards = (rng or random).sample(deck, 4)
+    return score_deal(hero_cards, flop_cards, evaluator, cards[:2], cards[2:], sink)
+
+def score_deal(hero_cards, flop_cards, evaluator, villain_cards, turn_river, sink=None):
+    # sink, if given, is called with every deal and its scores before it is
+    # settled: sink(villain_cards, turn_river, hero_score, villain_score,
+    # villain_qualifies) (sample_trace.py records them this way)
     board = flop_cards + turn_river
 
     hero_score = evaluator.evaluate(board, hero_cards)
     villain_score = evaluator.evaluate(board, villain_cards)
-    hero_class = evaluator.get_rank_class(hero_score)
-    villain_class = evaluator.get_rank_class(villain_score)
-
     villain_qualifies = dealer_qualifies(board, villain_cards, evaluator)
+    if sink is not None:
+        sink(villain_cards, turn_river, hero_score, villain_score, villain_qualifies)
+    return settle_deal(hero_cards, board, hero_score, villain_score, villain_qualifies)
+
+def settle_deal(hero_cards, board, hero_score, villain_score, villain_qualifies):
+    # Payouts once both hands are scored; split out of score_deal so several
+    # hero hands can be settled against one dealer evaluation
+    hero_class = get_hand_class(hero_score)
     ante_payout = get_ante_payout(hero_class)
     bonus_payout = get_bonus_payout(hero_class, hero_cards, board)
     # -1 unit ante, -2 units play, -1 unit bonus are always risked if bet
@@ -137,71 +213,12 @@ def simulate_hand(hero_cards, flop_cards, evaluator, deck):
     else:
         bonus_result += 0  # just lose the bonus bet
 
-    return ante_result, play_result, bonus_result, hero_class, hand_name(hero_class, hero_cards, board)
-
-def casino_holdem_simulation(hero_str, flop_str, simulations=10000):
-    hero_cards = [parse_card(c) for c in hero_str.split()]
-    flop_cards = [parse_card(c) for c in flop_str.split()]
-    if len(hero_cards) != 2 or len(flop_cards) != 3:
-        raise ValueError("Enter 2 hole cards and 3 flop cards.")
-
-    all_cards = hero_cards + flop_cards
-    card_strs = [Card.int_to_str(c) for c in all_cards]
-    if len(set(card_strs)) != len(card_strs):
-        raise ValueError("Duplicate cards detected.")
-
-    evaluator = Evaluator()
-    deck = create_deck_without_cards(all_cards)
-
-    total_ante_net = 0
-    total_play_net = 0
-    total_bonus_net = 0
-
-    hand_frequencies = {
-        "Royal Flush": 0,
-        "Straight Flush": 0,
-        "Four of a Kind": 0,
-        "Full House": 0,
-        "Flush": 0,
-        "Straight": 0,
-        "Three of a Kind": 0,
-        "Two Pair": 0,
-        "Pair": 0,
-        "Pair of Aces": 0,
-        "High Card": 0
-    }
-
-    call_wins = 0
-    call_pushes = 0
-    call_losses = 0
-    bonus_win_count = 0
-    bonus_win_amount = 0
-
-    for _ in range(simulations):
-        ante_result, play_result, bonus_result, hero_class, hand_name_str = simulate_hand(hero_cards, flop_cards, evaluator, deck)
-        total_ante_net += ante_result
-        total_play_net += play_result
-        total_bonus_net += bonus_result
-
-        # Classify hand frequencies
-        if hand_name_str in hand_frequencies:
-            hand_frequencies[hand_name_str] += 1
-        elif hand_name_str == "Pair of Aces":
-            hand_frequencies["Pair of Aces"] += 1
-
-        # Call outcome stats
-        if ante_result + play_result > 0:
-            call_wins += 1
-        elif ante_result + play_result == 0:
-            call_pushes += 1
-        else:
-            call_losses += 1
-
-        # Bonus stats
-        if bonus_result > 0:
-            bonus_win_count += 1
-            bonus_win_amount += bonus_result
+    return ante_result, play_result, bonus_result, hero_class, hand_code(hero_class, hero_score)
 
+def summarize_results(total_ante_net, total_play_net, total_bonus_net, hand_frequencies,
+                      call_wins, call_pushes, call_losses,
+                      bonus_win_count, bonus_win_amount, simulations):
+    # Shared by every engine (sampled or exact) so they all return the same dict
     avg_ante_net = total_ante_net / simulations
     avg_play_net = total_play_net / simulations
     avg_bonus_net = total_bonus_net / simulations
@@ -238,58 +255,407 @@ def casino_holdem_simulation(hero_str, flop_str, simulations=10000):
         'bonus_recommendation': 'PLACE BONUS BET' if avg_bonus_net > -1 else 'SKIP BONUS BET'
     }
 
+def parse_hand(hero_str, flop_str):
+    hero_cards = [parse_card(c) for c in hero_str.split()]
+    flop_cards = [parse_card(c) for c in flop_str.split()]
+    if len(hero_cards) != 2 or len(flop_cards) != 3:
+        raise ValueError("Enter 2 hole cards and 3 flop cards.")
+
+    all_cards = hero_cards + flop_cards
+    if bin(card_mask(all_cards)).count("1") != len(all_cards):
+        raise ValueError("Duplicate cards detected.")
+    return hero_cards, flop_cards
+
+def new_totals():
+    # Raw integer tallies behind the result dict, so runs can be merged exactly
+    return {
+        'trials': 0, 'ante': 0, 'play': 0, 'bonus': 0,
+        'wins': 0, 'pushes': 0, 'losses': 0,
+        'bonus_wins': 0, 'bonus_amount': 0,
+        'ante_sq': 0, 'play_sq': 0, 'bonus_sq': 0, 'call_sq': 0,
+        'hand_frequencies': {name: 0 for name in HAND_FREQUENCY_NAMES}
+    }
+
+def merge_totals(totals, other):
+    for key, value in other.items():
+        if key == 'hand_frequencies':
+            for name, count in value.items():
+                totals[key][name] += count
+        else:
+            totals[key] += value
+    return totals
+
+def moment_sums(totals):
+    # (field, sum, sum of squares) for every EV that gets an error bar.
+    # Call minus fold is ante + play + 1 per trial, so it has the spread of
+    # ante + play (the 'call' tallies).
+    return [
+        ('ante', totals['ante'], totals['ante_sq']),
+        ('play', totals['play'], totals['play_sq']),
+        ('bonus', totals['bonus'], totals['bonus_sq']),
+        ('call_minus_fold', totals['ante'] + totals['play'], totals['call_sq']),
+    ]
+
+def results_from_totals(totals, exact=False):
+    # exact=True for full enumerations, which have no sampling error
+    results = summarize_results(totals['ante'], totals['play'], totals['bonus'], totals['hand_frequencies'],
+                                totals['wins'], totals['pushes'], totals['losses'],
+                                totals['bonus_wins'], totals['bonus_amount'], totals['trials'])
+    results['call_minus_fold'] = results['call_ev_with_bonus'] - results['fold_ev_with_bonus']
+    n = totals['trials']
+    for field, total, sq in moment_sums(totals):
+        mean = results['call_minus_fold' if field == 'call_minus_fold' else field + '_ev']
+        if exact or n < 2:
+            se = 0.0
+        else:
+            # Sample variance from the sums; they are exact integers for
+            # unweighted runs, so there is no cancellation to worry about
+            se = math.sqrt(max(sq - total * total / n, 0) / (n - 1) / n)
+        results[field + '_se'] = se
+        results[field + '_ci95'] = (mean - Z_95 * se, mean + Z_95 * se)
+    return results
+
+class OutcomeTally:
+    # Running tallies for a batch of trials: plain numbers plus a fixed-size
+    # list of hand counts indexed by hand code, so adding one trial allocates
+    # nothing and merging is a handful of additions.  to_totals() gives the
+    # totals dict every engine shares.
+    __slots__ = ('trials', 'ante', 'play', 'bonus', 'wins', 'pushes', 'losses',
+                 'bonus_wins', 'bonus_amount', 'ante_sq', 'play_sq', 'bonus_sq', 'call_sq', 'hand_counts')
+
+    def __init__(self):
+        self.trials = self.ante = self.play = self.bonus = 0
+        self.wins = self.pushes = self.losses = 0
+        self.bonus_wins = self.bonus_amount = 0
+        self.ante_sq = self.play_sq = self.bonus_sq = self.call_sq = 0
+        self.hand_counts = [0] * len(HAND_FREQUENCY_NAMES)
+
+    def merge(self, other):
+        for name in self.__slots__[:-1]:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.hand_counts = [a + b for a, b in zip(self.hand_counts, other.hand_counts)]
+        return self
+
+    def to_totals(self):
+        totals = {name: getattr(self, name) for name in self.__slots__[:-1]}
+        totals['hand_frequencies'] = dict(zip(HAND_FREQUENCY_NAMES, self.hand_counts))
+        return totals
+
+def count_outcomes(outcomes, simulations):
+    # The hot loop: locals only, the tally object is filled in at the end
+    total_ante_net = 0
+    total_play_net = 0
+    total_bonus_net = 0
+
+    hand_counts = [0] * len(HAND_FREQUENCY_NAMES)
+
+    call_wins = 0
+    call_pushes = 0
+    call_losses = 0
+    bonus_win_count = 0
+    bonus_win_amount = 0
+
+    # Running sums of squares, for the standard errors
+    ante_sq = 0
+    play_sq = 0
+    bonus_sq = 0
+    call_sq = 0
+
+    for ante_result, play_result, bonus_result, hero_class, code in outcomes:
+        total_ante_net += ante_result
+        total_play_net += play_result
+        total_bonus_net += bonus_result
+        call_result = ante_result + play_result
+        ante_sq += ante_result * ante_result
+        play_sq += play_result * play_result
+        bonus_sq += bonus_result * bonus_result
+        call_sq += call_result * call_result
+        hand_counts[code] += 1
+
+        # Call outcome stats
+        if call_result > 0:
+            call_wins += 1
+        elif call_result == 0:
+            call_pushes += 1
+        else:
+            call_losses += 1
+
+        # Bonus stats
+        if bonus_result > 0:
+            bonus_win_count += 1
+            bonus_win_amount += bonus_result
+
+    tally = OutcomeTally()
+    tally.trials = simulations
+    tally.ante, tally.play, tally.bonus = total_ante_net, total_play_net, total_bonus_net
+    tally.wins, tally.pushes, tally.losses = call_wins, call_pushes, call_losses
+    tally.bonus_wins, tally.bonus_amount = bonus_win_count, bonus_win_amount
+    tally.ante_sq, tally.play_sq, tally.bonus_sq, tally.call_sq = ante_sq, play_sq, bonus_sq, call_sq
+    tally.hand_counts = hand_counts
+    return tally
+
+def tally_outcomes(outcomes, simulations):
+    return count_outcomes(outcomes, simulations).to_totals()
+
+def run_simulations(hero_cards, flop_cards, simulations, evaluator=None, rng=None, sink=None):
+    # sink sees every deal, see score_deal
+    evaluator = evaluator or Evaluator()
+    rng = rng or random
+    deck = create_deck_without_cards(hero_cards + flop_cards)
+    outcomes = (simulate_hand(hero_cards, flop_cards, evaluator, deck, rng, sink) for _ in range(simulations))
+    return tally_outcomes(outcomes, simulations)
+
+def stratified_deals(deck, simulations, rng=None):
+    # Every turn/river pair is a stratum and gets the same number of dealer
+    # hands, drawn without replacement inside the stratum, so the plain
+    # average stays unbiased.  The hero's hand (and so the whole bonus bet)
+    # only depends on the turn/river, which takes its sampling noise out
+    # entirely.  With fewer trials than strata, a random subset of strata
+    # gets one dealer hand each.  Returns (trials, deals).
+    rng = rng or random
+    strata = list(itertools.combinations(deck, 2))
+    per_stratum = round(simulations / len(strata))
+    if per_stratum == 0:
+        strata = rng.sample(strata, simulations)
+        per_stratum = 1
+    dealer_pairs = list(itertools.combinations(range(len(deck) - 2), 2))
+    full, extra = divmod(per_stratum, len(dealer_pairs))
+
+    deck_mask = card_mask(deck)
+
+    def deals():
+        for turn_river in strata:
+            rest = mask_to_cards(deck_mask & ~card_mask(turn_river))
+            for i, j in dealer_pairs * full + rng.sample(dealer_pairs, extra):
+                yield [rest[i], rest[j]], list(turn_river)
+
+    return len(strata) * per_stratum, deals()
+
+def run_stratified_simulations(hero_cards, flop_cards, simulations, evaluator=None, rng=None):
+    evaluator = evaluator or Evaluator()
+    deck = create_deck_without_cards(hero_cards + flop_cards)
+    trials, deals = stratified_deals(deck, simulations, rng)
+    outcomes = (score_deal(hero_cards, flop_cards, evaluator, villain_cards, turn_river)
+                for villain_cards, turn_river in deals)
+    strata = math.comb(len(deck), 2)
+    per_stratum = trials // strata
+    if per_stratum < 2:
+        # One deal per stratum: no within-stratum spread to measure, so the
+        # plain (conservative) error bars are used
+        return tally_outcomes(outcomes, trials)
+
+    # Stratification removes the spread between turn/rivers from the
+    # estimate, so the error bars must only count the spread inside each
+    # stratum.  The squared sums are rewritten so results_from_totals'
+    # plain formula gives that stratified variance.
+    tally = OutcomeTally()
+    within = {field: 0 for field, _, _ in moment_sums(new_totals())}
+    for _ in range(strata):
+        part = count_outcomes(itertools.islice(outcomes, per_stratum), per_stratum)
+        for field, total, sq in (('ante', part.ante, part.ante_sq), ('play', part.play, part.play_sq),
+                                 ('bonus', part.bonus, part.bonus_sq),
+                                 ('call_minus_fold', part.ante + part.play, part.call_sq)):
+            within[field] += sq - total * total / per_stratum
+        tally.merge(part)
+    totals = tally.to_totals()
+    scale = (trials - 1) / (strata * (per_stratum - 1))
+    for (field, total, _), key in zip(moment_sums(totals), ('ante_sq', 'play_sq', 'bonus_sq', 'call_sq')):
+        totals[key] = total * total / trials + within[field] * scale
+    return totals
+
+def importance_deals(hero_cards, flop_cards, deck, simulations, evaluator, rng=None):
+    # Turn/rivers that give the hero quads or better pay 40-100x on the bonus
+    # but turn up a handful of times in 10k uniform draws.  The hero's bonus
+    # only depends on the turn/river, so scoring every one (1,081
+    # evaluations) gives each runout's bonus exactly, and the tail is drawn
+    # with the share that minimises the bonus variance for a two-way split
+    # (Neyman allocation: its probability times its RMS deviation from the
+    # mean bonus).  The tail is never drawn less often than under uniform
+    # sampling, nor more than MAX_RARE_SHARE of the time, since the rest of
+    # the runouts carry the ante and play spread.  Dealer hands are drawn
+    # uniformly, as in simulate_hand.  Returns the deals as (weight,
+    # villain_cards, turn_river), weight being p/q.
+    rng = rng or random
+    strata = list(itertools.combinations(deck, 2))
+    rare, common = [], []
+    bonuses = {}
+    for turn_river in strata:
+        board = flop_cards + list(turn_river)
+        hero_class = get_hand_class(evaluator.evaluate(board, hero_cards))
+        payout = get_bonus_payout(hero_class, hero_cards, board)
+        bonuses[turn_river] = payout if payout > 0 else -1
+        (rare if hero_class <= RARE_HAND_CLASS else common).append(turn_river)
+    rare_p = len(rare) / len(strata)
+    mean = sum(bonuses.values()) / len(strata)
+    rare_spread = sum((bonuses[t] - mean) ** 2 for t in rare)
+    common_spread = sum((bonuses[t] - mean) ** 2 for t in common)
+    # Summed over each group, so the sqrt is count * RMS deviation
+    rare_share = rare_p
+    if rare and common and rare_spread + common_spread > 0:
+        neyman = math.sqrt(rare_spread) / (math.sqrt(rare_spread) + math.sqrt(common_spread))
+        rare_share = min(max(neyman, rare_p), MAX_RARE_SHARE)
+    rare_weight = rare_p / rare_share if rare else 0.0
+    common_weight = (1 - rare_p) / (1 - rare_share)
+
+    deck_mask = card_mask(deck)
+    for _ in range(simulations):
+        if rng.random() < rare_share:
+            turn_river, weight = rng.choice(rare), rare_weight
+        else:
+            turn_river, weight = rng.choice(common), common_weight
+        rest = mask_to_cards(deck_mask & ~card_mask(turn_river))
+        yield weight, rng.sample(rest, 2), list(turn_river)
+
+def tally_weighted_outcomes(weighted_outcomes, simulations):
+    # count_outcomes with a weight per trial, self-normalised: every sum is
+    # rescaled by simulations / (sum of weights), so results_from_totals'
+    # averages are sum(w * x) / sum(w) and a quantity that never varies
+    # (a 100% bonus hit rate) comes back exact.  The squared sums are
+    # rewritten, as for stratified runs, so its plain formula gives the
+    # self-normalised estimator's (delta method) variance,
+    # sum(w^2 (x - mean)^2) / sum(w)^2.
+    tally = OutcomeTally()
+    hand_counts = tally.hand_counts
+    weight_sum = 0.0
+    weight_sq_sum = 0.0
+    # field -> [sum of w^2 x, sum of w^2 x^2]
+    spread = {'ante': [0.0, 0.0], 'play': [0.0, 0.0], 'bonus': [0.0, 0.0], 'call': [0.0, 0.0]}
+    ante_spread, play_spread, bonus_spread, call_spread = spread.values()
+    for weight, (ante_result, play_result, bonus_result, hero_class, code) in weighted_outcomes:
+        weight_sum += weight
+        weight_sq = weight * weight
+        weight_sq_sum += weight_sq
+        tally.ante += weight * ante_result
+        tally.play += weight * play_result
+        tally.bonus += weight * bonus_result
+        call_result = ante_result + play_result
+        for sums, x in ((ante_spread, ante_result), (play_spread, play_result),
+                        (bonus_spread, bonus_result), (call_spread, call_result)):
+            sums[0] += weight_sq * x
+            sums[1] += weight_sq * x * x
+        hand_counts[code] += weight
+        if call_result > 0:
+            tally.wins += weight
+        elif call_result == 0:
+            tally.pushes += weight
+        else:
+            tally.losses += weight
+        if bonus_result > 0:
+            tally.bonus_wins += weight
+            tally.bonus_amount += weight * bonus_result
+
+    scale = simulations / weight_sum if weight_sum else 0.0
+    for name in ('ante', 'play', 'bonus', 'wins', 'pushes', 'losses', 'bonus_wins', 'bonus_amount'):
+        setattr(tally, name, getattr(tally, name) * scale)
+    tally.hand_counts = [count * scale for count in hand_counts]
+    tally.trials = simulations
+    totals = tally.to_totals()
+    n = simulations
+    for (field, total, _), key in zip(moment_sums(totals), ('ante_sq', 'play_sq', 'bonus_sq', 'call_sq')):
+        w2x, w2x2 = spread['call' if field == 'call_minus_fold' else field]
+        mean = total / n
+        variance = (w2x2 - 2 * mean * w2x + mean * mean * weight_sq_sum) / weight_sum ** 2 if weight_sum else 0.0
+        totals[key] = total * total / n + max(variance, 0.0) * n * (n - 1)
+    # Kish's effective sample size: how many unweighted trials this is worth
+    effective = weight_sum ** 2 / weight_sq_sum if weight_sq_sum else 0
+    return totals, effective
+
+def run_importance_simulations(hero_cards, flop_cards, simulations, evaluator=None, rng=None):
+    evaluator = evaluator or Evaluator()
+    deck = create_deck_without_cards(hero_cards + flop_cards)
+    deals = importance_deals(hero_cards, flop_cards, deck, simulations, evaluator, rng)
+    outcomes = ((weight, score_deal(hero_cards, flop_cards, evaluator, villain_cards, turn_river))
+                for weight, villain_cards, turn_river in deals)
+    return tally_weighted_outcomes(outcomes, simulations)
+
+def casino_holdem_simulation(hero_str, flop_str, simulations=10000, sampling="uniform", evaluator=None, rng=None):
+    # sampling="stratified" spreads the trials evenly over turn/river pairs
+    # for a much lower variance, rounding to a whole number per pair (the
+    # results say how many ran, 'trials', against 'requested_trials');
+    # sampling="importance" oversamples quads-or-better runouts and adds
+    # the effective sample size to the results.  Pass an evaluator to reuse
+    # one across hands, and a random.Random(seed) for a repeatable run that
+    # leaves the random module's own state alone.
+    hero_cards, flop_cards = parse_hand(hero_str, flop_str)
+    if sampling == "stratified":
+        totals = run_stratified_simulations(hero_cards, flop_cards, simulations, evaluator, rng)
+        results = results_from_totals(totals)
+        results['trials'] = totals['trials']
+        results['requested_trials'] = simulations
+        return results
+    if sampling == "importance":
+        totals, effective = run_importance_simulations(hero_cards, flop_cards, simulations, evaluator, rng)
+        results = results_from_totals(totals)
+        results['effective_sample_size'] = effective
+        return results
+    if sampling != "uniform":
+        raise ValueError(f"Unknown sampling method: {sampling}")
+    return results_from_totals(run_simulations(hero_cards, flop_cards, simulations, evaluator, rng))
+
 def main():
-    try:
-        hero_str = input("Enter your two hole cards (e.g., 'As Kd'):\n")
-        flop_str = input("Enter the three flop cards (e.g., '2c Jh 9s'):\n")
-
-        print("Running simulations... (this may take a few seconds)")
-        results = casino_holdem_simulation(hero_str, flop_str)
-
-        print("\n--- Casino Hold'em Simulation Results ---")
-        print("\nExpected Values (per unit wagered):")
-        print(f"EV from Ante bet:          {results['ante_ev']:.4f} units")
-        print(f"EV from Play bet:          {results['play_ev']:.4f} units")
-        print(f"EV from Bonus bet:         {results['bonus_ev']:.4f} units")
-
-        print("\nStrategy Options:")
-        print(f"EV if Call with Bonus:     {results['call_ev_with_bonus']:.4f} units")
-        print(f"EV if Call without Bonus:  {results['call_ev_without_bonus']:.4f} units")
-        print(f"EV if Fold with Bonus:     {results['fold_ev_with_bonus']:.4f} units")
-        print(f"EV if Fold without Bonus:  {results['fold_ev_without_bonus']:.4f} units")
-
-        print("\nBonus Bet Analysis:")
-        print(f"Bonus Hit Rate:            {results['bonus_hit_rate']:.2f}%")
-        print(f"Average Bonus Win:         {results['bonus_average_win']:.2f} units")
-
-        print("\nOutcome Frequencies:")
-        print(f"Win percentage:            {results['win_pct']:.2f}%")
-        print(f"Push percentage:           {results['push_pct']:.2f}%")
-        print(f"Loss percentage:           {results['loss_pct']:.2f}%")
-
-        print("\nHand Frequencies:")
-        for hand, percentage in sorted(results['hand_percentages'].items(), 
-                                       key=lambda x: (
-                                           0 if x[0] == "Royal Flush" else
-                                           1 if x[0] == "Straight Flush" else
-                                           2 if x[0] == "Four of a Kind" else
-                                           3 if x[0] == "Full House" else
-                                           4 if x[0] == "Flush" else
-                                           5 if x[0] == "Straight" else
-                                           6 if x[0] == "Three of a Kind" else
-                                           7 if x[0] == "Two Pair" else
-                                           8 if x[0] == "Pair of Aces" else
-                                           9 if x[0] == "Pair" else
-                                           10)):
-            if percentage > 0:
-                print(f"  {hand + ':':20} {percentage:.2f}%")
-
-        print("\nRecommendations:")
-        print(f"Main Game: {results['recommendation']}")
-        print(f"Bonus Bet: {results['bonus_recommendation']}")
-
-    except Exception as e:
-        print(f"Error: {e}")
+    # One hand after another until a blank line, with one evaluator
+    evaluator = Evaluator()
+    while True:
+        try:
+            hero_str = input("\nEnter your two hole cards (e.g., 'As Kd'), or a blank line to quit:\n")
+            if not hero_str.strip():
+                break
+            flop_str = input("Enter the three flop cards (e.g., '2c Jh 9s'):\n")
+
+            print("Running simulations... (this may take a few seconds)")
+            results = casino_holdem_simulation(hero_str, flop_str, sampling="stratified", evaluator=evaluator)
+
+            print("\n--- Casino Hold'em Simulation Results ---")
+            if results['trials'] != results['requested_trials']:
+                print(f"Ran {results['trials']:,} trials ({results['requested_trials']:,} asked, rounded to "
+                      f"a whole number per turn/river)")
+            print("\nExpected Values (per unit wagered):")
+            print(f"EV from Ante bet:          {results['ante_ev']:.4f} units")
+            print(f"EV from Play bet:          {results['play_ev']:.4f} units")
+            print(f"EV from Bonus bet:         {results['bonus_ev']:.4f} units")
+            low, high = results['call_minus_fold_ci95']
+            print(f"Call minus Fold (95% CI):  {results['call_minus_fold']:.4f} units  [{low:.4f}, {high:.4f}]")
+
+            print("\nStrategy Options:")
+            print(f"EV if Call with Bonus:     {results['call_ev_with_bonus']:.4f} units")
+            print(f"EV if Call without Bonus:  {results['call_ev_without_bonus']:.4f} units")
+            print(f"EV if Fold with Bonus:     {results['fold_ev_with_bonus']:.4f} units")
+            print(f"EV if Fold without Bonus:  {results['fold_ev_without_bonus']:.4f} units")
+
+            print("\nBonus Bet Analysis:")
+            print(f"Bonus Hit Rate:            {results['bonus_hit_rate']:.2f}%")
+            print(f"Average Bonus Win:         {results['bonus_average_win']:.2f} units")
+
+            print("\nOutcome Frequencies:")
+            print(f"Win percentage:            {results['win_pct']:.2f}%")
+            print(f"Push percentage:           {results['push_pct']:.2f}%")
+            print(f"Loss percentage:           {results['loss_pct']:.2f}%")
+
+            print("\nHand Frequencies:")
+            for hand, percentage in sorted(results['hand_percentages'].items(), 
+                                           key=lambda x: (
+                                               0 if x[0] == "Royal Flush" else
+                                               1 if x[0] == "Straight Flush" else
+                                               2 if x[0] == "Four of a Kind" else
+                                               3 if x[0] == "Full House" else
+                                               4 if x[0] == "Flush" else
+                                               5 if x[0] == "Straight" else
+                                               6 if x[0] == "Three of a Kind" else
+                                               7 if x[0] == "Two Pair" else
+                                               8 if x[0] == "Pair of Aces" else
+                                               9 if x[0] == "Pair" else
+                                               10)):
+                if percentage > 0:
+                    print(f"  {hand + ':':20} {percentage:.2f}%")
+
+            print("\nRecommendations:")
+            print(f"Main Game: {results['recommendation']}")
+            print(f"Bonus Bet: {results['bonus_recommendation']}")
+
+        except (EOFError, KeyboardInterrupt):
+            break
+        except Exception as e:
+            print(f"Error: {e}")
 
 if __name__ == "__main__":
     main()
@@ -4,7 +4,15 @@ import os
 import threading
 import importlib.util
 import math
+import time
 from pygame.locals import *
+from treys import Evaluator
+
+import board_heatmap
+import decision_model
+import perf_overlay
+import query_log
+import range_grid
 
 # Dynamically import the 1_hand_bonus.py as 'hand_bonus'
 spec = importlib.util.spec_from_file_location("hand_bonus", "1_hand_bonus.py")
@@ -16,6 +24,10 @@ pygame.init()
 WINDOW_WIDTH = 1100
 WINDOW_HEIGHT = 750
 FPS = 60
+SIMULATIONS = 10000
+# Pre-warm budget for the exact answers of the most asked spots; kept short,
+# the warm-up shares the core with drawing
+PREWARM_SECONDS = 10
 CARD_WIDTH = 48
 CARD_HEIGHT = 70
 PADDING = 100
@@ -46,6 +58,18 @@ selected_cards = []
 results = None
 simulation_running = False
 animation_complete = False
+# Exact turn/river breakdown for the selected cards, drawn instead of the results while shown
+heatmap = None
+heatmap_running = False
+show_heatmap = False
+# Call/fold grid of every hole on the selected flop, filled in by a worker thread
+flop_range = None
+show_range = False
+# (spot, "CALL"/"FOLD"/None) from the distilled decision tree, shown as soon as 5 cards are picked
+decision = None
+
+# Trials done by the running simulation, for the F3 performance overlay
+progress = perf_overlay.JobProgress()
 
 class Button:
     def __init__(self, x, y, width, height, text, color, hover_color, text_color, font=FONT_MEDIUM, action=None):
@@ -165,13 +189,60 @@ def run_simulation():
     try:
         hero_cards = f"{selected_cards[0]} {selected_cards[1]}"
         flop_cards = f"{selected_cards[2]} {selected_cards[3]} {selected_cards[4]}"
-        results = hand_bonus.casino_holdem_simulation(hero_cards, flop_cards)
+        progress.start(SIMULATIONS)
+        spot = hand_bonus.parse_hand(hero_cards, flop_cards)
+        query_log.record("exact", (), *spot)
+        # A spot pre-warmed (or asked before) has its exact answer cached
+        cached = board_heatmap.exact_results(hero_cards, flop_cards, compute=False)
+        if cached is not None:
+            results = cached
+        else:
+            evaluator = perf_overlay.CountingEvaluator(Evaluator(), progress)
+            results = hand_bonus.casino_holdem_simulation(hero_cards, flop_cards, simulations=SIMULATIONS,
+                                                          sampling="stratified", evaluator=evaluator)
     except Exception as e:
         print(f"Error in simulation: {e}")
         results = {"error": str(e)}
+    progress.finish()
     simulation_running = False
     animation_complete = False
 
+def current_spot():
+    # (hero_str, flop_str) of the selected cards, or None
+    if len(selected_cards) != 5:
+        return None
+    return f"{selected_cards[0]} {selected_cards[1]}", f"{selected_cards[2]} {selected_cards[3]} {selected_cards[4]}"
+
+def run_heatmap(spot):
+    global heatmap, heatmap_running
+    try:
+        heatmap = board_heatmap.compute(*spot)
+    except Exception as e:
+        print(f"Error in heatmap: {e}")
+        heatmap = {"error": str(e), "spot": spot}
+    heatmap_running = False
+
+def distilled_decision():
+    # The decision tree's answer for the selected cards, looked up once per
+    # spot; None when there is no spot, no decision_table.py, or the tree
+    # leaves this spot to the simulation
+    global decision
+    spot = current_spot()
+    if spot is None:
+        return None
+    if decision is None or decision[0] != spot:
+        try:
+            answer = decision_model.lookup(*hand_bonus.parse_hand(*spot))
+        except Exception as e:
+            print(f"Error in decision table: {e}")
+            answer = None
+        decision = (spot, answer)
+    return decision[1]
+
+def heatmap_shown():
+    # The map is for the cards selected now (or still being computed)
+    return heatmap_running or (heatmap is not None and heatmap['spot'] == current_spot())
+
 def draw_loading_animation(surface, progress):
     center_x = WINDOW_WIDTH // 2
     center_y = WINDOW_HEIGHT // 2
@@ -201,10 +272,18 @@ def draw_results(surface):
     surface.blit(title_text, title_rect)
     y_pos = title_rect.bottom + 10
 
+    # Half-widths of the 95% intervals; CALL is only "sure" when the interval
+    # on call minus fold stays on one side of zero
+    def margin(field):
+        low, high = results[field + '_ci95']
+        return (high - low) / 2
+    low, high = results['call_minus_fold_ci95']
+    confidence = "95% sure" if low > 0 or high < 0 else "too close to call"
+
     txt = [
-        f"EV from Ante bet:    {results['ante_ev']:.4f} units",
-        f"EV from Play bet:    {results['play_ev']:.4f} units",
-        f"EV from Bonus bet:   {results['bonus_ev']:.4f} units",
+        f"EV from Ante bet:    {results['ante_ev']:.4f} ± {margin('ante'):.4f} units",
+        f"EV from Play bet:    {results['play_ev']:.4f} ± {margin('play'):.4f} units",
+        f"EV from Bonus bet:   {results['bonus_ev']:.4f} ± {margin('bonus'):.4f} units",
         f"EV if Call+Bonus:    {results['call_ev_with_bonus']:.4f} units",
         f"EV if Call only:     {results['call_ev_without_bonus']:.4f} units",
         f"EV if Fold+Bonus:    {results['fold_ev_with_bonus']:.4f} units",
@@ -212,7 +291,7 @@ def draw_results(surface):
         f"Bonus Hit Rate:      {results['bonus_hit_rate']:.2f}%",
         f"Avg Bonus Win:       {results['bonus_average_win']:.2f} units",
         f"Win/Push/Loss:       {results['win_pct']:.2f}% / {results['push_pct']:.2f}% / {results['loss_pct']:.2f}%",
-        f"Recommendation:      {results['recommendation']} | Bonus: {results['bonus_recommendation']}"
+        f"Recommendation:      {results['recommendation']} ({confidence}) | Bonus: {results['bonus_recommendation']}"
     ]
     for i, line in enumerate(txt):
         line_surf = FONT_TINY.render(line, True, BLACK)
@@ -226,6 +305,29 @@ def draw_results(surface):
         surface.blit(hsurf, (result_box.left + 35, y_hand))
         y_hand += 22
 
+def draw_heatmap(surface):
+    if not heatmap:
+        return
+    if "error" in heatmap:
+        error_text = FONT_MEDIUM.render(f"Error: {heatmap['error']}", True, RED)
+        surface.blit(error_text, error_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT - 150)))
+        return
+    board_heatmap.draw(surface, pygame.Rect(100, WINDOW_HEIGHT - 350, WINDOW_WIDTH - 200, 310), heatmap, FONT_TINY)
+
+def draw_flop_range(surface, mouse_pos):
+    if flop_range is None:
+        return
+    range_grid.draw(surface, pygame.Rect(100, WINDOW_HEIGHT - 350, WINDOW_WIDTH - 200, 310), flop_range, FONT_TINY,
+                    mouse_pos)
+
+def range_flop():
+    # The flop for the range grid: cards 3-5, or the only 3 cards picked
+    if len(selected_cards) == 5:
+        return selected_cards[2:]
+    if len(selected_cards) == 3:
+        return selected_cards
+    return None
+
 def main():
     global selected_cards, results, simulation_running, animation_complete
     screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
@@ -237,11 +339,17 @@ def main():
     simulate_button = Button(700, 90, 250, 52, "Run Simulation", GREEN, DARK_GREEN, WHITE, action=lambda: start_simulation(selector) if len(selected_cards) == 5 else None)
     clear_button = Button(700, 160, 250, 52, "Clear Cards", RED, (190, 0, 0), WHITE, action=lambda: clear_selection(selector))
     exit_button = ExitButton(700, 230, 250, 52)
+    heatmap_button = Button(700, 290, 250, 52, "Turn/River Map", BLUE, (0, 0, 160), WHITE, action=toggle_heatmap)
+    range_button = Button(30, 214, 190, 52, "Flop Range", BLUE, (0, 0, 160), WHITE, action=toggle_range)
+    overlay = perf_overlay.PerfOverlay(FONT_TINY, FPS)
+    query_log.enable()
+    query_log.start_prewarm(seconds=PREWARM_SECONDS, compute=board_heatmap.prewarm_compute)
     animation_frame = 0
     animation_speed = 0.1
     last_frame_time = 0
     running = True
     while running:
+        frame_start = time.perf_counter()
         current_time = pygame.time.get_ticks()
         mouse_pos = pygame.mouse.get_pos()
         for event in pygame.event.get():
@@ -252,29 +360,54 @@ def main():
             simulate_button.handle_event(event)
             clear_button.handle_event(event)
             exit_button.handle_event(event)
+            heatmap_button.handle_event(event)
+            range_button.handle_event(event)
+            overlay.handle_event(event)
         simulate_button.update(mouse_pos)
         clear_button.update(mouse_pos)
         exit_button.update(mouse_pos)
+        heatmap_button.update(mouse_pos)
+        range_button.update(mouse_pos)
         screen.fill(DARK_GREEN)
         title_text = FONT_TITLE.render("Casino Hold'em Bonus Analyzer", True, WHITE)
         screen.blit(title_text, (WINDOW_WIDTH // 2 - title_text.get_width() // 2, 20))
+        # A range grid on 3 picked cards shows them as the flop
+        flop_only = show_range and len(selected_cards) == 3
         for i, placeholder in enumerate(hero_placeholders):
-            if i < len(selected_cards):
+            if i < len(selected_cards) and not flop_only:
                 placeholder.draw(screen, selected_cards[i])
             else:
                 placeholder.draw(screen)
         for i, placeholder in enumerate(flop_placeholders):
-            if i + 2 < len(selected_cards):
+            if flop_only:
+                placeholder.draw(screen, selected_cards[i])
+            elif i + 2 < len(selected_cards):
                 placeholder.draw(screen, selected_cards[i + 2])
             else:
                 placeholder.draw(screen)
-        instruction_text = FONT_SMALL.render("Select 5 cards: 2 for your hand, 3 for the flop", True, WHITE)
+        instruction_text = FONT_SMALL.render("Select 5 cards: 2 for your hand, 3 for the flop (or just 3 for Flop Range; F3: perf overlay)", True, WHITE)
         screen.blit(instruction_text, (50, 320))
+        instant = distilled_decision()
+        if instant is not None:
+            instant_text = FONT_SMALL.render(f"Decision table: {instant}", True, GOLD)
+            screen.blit(instant_text, (250, 290))
         selector.draw(screen)
         simulate_button.draw(screen)
         clear_button.draw(screen)
         exit_button.draw(screen)
-        if simulation_running:
+        heatmap_button.draw(screen)
+        range_button.draw(screen)
+        if show_range:
+            draw_flop_range(screen, mouse_pos)
+        elif show_heatmap and heatmap_shown():
+            if heatmap_running:
+                if current_time - last_frame_time > animation_speed * 1000:
+                    animation_frame = (animation_frame + 1) % 100
+                    last_frame_time = current_time
+                draw_loading_animation(screen, animation_frame / 100)
+            else:
+                draw_heatmap(screen)
+        elif simulation_running:
             if current_time - last_frame_time > animation_speed * 1000:
                 animation_frame = (animation_frame + 1) % 100
                 last_frame_time = current_time
@@ -288,8 +421,10 @@ def main():
             draw_results(screen)
         elif results:
             draw_results(screen)
+        overlay.draw(screen, progress)
+        frame_ms = (time.perf_counter() - frame_start) * 1000
         pygame.display.flip()
-        clock.tick(FPS)
+        overlay.record(frame_ms, clock.tick(FPS))
     pygame.quit()
     sys.exit()
 
@@ -299,10 +434,49 @@ def start_simulation(selector):
         simulation_running = True
         threading.Thread(target=run_simulation).start()
 
+def toggle_heatmap():
+    global show_heatmap, heatmap_running, show_range
+    if show_heatmap and heatmap_shown():
+        show_heatmap = False
+    elif len(selected_cards) == 5:
+        show_heatmap = True
+        show_range = False
+        spot = current_spot()
+        if (heatmap is None or heatmap['spot'] != spot) and not heatmap_running:
+            heatmap_running = True
+            threading.Thread(target=run_heatmap, args=(spot,)).start()
+
+def toggle_range():
+    global flop_range, show_range, show_heatmap
+    if show_range:
+        show_range = False
+        return
+    flop = range_flop()
+    if flop is None:
+        return
+    flop_str = " ".join(flop)
+    if flop_range is None or flop_range.flop_str != flop_str:
+        if flop_range is not None:
+            flop_range.cancelled = True
+        try:
+            flop_range = range_grid.RangeGrid(flop_str)
+        except Exception as e:
+            print(f"Error in flop range: {e}")
+            return
+        threading.Thread(target=flop_range.run, daemon=True).start()
+    show_range = True
+    show_heatmap = False
+
 def clear_selection(selector):
-    global selected_cards, results, animation_complete
+    global selected_cards, results, animation_complete, heatmap, show_heatmap, flop_range, show_range
     selected_cards = []
     results = None
+    heatmap = None
+    show_heatmap = False
+    if flop_range is not None:
+        flop_range.cancelled = True
+    flop_range = None
+    show_range = False
     animation_complete = False
     for card in selector.cards:
         card.selected = False
@@ -1,9 +1,13 @@
 import pygame
 import sys
 import os
-from time import sleep
+from time import sleep, perf_counter
 import threading
 from pygame.locals import *
+from treys import Evaluator
+
+import board_heatmap
+import perf_overlay
 import importlib.util
 import math
 
@@ -29,6 +33,7 @@ pygame.init()
 WINDOW_WIDTH = 1000
 WINDOW_HEIGHT = 700
 FPS = 60
+SIMULATIONS = 10000
 CARD_WIDTH = 48  # Reduced to 2/5 of original size (120 * 0.4)
 CARD_HEIGHT = 70  # Reduced to 2/5 of original size (174 * 0.4)
 PADDING = 100
@@ -44,6 +49,7 @@ DARK_GREEN = (0, 100, 0)
 LIGHT_BLUE = (173, 216, 230)
 
 # Font setup
+FONT_TINY = pygame.font.Font(None, 17)
 FONT_SMALL = pygame.font.Font(None, 28)
 FONT_MEDIUM = pygame.font.Font(None, 36)
 FONT_LARGE = pygame.font.Font(None, 48)
@@ -63,6 +69,13 @@ card_slots = ["hero1", "hero2", "flop1", "flop2", "flop3"]
 results = None
 simulation_running = False
 animation_complete = False
+# Exact turn/river breakdown for the selected cards, drawn instead of the results while shown
+heatmap = None
+heatmap_running = False
+show_heatmap = False
+
+# Trials done by the running simulation, for the F3 performance overlay
+progress = perf_overlay.JobProgress()
 
 class Button:
     def __init__(self, x, y, width, height, text, color, hover_color, text_color, font=FONT_MEDIUM, action=None):
@@ -225,15 +238,40 @@ def run_simulation():
         flop_cards = f"{selected_cards[2]} {selected_cards[3]} {selected_cards[4]}"
         
         # Use the imported module to run the simulation
-        results = hand_analyzer.casino_holdem_simulation(hero_cards, flop_cards)
+        progress.start(SIMULATIONS)
+        evaluator = perf_overlay.CountingEvaluator(Evaluator(), progress)
+        # Prices the bets and counts the showdown odds over the same deals,
+        # all under 1_hand.py's rules
+        results = hand_analyzer.casino_holdem_simulation(hero_cards, flop_cards, simulations=SIMULATIONS,
+                                                         evaluator=evaluator)
         
     except Exception as e:
         print(f"Error in simulation: {e}")
         results = {"error": str(e)}
+    progress.finish()
     
     simulation_running = False
     animation_complete = False
 
+def current_spot():
+    # (hero_str, flop_str) of the selected cards, or None
+    if len(selected_cards) != 5:
+        return None
+    return f"{selected_cards[0]} {selected_cards[1]}", f"{selected_cards[2]} {selected_cards[3]} {selected_cards[4]}"
+
+def run_heatmap(spot):
+    global heatmap, heatmap_running
+    try:
+        heatmap = board_heatmap.compute(*spot)
+    except Exception as e:
+        print(f"Error in heatmap: {e}")
+        heatmap = {"error": str(e), "spot": spot}
+    heatmap_running = False
+
+def heatmap_shown():
+    # The map is for the cards selected now (or still being computed)
+    return heatmap_running or (heatmap is not None and heatmap['spot'] == current_spot())
+
 def draw_loading_animation(surface, progress):
     # Draw a circular loading animation
     center_x = WINDOW_WIDTH // 2
@@ -289,8 +327,11 @@ def draw_results(surface):
     call_ev_text = FONT_MEDIUM.render(f"EV of calling (3x): {results['call_ev']:.4f}", True, BLACK)
     fold_ev_text = FONT_MEDIUM.render(f"EV of folding: {results['fold_ev']:.4f}", True, BLACK)
     
+    qualify_text = FONT_MEDIUM.render(f"Dealer qualifies: {results['dealer_qualify_probability']:.4f}", True, BLACK)
+
     surface.blit(call_ev_text, (result_box.centerx + 20, y_pos))
     surface.blit(fold_ev_text, (result_box.centerx + 20, y_pos + 40))
+    surface.blit(qualify_text, (result_box.centerx + 20, y_pos + 80))
     
     # Draw recommendation
     rec_color = GREEN if results['recommendation'] == 'CALL' else RED
@@ -298,6 +339,22 @@ def draw_results(surface):
     rec_rect = rec_text.get_rect(centerx=result_box.centerx, bottom=result_box.bottom - 20)
     surface.blit(rec_text, rec_rect)
 
+def draw_heatmap(surface):
+    if not heatmap:
+        return
+
+    if "error" in heatmap:
+        error_text = FONT_MEDIUM.render(f"Error: {heatmap['error']}", True, RED)
+        error_rect = error_text.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT - 150))
+        surface.blit(error_text, error_rect)
+        return
+
+    # This window's EVs come from 1_hand.py; the map can only be priced
+    # exactly under the bonus variant's rules, so it says so
+    board_heatmap.draw(surface, pygame.Rect(100, WINDOW_HEIGHT - 280, WINDOW_WIDTH - 200, 220), heatmap, FONT_TINY,
+                       note="Priced under the bonus variant's rules (1_hand_bonus.py), not 1_hand.py's: "
+                            "can differ from this window's EVs")
+
 def main():
     global selected_cards, results, simulation_running, animation_complete
 
@@ -332,12 +389,20 @@ def main():
 
     exit_button = ExitButton(700, 230, 200, 50)
 
+    heatmap_button = Button(
+        700, 290, 200, 50, "Turn/River Map",
+        BLUE, (0, 0, 160), WHITE,
+        action=toggle_heatmap
+    )
+
+    overlay = perf_overlay.PerfOverlay(FONT_TINY, FPS)
     animation_frame = 0
     animation_speed = 0.1
     last_frame_time = 0
 
     running = True
     while running:
+        frame_start = perf_counter()
         current_time = pygame.time.get_ticks()
         mouse_pos = pygame.mouse.get_pos()
 
@@ -351,10 +416,13 @@ def main():
             simulate_button.handle_event(event)
             clear_button.handle_event(event)
             exit_button.handle_event(event)
+            heatmap_button.handle_event(event)
+            overlay.handle_event(event)
 
         simulate_button.update(mouse_pos)
         clear_button.update(mouse_pos)
         exit_button.update(mouse_pos)
+        heatmap_button.update(mouse_pos)
 
         screen.fill(DARK_GREEN)
 
@@ -373,7 +441,7 @@ def main():
             else:
                 placeholder.draw(screen)
 
-        instruction_text = FONT_SMALL.render("Select 5 cards: 2 for your hand, 3 for the flop", True, WHITE)
+        instruction_text = FONT_SMALL.render("Select 5 cards: 2 for your hand, 3 for the flop (F3: perf overlay)", True, WHITE)
         screen.blit(instruction_text, (50, 320))
 
         selector.draw(screen)
@@ -381,8 +449,18 @@ def main():
         simulate_button.draw(screen)
         clear_button.draw(screen)
         exit_button.draw(screen)
-
-        if simulation_running:
+        heatmap_button.draw(screen)
+
+        if show_heatmap and heatmap_shown():
+            # The exact breakdown replaces the results panel while shown
+            if heatmap_running:
+                if current_time - last_frame_time > animation_speed * 1000:
+                    animation_frame = (animation_frame + 1) % 100
+                    last_frame_time = current_time
+                draw_loading_animation(screen, animation_frame / 100)
+            else:
+                draw_heatmap(screen)
+        elif simulation_running:
             if current_time - last_frame_time > animation_speed * 1000:
                 animation_frame = (animation_frame + 1) % 100
                 last_frame_time = current_time
@@ -397,8 +475,10 @@ def main():
         elif results:
             draw_results(screen)
 
+        overlay.draw(screen, progress)
+        frame_ms = (perf_counter() - frame_start) * 1000
         pygame.display.flip()
-        clock.tick(FPS)
+        overlay.record(frame_ms, clock.tick(FPS))
 
     pygame.quit()
     sys.exit()
@@ -410,10 +490,23 @@ def start_simulation(selector):
         simulation_running = True
         threading.Thread(target=run_simulation).start()
 
+def toggle_heatmap():
+    global show_heatmap, heatmap_running
+    if show_heatmap and heatmap_shown():
+        show_heatmap = False
+    elif len(selected_cards) == 5:
+        show_heatmap = True
+        spot = current_spot()
+        if (heatmap is None or heatmap['spot'] != spot) and not heatmap_running:
+            heatmap_running = True
+            threading.Thread(target=run_heatmap, args=(spot,)).start()
+
 def clear_selection(selector):
-    global selected_cards, results, animation_complete
+    global selected_cards, results, animation_complete, heatmap, show_heatmap
     selected_cards = []
     results = None
+    heatmap = None
+    show_heatmap = False
     animation_complete = False
     for card in selector.cards:
         card.selected = False
@@ -0,0 +1,368 @@
+import argparse
+import random
+import time
+
+from module_loader import load_hand_bonus
+import engines
+import exact_ev
+
+try:
+    import numpy as np
+    from vectorized_eval import COMBINATIONS
+except ImportError:
+    np = None
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+#   Compute backends for the sampling inner loop (deal, evaluate, qualify,
+#   pay out).  Every backend is called as
+#
+#       backend(hero_cards, flop_cards, simulations, seed)
+#
+#   and returns the totals dict from 1_hand_bonus.py, so merge_totals and
+#   results_from_totals work the same on all of them.
+#
+#   python  1_hand_bonus.run_simulations, the reference loop
+#   numpy   engines.sample_totals_numpy, scored in batches
+#   numba   a compiled per-trial loop over the treys lookup tables
+#           (pip install numba)
+#
+#   Backends whose packages are missing are simply not registered.
+#   get_backend() times a short run on each one and keeps the fastest.
+#
+#   casino_holdem_equity is the cut-down query for callers that only need
+#   the showdown odds: win/tie/loss against the dealer and how often the
+#   dealer qualifies, with no payouts, hand names or bonus.  It enumerates
+#   exactly when exact_ev already has the flop's dealer scores for the hole
+#   (a few ms), and otherwise samples on the fastest backend, each of which
+#   has a scores-only twin in EQUITY_BACKENDS returning (win, tie, loss,
+#   dealer qualified) counts.
+#
+#   run with
+#
+#   python3 backends.py --simulations 20000
+
+hand_bonus = load_hand_bonus()
+
+# Spot used to time the backends against each other
+SELECTION_SPOT = ("As Kd", "2c Jh 9s")
+
+_selected = None
+
+def python_equity(hero_cards, flop_cards, simulations, seed=None):
+    rng = random.Random(seed)
+    evaluator = exact_ev.get_evaluator()
+    deck = hand_bonus.create_deck_without_cards(hero_cards + flop_cards)
+    qualify_max = hand_bonus.DEALER_QUALIFY_MAX_SCORE
+    win = tie = qualified = 0
+    for _ in range(simulations):
+        cards = rng.sample(deck, 4)
+        board = flop_cards + cards[2:]
+        hero_score = evaluator.evaluate(board, hero_cards)
+        dealer_score = evaluator.evaluate(board, cards[:2])
+        win += hero_score < dealer_score
+        tie += hero_score == dealer_score
+        qualified += dealer_score <= qualify_max
+    return win, tie, simulations - win - tie, qualified
+
+def numpy_equity(hero_cards, flop_cards, simulations, seed=None):
+    hero_scores, dealer_scores = engines.sample_scores_numpy(hero_cards, flop_cards, simulations,
+                                                             np.random.default_rng(seed))
+    win = int((hero_scores < dealer_scores).sum())
+    tie = int((hero_scores == dealer_scores).sum())
+    qualified = int((dealer_scores <= hand_bonus.DEALER_QUALIFY_MAX_SCORE).sum())
+    return win, tie, simulations - win - tie, qualified
+
+def python_totals(hero_cards, flop_cards, simulations, seed=None):
+    rng = random.Random(seed) if seed is not None else None
+    return hand_bonus.run_simulations(hero_cards, flop_cards, simulations, exact_ev.get_evaluator(), rng)
+
+def numpy_totals(hero_cards, flop_cards, simulations, seed=None):
+    return engines.sample_totals_numpy(hero_cards, flop_cards, simulations, np.random.default_rng(seed))
+
+if numba is not None:
+    @numba.njit(cache=True)
+    def _score7(cards, combos, flush_keys, flush_scores, unsuited_keys, unsuited_scores):
+        # Best (lowest) treys score over the 21 five-card subsets, as in
+        # VectorEvaluator but one hand at a time
+        best = 7462
+        for i in range(combos.shape[0]):
+            c0 = cards[combos[i, 0]]
+            c1 = cards[combos[i, 1]]
+            c2 = cards[combos[i, 2]]
+            c3 = cards[combos[i, 3]]
+            c4 = cards[combos[i, 4]]
+            product = (c0 & 0xFF) * (c1 & 0xFF) * (c2 & 0xFF) * (c3 & 0xFF) * (c4 & 0xFF)
+            if c0 & c1 & c2 & c3 & c4 & 0xF000:
+                score = flush_scores[np.searchsorted(flush_keys, product)]
+            else:
+                score = unsuited_scores[np.searchsorted(unsuited_keys, product)]
+            if score < best:
+                best = score
+        return best
+
+    @numba.njit(cache=True)
+    def _score_deal(cards, dealer0, dealer1, tables, paytables, sums):
+        # cards holds flop, turn, river, hero; scores the hero, then swaps
+        # the dealer in.  Same payouts as score_deal/totals_from_scores.
+        combos, flush_keys, flush_scores, unsuited_keys, unsuited_scores = tables
+        class_max, ante_by_class, bonus_by_class, code_by_class, constants = paytables
+        pair_of_aces_max, pair_of_aces_bonus, pair_of_aces_code, qualify_max = constants
+
+        hero_score = _score7(cards, combos, flush_keys, flush_scores, unsuited_keys, unsuited_scores)
+        hero0 = cards[5]
+        hero1 = cards[6]
+        cards[5] = dealer0
+        cards[6] = dealer1
+        dealer_score = _score7(cards, combos, flush_keys, flush_scores, unsuited_keys, unsuited_scores)
+        cards[5] = hero0
+        cards[6] = hero1
+
+        hand_class = np.searchsorted(class_max, hero_score) + 1
+        aces = hand_class == 9 and hero_score <= pair_of_aces_max
+        bonus = pair_of_aces_bonus if aces else bonus_by_class[hand_class]
+        if bonus <= 0:
+            bonus = -1
+        qualifies = dealer_score <= qualify_max
+        if hero_score < dealer_score:
+            ante = ante_by_class[hand_class]
+            play = 2 if qualifies else 0
+        elif hero_score == dealer_score:
+            ante = 0
+            play = 0
+        elif qualifies:
+            ante = -1
+            play = -2
+        else:
+            ante = ante_by_class[hand_class]
+            play = 0
+        call = ante + play
+
+        # Same order as the totals dict: trials, ante, play, bonus, wins,
+        # pushes, losses, bonus_wins, bonus_amount, ante_sq, play_sq,
+        # bonus_sq, call_sq, then the hand counts
+        sums[0] += 1
+        sums[1] += ante
+        sums[2] += play
+        sums[3] += bonus
+        if call > 0:
+            sums[4] += 1
+        elif call == 0:
+            sums[5] += 1
+        else:
+            sums[6] += 1
+        if bonus > 0:
+            sums[7] += 1
+            sums[8] += bonus
+        sums[9] += ante * ante
+        sums[10] += play * play
+        sums[11] += bonus * bonus
+        sums[12] += call * call
+        sums[13 + (pair_of_aces_code if aces else code_by_class[hand_class])] += 1
+
+    @numba.njit(cache=True)
+    def _deal_sums(base, dealer, turn_river, tables, paytables, sums):
+        cards = base.copy()
+        for i in range(dealer.shape[0]):
+            cards[3] = turn_river[i, 0]
+            cards[4] = turn_river[i, 1]
+            _score_deal(cards, dealer[i, 0], dealer[i, 1], tables, paytables, sums)
+
+    @numba.njit(cache=True)
+    def _sample_sums(base, deck, simulations, seed, tables, paytables, sums):
+        # Partial Fisher-Yates: the first four slots of the shuffled deck are
+        # the dealer's two cards, then turn and river.  np.random here is
+        # numba's own generator, not NumPy's global one, and every call
+        # seeds it (numba_totals draws a fresh seed when none is given)
+        np.random.seed(seed)
+        deck = deck.copy()
+        cards = base.copy()
+        n = deck.shape[0]
+        for _ in range(simulations):
+            for j in range(4):
+                k = np.random.randint(j, n)
+                deck[j], deck[k] = deck[k], deck[j]
+            cards[3] = deck[2]
+            cards[4] = deck[3]
+            _score_deal(cards, deck[0], deck[1], tables, paytables, sums)
+
+    @numba.njit(cache=True)
+    def _sample_equity(base, deck, simulations, seed, tables, qualify_max, counts):
+        # _sample_sums' deals, keeping only win/tie/loss and qualification
+        combos, flush_keys, flush_scores, unsuited_keys, unsuited_scores = tables
+        np.random.seed(seed)
+        deck = deck.copy()
+        cards = base.copy()
+        n = deck.shape[0]
+        for _ in range(simulations):
+            for j in range(4):
+                k = np.random.randint(j, n)
+                deck[j], deck[k] = deck[k], deck[j]
+            cards[3] = deck[2]
+            cards[4] = deck[3]
+            cards[5] = base[5]
+            cards[6] = base[6]
+            hero_score = _score7(cards, combos, flush_keys, flush_scores, unsuited_keys, unsuited_scores)
+            cards[5] = deck[0]
+            cards[6] = deck[1]
+            dealer_score = _score7(cards, combos, flush_keys, flush_scores, unsuited_keys, unsuited_scores)
+            if hero_score < dealer_score:
+                counts[0] += 1
+            elif hero_score == dealer_score:
+                counts[1] += 1
+            else:
+                counts[2] += 1
+            if dealer_score <= qualify_max:
+                counts[3] += 1
+
+_numba_args = None
+
+def _kernel_args():
+    # Lookup tables and paytables as the arrays the kernels take, built once
+    global _numba_args
+    if _numba_args is None:
+        vec = exact_ev.get_vector_evaluator()
+        tables = (COMBINATIONS[7], vec.flush_keys, vec.flush_scores,
+                  vec.unsuited_keys, vec.unsuited_scores)
+        constants = (hand_bonus.PAIR_OF_ACES_MAX_SCORE, exact_ev.PAIR_OF_ACES_BONUS,
+                     hand_bonus.PAIR_OF_ACES_CODE, hand_bonus.DEALER_QUALIFY_MAX_SCORE)
+        paytables = (np.array(hand_bonus.HAND_CLASS_MAX_SCORES, dtype=np.int64),
+                     np.array(engines.ANTE_BY_CLASS, dtype=np.int64),
+                     np.array(exact_ev.BONUS_BY_CLASS, dtype=np.int64),
+                     np.array(engines.NAME_INDEX_BY_CLASS, dtype=np.int64), constants)
+        _numba_args = tables, paytables
+    return _numba_args
+
+def _base_cards(hero_cards, flop_cards):
+    # Turn and river (slots 3 and 4) are filled in per deal
+    return np.array(flop_cards + [0, 0] + hero_cards, dtype=np.int64)
+
+def _totals_from_sums(sums):
+    fields = ['trials', 'ante', 'play', 'bonus', 'wins', 'pushes', 'losses', 'bonus_wins', 'bonus_amount',
+              'ante_sq', 'play_sq', 'bonus_sq', 'call_sq']
+    totals = {field: int(value) for field, value in zip(fields, sums)}
+    totals['hand_frequencies'] = {name: int(count) for name, count in
+                                  zip(hand_bonus.HAND_FREQUENCY_NAMES, sums[len(fields):])}
+    return totals
+
+def _new_sums():
+    return np.zeros(13 + len(hand_bonus.HAND_FREQUENCY_NAMES), dtype=np.int64)
+
+def numba_deal_totals(hero_cards, flop_cards, deals):
+    # Scores given (dealer, turn_river) deals, for the equivalence gate
+    tables, paytables = _kernel_args()
+    dealer = np.array([d for d, _ in deals], dtype=np.int64).reshape(-1, 2)
+    turn_river = np.array([tr for _, tr in deals], dtype=np.int64).reshape(-1, 2)
+    sums = _new_sums()
+    _deal_sums(_base_cards(hero_cards, flop_cards), dealer, turn_river, tables, paytables, sums)
+    return _totals_from_sums(sums)
+
+def numba_totals(hero_cards, flop_cards, simulations, seed=None):
+    tables, paytables = _kernel_args()
+    if seed is None:
+        seed = random.SystemRandom().getrandbits(32)
+    deck = np.array(hand_bonus.create_deck_without_cards(hero_cards + flop_cards), dtype=np.int64)
+    sums = _new_sums()
+    _sample_sums(_base_cards(hero_cards, flop_cards), deck, simulations, seed % 2 ** 32, tables, paytables, sums)
+    return _totals_from_sums(sums)
+
+def numba_equity(hero_cards, flop_cards, simulations, seed=None):
+    tables, _ = _kernel_args()
+    if seed is None:
+        seed = random.SystemRandom().getrandbits(32)
+    deck = np.array(hand_bonus.create_deck_without_cards(hero_cards + flop_cards), dtype=np.int64)
+    counts = np.zeros(4, dtype=np.int64)
+    _sample_equity(_base_cards(hero_cards, flop_cards), deck, simulations, seed % 2 ** 32, tables,
+                   hand_bonus.DEALER_QUALIFY_MAX_SCORE, counts)
+    return tuple(int(c) for c in counts)
+
+BACKENDS = {'python': python_totals}
+EQUITY_BACKENDS = {'python': python_equity}
+if np is not None:
+    BACKENDS['numpy'] = numpy_totals
+    EQUITY_BACKENDS['numpy'] = numpy_equity
+    if numba is not None:
+        BACKENDS['numba'] = numba_totals
+        EQUITY_BACKENDS['numba'] = numba_equity
+
+def available_backends():
+    return list(BACKENDS)
+
+def time_backend(name, simulations=2000):
+    # Seconds per trial on SELECTION_SPOT, after one warm-up call that pays
+    # for tables and (for numba) compilation
+    hero_cards, flop_cards = hand_bonus.parse_hand(*SELECTION_SPOT)
+    backend = BACKENDS[name]
+    backend(hero_cards, flop_cards, 100, 0)
+    start = time.perf_counter()
+    backend(hero_cards, flop_cards, simulations, 1)
+    return (time.perf_counter() - start) / simulations
+
+def select_backend(simulations=2000):
+    global _selected
+    timings = {name: time_backend(name, simulations) for name in BACKENDS}
+    _selected = min(timings, key=timings.get)
+    return _selected, timings
+
+def get_backend():
+    # Name of the fastest available backend, measured on first use
+    if _selected is None:
+        select_backend()
+    return _selected
+
+def casino_holdem_backend(hero_str, flop_str, simulations=10000, seed=None, backend=None):
+    hero_cards, flop_cards = hand_bonus.parse_hand(hero_str, flop_str)
+    totals = BACKENDS[backend or get_backend()](hero_cards, flop_cards, simulations, seed)
+    return hand_bonus.results_from_totals(totals)
+
+def exact_equity(hero_cards, flop_cards):
+    # (win, tie, loss, dealer qualified) over every deal
+    win = tie = loss = qualified = 0
+    qualify_max = hand_bonus.DEALER_QUALIFY_MAX_SCORE
+    for _, hero_score, win_q, win_nq, ties, lose_nq, lose_q in exact_ev.enumerate_boards(hero_cards, flop_cards):
+        win += win_q + win_nq
+        tie += ties
+        loss += lose_q + lose_nq
+        # A tied dealer has the hero's score
+        qualified += win_q + lose_q + (ties if hero_score <= qualify_max else 0)
+    return win, tie, loss, qualified
+
+def casino_holdem_equity(hero_str, flop_str, simulations=10000, seed=None, exact=None, backend=None):
+    # exact=None: exact if the flop's dealer scores are indexed for this
+    # hole, else sampled; True/False force one path
+    hero_cards, flop_cards = hand_bonus.parse_hand(hero_str, flop_str)
+    if exact is None:
+        exact = exact_ev.flop_index_covers(hero_cards, flop_cards)
+    if exact:
+        win, tie, loss, qualified = exact_equity(hero_cards, flop_cards)
+        path = 'exact'
+    else:
+        path = backend or get_backend()
+        win, tie, loss, qualified = EQUITY_BACKENDS[path](hero_cards, flop_cards, simulations, seed)
+    trials = win + tie + loss
+    return {
+        'win_probability': win / trials,
+        'tie_probability': tie / trials,
+        'loss_probability': loss / trials,
+        'dealer_qualify_probability': qualified / trials,
+        'trials': trials,
+        'path': path,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the available compute backends and pick one")
+    parser.add_argument("--simulations", type=int, default=20000)
+    args = parser.parse_args()
+
+    for name in ('python', 'numpy', 'numba'):
+        if name not in BACKENDS:
+            print(f"{name:8} not available")
+    selected, timings = select_backend(args.simulations)
+    for name, seconds in timings.items():
+        print(f"{name:8} {1 / seconds:>12,.0f} hands/s{'   <- selected' if name == selected else ''}")
+
+if __name__ == "__main__":
+    main()
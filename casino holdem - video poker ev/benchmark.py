@@ -0,0 +1,182 @@
+import argparse
+import functools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+#   Benchmarks each engine mode from engines.py on a fixed, seeded corpus of
+#   (hole, flop) spots.  "equity" times backends.casino_holdem_equity, the
+#   win/tie/loss-only query, at the same trials as the full simulations.
+#   Every mode runs in its own process so startup time and peak memory are
+#   measured cleanly.  Prints JSON, and can save it as a baseline or compare
+#   against one (exit code 1 on a regression).
+#
+#   run with
+#
+#   python3 benchmark.py
+#   python3 benchmark.py --save-baseline benchmark_baseline.json
+#   python3 benchmark.py --baseline benchmark_baseline.json --tolerance 0.15
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODES = ["sampled", "vectorized", "parallel", "exact", "cached", "equity"]
+RANKS = "23456789TJQKA"
+SUITS = "shdc"
+
+def make_corpus(spots, seed):
+    rng = random.Random(seed)
+    deck = [r + s for r in RANKS for s in SUITS]
+    corpus = []
+    for _ in range(spots):
+        cards = rng.sample(deck, 5)
+        corpus.append((" ".join(cards[:2]), " ".join(cards[2:])))
+    return corpus
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+def peak_memory_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    scale = 1 if sys.platform == "darwin" else 1024  # ru_maxrss is bytes on macOS, KB on Linux
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return max(own, children) / 2 ** 20
+
+def run_worker(mode, spots, seed, simulations):
+    # Runs inside the child process; reports READY once setup is paid for
+    import engines
+    engines.prepare(mode)
+    if mode == "equity":
+        # Picks the fastest backend and compiles its kernel
+        import backends
+        backends.casino_holdem_equity("As Kd", "2c Jh 9s", simulations=100, exact=False)
+    print("READY", flush=True)
+
+    corpus = make_corpus(spots, seed)
+    kwargs = {} if mode in ("exact", "cached") else {'simulations': simulations}
+    if mode == "cached":
+        # Warm every spot first; the timed pass measures the hit path
+        for hero_str, flop_str in corpus:
+            engines.run_engine(mode, hero_str, flop_str)
+        engines.result_cache.hits = engines.result_cache.misses = 0
+
+    run = backends.casino_holdem_equity if mode == "equity" else functools.partial(engines.run_engine, mode)
+    latencies = []
+    for i, (hero_str, flop_str) in enumerate(corpus):
+        start = time.perf_counter()
+        run(hero_str, flop_str, seed=seed + i, **kwargs)
+        latencies.append(time.perf_counter() - start)
+    engines.shutdown()
+
+    total = sum(latencies)
+    trials = engines.EXACT_TRIALS if mode in ("exact", "cached") else simulations
+    report = {
+        'spots': len(corpus),
+        'trials_per_spot': trials,
+        'total_s': total,
+        'spots_per_second': len(corpus) / total,
+        'hands_per_second': len(corpus) * trials / total,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'peak_memory_mb': peak_memory_mb(),
+    }
+    if mode == "cached":
+        report['cache_hits'] = engines.result_cache.hits
+        report['cache_misses'] = engines.result_cache.misses
+    print(json.dumps(report), flush=True)
+
+def benchmark_mode(mode, spots, seed, simulations):
+    command = [sys.executable, os.path.join(HERE, "benchmark.py"), "--worker", mode,
+               "--spots", str(spots), "--seed", str(seed), "--simulations", str(simulations)]
+    start = time.perf_counter()
+    child = subprocess.Popen(command, cwd=HERE, stdout=subprocess.PIPE, text=True)
+    report = None
+    startup = None
+    for line in child.stdout:
+        if line.strip() == "READY":
+            startup = time.perf_counter() - start
+        elif line.startswith("{"):
+            report = json.loads(line)
+    child.wait()
+    if child.returncode != 0 or report is None:
+        return {'error': f"worker exited with code {child.returncode}"}
+    report['startup_s'] = startup
+    return report
+
+def compare(current, baseline, tolerance):
+    # Flags lower throughput or higher tail latency beyond the tolerance
+    regressions = []
+    for mode, result in current['engines'].items():
+        base = baseline.get('engines', {}).get(mode)
+        if not base or 'error' in base or 'error' in result:
+            continue
+        if result['hands_per_second'] < base['hands_per_second'] * (1 - tolerance):
+            regressions.append(f"{mode}: throughput {result['hands_per_second']:.0f} hands/s "
+                               f"vs baseline {base['hands_per_second']:.0f}")
+        if result['p99_ms'] > base['p99_ms'] * (1 + tolerance):
+            regressions.append(f"{mode}: p99 {result['p99_ms']:.1f} ms vs baseline {base['p99_ms']:.1f} ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Casino Hold'em engines")
+    parser.add_argument("--modes", nargs="+", default=DEFAULT_MODES)
+    parser.add_argument("--spots", type=int, default=20, help="corpus size for the sampling engines")
+    parser.add_argument("--exact-spots", type=int, default=5, help="corpus size for exact and cached")
+    parser.add_argument("--simulations", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--json", help="write the report here instead of stdout")
+    parser.add_argument("--baseline", help="compare against this report")
+    parser.add_argument("--save-baseline", help="save the report as a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.spots, args.seed, args.simulations)
+        return
+
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'seed': args.seed,
+        'simulations': args.simulations,
+        'engines': {}
+    }
+    for mode in args.modes:
+        spots = args.exact_spots if mode in ("exact", "cached") else args.spots
+        sys.stderr.write(f"benchmarking {mode} ({spots} spots)...\n")
+        report['engines'][mode] = benchmark_mode(mode, spots, args.seed, args.simulations)
+
+    output = json.dumps(report, indent=2)
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            f.write(output + "\n")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        for line in regressions:
+            sys.stderr.write(f"REGRESSION {line}\n")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import copy
+
+import pygame
+
+from module_loader import load_hand_bonus
+import engines
+import exact_ev
+
+#   Turn/river heatmap panel shared by the GUIs.
+#
+#   A spot's exact answer and its per-board breakdown come from one
+#   enumeration: exact_results() puts the answer in engines' result cache
+#   under the exact engine's key, exactly as the exact engine would, and
+#   the breakdown in this module's own cache (board_sums, keyed on the
+#   canonical spot and kept in its suits), so whichever of the Run button,
+#   pre-warming (prewarm_compute) or the map asks first pays for it and the
+#   others read it back.  compute() reduces the breakdown once; draw() only paints what
+#   compute() returned, so the panel costs nothing per frame.  Left: call
+#   minus fold given each turn card (suits by row, like the card selector).
+#   Right: call minus fold by turn and river rank, suits pooled.  Green
+#   favours calling, red folding; grey cells are cards already out.
+#
+#   The map is priced under 1_hand_bonus.py's rules (exact_ev's paytable).
+
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+GREY = (170, 170, 170)
+BLUE = (0, 0, 220)
+CALL_COLOR = (30, 170, 30)
+FOLD_COLOR = (220, 30, 30)
+
+RANK_LABELS = "23456789TJQKA"
+SUIT_LABELS = "SHDC"
+
+hand_bonus = load_hand_bonus()
+
+# Spots whose breakdown is kept; one is about 260 KB
+BOARD_SUMS_CACHE = 64
+
+# Canonical spot -> board_sums in the canonical spot's suits
+board_sums_cache = engines.ResultCache(BOARD_SUMS_CACHE)
+
+def _enumerate(hero_str, flop_str):
+    # Exact results without board_sums; the breakdown goes to board_sums_cache
+    hero_cards, flop_cards = hand_bonus.parse_hand(hero_str, flop_str)
+    results = exact_ev.casino_holdem_exact(hero_str, flop_str, breakdown=True)
+    board_sums = exact_ev.relabel_board_sums(results.pop('board_sums'), exact_ev.spot_suit_map(hero_cards, flop_cards))
+    board_sums_cache.put(exact_ev.canonical_spot(hero_cards, flop_cards), board_sums)
+    return results
+
+def exact_results(hero_str, flop_str, compute=True):
+    # The spot's exact results with 'board_sums' in its own suits.  With
+    # compute=False nothing is enumerated: a cached answer is returned
+    # without board_sums, or None.
+    hero_cards, flop_cards = hand_bonus.parse_hand(hero_str, flop_str)
+    spot = exact_ev.canonical_spot(hero_cards, flop_cards)
+    key = ('exact', (), spot)
+    cached = engines.result_cache.get(key)
+    if not compute:
+        return copy.deepcopy(cached)
+    board_sums = board_sums_cache.get(spot)
+    if cached is None or board_sums is None:
+        cached = _enumerate(hero_str, flop_str)
+        engines.result_cache.put(key, cached)
+        board_sums = board_sums_cache.get(spot)
+    results = copy.deepcopy(cached)
+    perm = exact_ev.inverse_suit_map(exact_ev.spot_suit_map(hero_cards, flop_cards))
+    results['board_sums'] = exact_ev.relabel_board_sums(board_sums, perm)
+    return results
+
+def prewarm_compute(engine, hero_str, flop_str, options):
+    # query_log pre-warm compute that keeps the exact engine's breakdown, so
+    # a pre-warmed spot's map needs no enumeration either
+    if engine != 'exact':
+        return engines.run_engine(engine, hero_str, flop_str, **dict(options))
+    return _enumerate(hero_str, flop_str)
+
+def from_results(results, spot):
+    # The panel's values from exact results with board_sums; spot is the
+    # (hero_str, flop_str) they are for
+    board_sums = results['board_sums']
+    return {
+        'spot': spot,
+        'call_minus_fold': results['call_minus_fold'],
+        'by_turn': exact_ev.turn_evs(board_sums),
+        'by_ranks': exact_ev.rank_pair_evs(board_sums),
+    }
+
+def compute(hero_str, flop_str):
+    return from_results(exact_results(hero_str, flop_str), (hero_str, flop_str))
+
+def _color(value, scale):
+    # White at zero, blending to CALL_COLOR / FOLD_COLOR at +/- scale
+    if value is None:
+        return GREY
+    weight = min(abs(value) / scale, 1.0)
+    target = CALL_COLOR if value >= 0 else FOLD_COLOR
+    return tuple(int(255 + (c - 255) * weight) for c in target)
+
+def draw(surface, rect, heatmap, font, note=None):
+    # note: a line under the per-turn grid, e.g. which rules priced the map
+    pygame.draw.rect(surface, WHITE, rect, border_radius=10)
+    pygame.draw.rect(surface, BLACK, rect, 2, border_radius=10)
+    values = [v for v in heatmap['by_turn'] if v is not None]
+    values += [v for row in heatmap['by_ranks'] for v in row if v is not None]
+    scale = max(max(abs(v) for v in values), 1e-9)
+
+    title = font.render(f"Call minus fold by turn card and by turn+river ranks "
+                        f"(overall {heatmap['call_minus_fold']:+.3f}, scale ±{scale:.2f})", True, BLUE)
+    surface.blit(title, (rect.left + 15, rect.top + 10))
+    top = rect.top + 35
+
+    # Per turn card: 4 suits x 13 ranks
+    cell_w, cell_h = 34, 30
+    left = rect.left + 30
+    for rank in range(13):
+        label = font.render(RANK_LABELS[rank], True, BLACK)
+        surface.blit(label, (left + rank * cell_w + cell_w // 2 - 3, top))
+    for suit in range(4):
+        label = font.render(SUIT_LABELS[suit], True, BLACK)
+        surface.blit(label, (left - 14, top + 16 + suit * cell_h + cell_h // 2 - 5))
+        for rank in range(13):
+            value = heatmap['by_turn'][rank * 4 + suit]
+            cell = pygame.Rect(left + rank * cell_w, top + 16 + suit * cell_h, cell_w - 2, cell_h - 2)
+            pygame.draw.rect(surface, _color(value, scale), cell)
+            if value is not None:
+                text = font.render(f"{value:+.1f}", True, BLACK)
+                surface.blit(text, text.get_rect(center=cell.center))
+    if note:
+        surface.blit(font.render(note, True, BLUE), (rect.left + 15, top + 16 + 4 * cell_h + 8))
+
+    # Turn rank x river rank
+    size = min((rect.height - 60) // 13, 20)
+    left = rect.right - 30 - 13 * size
+    for i in range(13):
+        label = font.render(RANK_LABELS[i], True, BLACK)
+        surface.blit(label, (left + i * size + size // 2 - 3, top))
+        surface.blit(label, (left - 12, top + 16 + i * size + size // 2 - 5))
+        for j in range(13):
+            cell = pygame.Rect(left + j * size, top + 16 + i * size, size - 1, size - 1)
+            pygame.draw.rect(surface, _color(heatmap['by_ranks'][i][j], scale), cell)
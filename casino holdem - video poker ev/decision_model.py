@@ -0,0 +1,261 @@
+import argparse
+import importlib.util
+import os
+import random
+import time
+
+from module_loader import HERE, load_hand_bonus
+import engines
+import exact_ev
+
+#   Distilled call/fold model.  The decision has a lot of structure (made
+#   hand, draws, overcards), so instead of a table of every spot it is kept
+#   as a small decision tree over suit-free hand features:
+#
+#   build   plays every canonical hole+flop exactly (sharded like
+#           exact_ev.py house-edge), then grows the tree feature by feature,
+#           splitting only where spots still disagree.  Feature values where
+#           spots disagree even after the last feature become "ask the
+#           engine" leaves, so the tree is right on every spot it answers;
+#           build checks that against every spot before writing it out as
+#           decision_table.py, a plain Python literal.  That check holds by
+#           construction (the tree is grown from those same spots), so build
+#           also grows a second tree without a random HOLDOUT share of the
+#           spots and scores it on them, as a measure of how well the
+#           features generalise rather than memorise.
+#   query   answers from decision_table.py, falling back to the exact
+#           engine for spots the tree leaves open (or with no table yet).
+#
+#   decision_table.py is checked in, built from every canonical flop.
+#   Building covers 1,755 flops at roughly 10 s each on one core (about five
+#   hours), so give it all the cores you have, or split it over machines
+#   with shards.py (decision-table job).  --max-flops builds a partial table
+#   for testing; a partial table only answers on the flops it has seen.
+#
+#   run with
+#
+#   python3 decision_model.py build --processes 8
+#   python3 shards.py plan decision-table --shards 135 --manifest table.json
+#   python3 shards.py local table.json --nodes 8
+#   python3 decision_model.py query "As Kd" "2c Jh 9s"
+
+hand_bonus = load_hand_bonus()
+
+TABLE_PATH = os.path.join(HERE, "decision_table.py")
+
+# Share of spots the held-out check keeps away from its tree
+HOLDOUT = 0.2
+
+# Tree levels, most telling first
+FEATURES = ('made_hand', 'pair_position', 'flush_draw', 'straight_draw', 'overcards',
+            'hole_high', 'hole_low', 'flop_high', 'flop_low')
+
+def spot_features(hero_cards, flop_cards):
+    # Suit-free description of hole + flop; every field is a small int
+    hole = sorted((exact_ev.card_index(c) for c in hero_cards), reverse=True)
+    flop = sorted((exact_ev.card_index(c) for c in flop_cards), reverse=True)
+    hole_ranks = [c // 4 for c in hole]
+    flop_ranks = [c // 4 for c in flop]
+    made = hand_bonus.get_hand_class(exact_ev.get_evaluator().evaluate(flop_cards, hero_cards))
+
+    # Where the hero's pair sits: 0 overpair, 1-3 pocket pair under 1-3 flop
+    # cards, 4-6 pairing the top/middle/bottom flop card, 7 pair on the board
+    pair_position = 0
+    if made in (8, 9):
+        if hole_ranks[0] == hole_ranks[1]:
+            pair_position = sum(r > hole_ranks[0] for r in flop_ranks)
+        else:
+            paired = [i for i, r in enumerate(flop_ranks) if r in hole_ranks]
+            pair_position = 4 + paired[0] if paired else 7
+
+    # 2: four to a flush, 1: both hole cards start a three-card flush
+    suits = [c % 4 for c in hole + flop]
+    suit = max(range(4), key=suits.count)
+    in_hole = sum(c % 4 == suit for c in hole)
+    flush_draw = 2 if suits.count(suit) == 4 and in_hole else 1 if suits.count(suit) == 3 and in_hole == 2 else 0
+
+    # Ranks that would complete a four-card straight (2 = open-ended or
+    # double gutshot, 1 = gutshot); the ace also plays low
+    ranks = set(hole_ranks + flop_ranks)
+    if 12 in ranks:
+        ranks.add(-1)
+    outs = set()
+    for low in range(-1, 9):
+        window = set(range(low, low + 5))
+        if len(window & ranks) == 4:
+            outs |= window - ranks
+    straight_draw = min(len(outs), 2) if made > 6 else 0
+
+    overcards = sum(r > flop_ranks[0] for r in hole_ranks)
+    return (made, pair_position, flush_draw, straight_draw, overcards,
+            hole_ranks[0], hole_ranks[1], flop_ranks[0], flop_ranks[2])
+
+def _flop_decisions(shard):
+    # (features, calls, real deals) for every canonical hole on one flop
+    flop, flop_count = shard
+    flop_cards = [exact_ev.index_to_card(i) for i in flop]
+    rows = []
+    for hole, hole_count in exact_ev.canonical_holes(flop):
+        hero_cards = [exact_ev.index_to_card(i) for i in hole]
+        totals = exact_ev.spot_totals(hero_cards, flop_cards, exact_ev.enumerate_boards(hero_cards, flop_cards))
+        calls = totals['ante'] + totals['play'] > -totals['trials']
+        rows.append((spot_features(hero_cards, flop_cards), calls, flop_count * hole_count))
+    return flop, rows
+
+def grow(rows, level=0):
+    # A leaf is True (call), False (fold) or None (ask the engine); a node is
+    # (level, {feature value: subtree})
+    decisions = {calls for _, calls, _ in rows}
+    if len(decisions) == 1:
+        return decisions.pop()
+    if level == len(FEATURES):
+        return None
+    groups = {}
+    for row in rows:
+        groups.setdefault(row[0][level], []).append(row)
+    children = {value: grow(group, level + 1) for value, group in sorted(groups.items())}
+    # Values every spot agrees on even though deeper features split them
+    first = next(iter(children.values()))
+    if isinstance(first, bool) and all(child is first for child in children.values()):
+        return first
+    return (level, children)
+
+def classify(tree, features):
+    # True/False, or None when the tree can't say
+    while isinstance(tree, tuple):
+        level, children = tree
+        if features[level] not in children:
+            return None
+        tree = children[features[level]]
+    return tree
+
+def verify(tree, rows):
+    # Deals answered right, answered wrong and left to the engine.  On the
+    # rows the tree was grown from, wrong is 0 by construction.
+    right = wrong = open_ = 0
+    for features, calls, weight in rows:
+        answer = classify(tree, features)
+        if answer is None:
+            open_ += weight
+        elif answer == calls:
+            right += weight
+        else:
+            wrong += weight
+    return right, wrong, open_
+
+def holdout_check(rows, fraction=HOLDOUT, seed=0):
+    # verify() for a tree grown without a random fraction of the spots,
+    # scored on just those spots
+    rng = random.Random(seed)
+    grown, held_out = [], []
+    for row in rows:
+        (held_out if rng.random() < fraction else grown).append(row)
+    return verify(grow(grown), held_out)
+
+def _count_leaves(tree):
+    if not isinstance(tree, tuple):
+        return 1
+    return sum(_count_leaves(child) for child in tree[1].values())
+
+def _shares(stats):
+    right, wrong, open_ = stats
+    total = right + wrong + open_
+    return f"right {right / total * 100:.2f}%, wrong {wrong / total * 100:.2f}%, open {open_ / total * 100:.2f}%"
+
+def write_table(tree, path, covered_flops, stats, holdout):
+    right, wrong, open_ = stats
+    total = right + wrong + open_
+    with open(path, "w") as f:
+        f.write("# Generated by decision_model.py build; do not edit.\n")
+        f.write(f"# {_count_leaves(tree)} leaves; answers {right / total * 100:.2f}% of deals, "
+                f"the rest go to the engine.\n")
+        f.write(f"# Held-out check ({HOLDOUT:.0%} of spots, by deals): {_shares(holdout)}.\n\n")
+        f.write(f"FEATURES = {FEATURES!r}\n")
+        f.write(f"COVERED_FLOPS = {covered_flops!r}\n")
+        f.write(f"TREE = {tree!r}\n")
+
+def decision_rows(flops, processes=None):
+    # (canonical flops covered, rows) for some canonical flops
+    partials = exact_ev.run_sharded(_flop_decisions, flops, processes, "flops")
+    return sorted(flop for flop, _ in partials), [row for _, flop_rows in partials for row in flop_rows]
+
+def distil(rows, covered_flops, path=TABLE_PATH):
+    # Grows and checks the tree, then writes it; covered_flops is None for
+    # a complete build.  Returns (tree, stats, held-out stats).
+    tree = grow(rows)
+    stats = verify(tree, rows)
+    if stats[1]:
+        raise RuntimeError(f"distilled tree disagrees with the engine on {stats[1]} deals")
+    holdout = holdout_check(rows)
+    write_table(tree, path, covered_flops, stats, holdout)
+    return tree, stats, holdout
+
+def build(processes=None, max_flops=None, path=TABLE_PATH):
+    flops = exact_ev.canonical_flops()
+    if max_flops is not None:
+        flops = flops[:max_flops]
+    covered, rows = decision_rows(flops, processes)
+    tree, stats, holdout = distil(rows, None if max_flops is None else covered, path)
+    return tree, stats, holdout, len(rows)
+
+def print_build(tree, stats, holdout, spots, path):
+    right, wrong, open_ = stats
+    total = right + wrong + open_
+    print(f"{spots} canonical spots -> {_count_leaves(tree)} leaves, wrote {path}")
+    print(f"answered exactly: {right / total * 100:.2f}% of deals, left to the engine: {open_ / total * 100:.2f}%")
+    print(f"held-out check ({HOLDOUT:.0%} of spots, grown without them): {_shares(holdout)}")
+
+_table = None
+
+def load_table(path=TABLE_PATH):
+    # The generated module, or None if it hasn't been built
+    global _table
+    if _table is None and os.path.exists(path):
+        spec = importlib.util.spec_from_file_location("decision_table", path)
+        _table = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(_table)
+        if _table.COVERED_FLOPS is not None:
+            _table.COVERED_FLOPS = set(_table.COVERED_FLOPS)
+    return _table
+
+def lookup(hero_cards, flop_cards):
+    # "CALL"/"FOLD" from the distilled tree, or None if it can't say
+    table = load_table()
+    if table is None or table.FEATURES != FEATURES:
+        return None
+    if table.COVERED_FLOPS is not None and exact_ev.canonical_spot(hero_cards, flop_cards)[0] not in table.COVERED_FLOPS:
+        return None
+    answer = classify(table.TREE, spot_features(hero_cards, flop_cards))
+    if answer is None:
+        return None
+    return "CALL" if answer else "FOLD"
+
+def recommend(hero_str, flop_str):
+    # (recommendation, "model" or "engine")
+    hero_cards, flop_cards = hand_bonus.parse_hand(hero_str, flop_str)
+    answer = lookup(hero_cards, flop_cards)
+    if answer is not None:
+        return answer, "model"
+    return engines.casino_holdem_cached(hero_str, flop_str, engine="exact")['recommendation'], "engine"
+
+def main():
+    parser = argparse.ArgumentParser(description="Distilled call/fold model")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_cmd = commands.add_parser("build", help="distil the exact decisions into decision_table.py")
+    build_cmd.add_argument("--processes", type=int)
+    build_cmd.add_argument("--max-flops", type=int, help="only the first N canonical flops (for testing)")
+    build_cmd.add_argument("--output", default=TABLE_PATH)
+    query = commands.add_parser("query", help="call or fold for one spot")
+    query.add_argument("hero")
+    query.add_argument("flop")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        print_build(*build(args.processes, args.max_flops, args.output), args.output)
+    else:
+        start = time.perf_counter()
+        recommendation, source = recommend(args.hero, args.flop)
+        print(f"{recommendation}  (from the {source}, {(time.perf_counter() - start) * 1e6:.0f} us)")
+
+if __name__ == "__main__":
+    main()
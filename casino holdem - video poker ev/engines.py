@@ -0,0 +1,234 @@
+from collections import OrderedDict
+import copy
+import multiprocessing
+import random
+import threading
+
+from module_loader import load_hand_bonus
+import exact_ev
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+#   Every way of answering a (hole, flop) query, behind one call:
+#
+#   sampled     1_hand_bonus.py's casino_holdem_simulation (the reference)
+#   vectorized  the same sampling, scored in NumPy batches
+#   parallel    the reference loop split over a process pool
+#   exact       full enumeration from exact_ev.py
+#   cached      any of the above, memoized on the canonical (suit-free) spot
+#
+#   All of them return the same result dict as casino_holdem_simulation.
+
+hand_bonus = load_hand_bonus()
+
+# Deals an exact query covers: every turn/river and every dealer hand
+EXACT_TRIALS = 1081 * 990
+
+# Reference paytables, indexed by hand class, for the vectorized scorer
+ANTE_BY_CLASS = [hand_bonus.get_ante_payout(c) for c in range(12)]
+# Hand code for each hand class (Pair of Aces handled separately); padded so
+# it indexes like ANTE_BY_CLASS
+NAME_INDEX_BY_CLASS = [0] + hand_bonus.HAND_CODE_BY_CLASS[1:] + [10]
+PAIR_OF_ACES_INDEX = hand_bonus.PAIR_OF_ACES_CODE
+
+# The paytable and qualifier payouts_from_scores prices with unless given
+# another one (sample_trace.py re-prices recorded deals with these keys)
+HOUSE_PAYTABLE = {
+    'ante': ANTE_BY_CLASS,
+    'bonus': exact_ev.BONUS_BY_CLASS,
+    'pair_of_aces_bonus': exact_ev.PAIR_OF_ACES_BONUS,
+    'qualify_max_score': hand_bonus.DEALER_QUALIFY_MAX_SCORE,
+}
+
+_pool = None
+_pool_size = None
+
+def get_pool(processes=None):
+    global _pool, _pool_size
+    processes = processes or multiprocessing.cpu_count()
+    if _pool is None or _pool_size != processes:
+        shutdown()
+        _pool = multiprocessing.Pool(processes)
+        _pool_size = processes
+    return _pool
+
+def shutdown():
+    global _pool, _pool_size
+    if _pool is not None:
+        _pool.close()
+        _pool.join()
+    _pool = None
+    _pool_size = None
+
+def casino_holdem_sampled(hero_str, flop_str, simulations=10000, seed=None, sampling="uniform"):
+    # A seeded run draws from its own generator, so it doesn't fix the
+    # sequence every later unseeded simulation in this process sees
+    rng = random.Random(seed) if seed is not None else None
+    return hand_bonus.casino_holdem_simulation(hero_str, flop_str, simulations, sampling, rng=rng)
+
+def payouts_from_scores(hero_scores, dealer_scores, paytable=HOUSE_PAYTABLE):
+    # Vectorized simulate_hand payouts for arrays of hero/dealer scores (any
+    # shape, broadcast together): ante, play and bonus nets plus hand codes
+    hero_scores = np.asarray(hero_scores)
+    dealer_scores = np.asarray(dealer_scores)
+    classes = np.searchsorted(np.array(hand_bonus.HAND_CLASS_MAX_SCORES), hero_scores) + 1
+    aces = (classes == 9) & (hero_scores <= hand_bonus.PAIR_OF_ACES_MAX_SCORE)
+
+    bonus = np.array(paytable['bonus'])[classes]
+    bonus[aces] = paytable['pair_of_aces_bonus']
+    bonus = np.where(bonus > 0, bonus, -1)
+
+    qualifies = dealer_scores <= paytable['qualify_max_score']
+    win = hero_scores < dealer_scores
+    tie = hero_scores == dealer_scores
+    lose = hero_scores > dealer_scores
+    ante = np.where(win | (lose & ~qualifies), np.array(paytable['ante'])[classes], np.where(tie, 0, -1))
+    play = np.where(win & qualifies, 2, np.where(lose & qualifies, -2, 0))
+
+    names = np.array(NAME_INDEX_BY_CLASS)[classes]
+    names[aces] = PAIR_OF_ACES_INDEX
+    return ante, play, np.broadcast_to(bonus, ante.shape), np.broadcast_to(names, ante.shape)
+
+def totals_from_payouts(ante, play, bonus, names):
+    # The shared totals dict from flat per-deal payout arrays
+    name_counts = np.bincount(names, minlength=len(hand_bonus.HAND_FREQUENCY_NAMES))
+    call = ante + play
+    return {
+        'trials': int(len(ante)), 'ante': int(ante.sum()), 'play': int(play.sum()), 'bonus': int(bonus.sum()),
+        'wins': int((call > 0).sum()), 'pushes': int((call == 0).sum()), 'losses': int((call < 0).sum()),
+        'bonus_wins': int((bonus > 0).sum()), 'bonus_amount': int(bonus[bonus > 0].sum()),
+        'ante_sq': int((ante * ante).sum()), 'play_sq': int((play * play).sum()),
+        'bonus_sq': int((bonus * bonus).sum()), 'call_sq': int((call * call).sum()),
+        'hand_frequencies': {name: int(count) for name, count in zip(hand_bonus.HAND_FREQUENCY_NAMES, name_counts)}
+    }
+
+def totals_from_scores(hero_scores, dealer_scores):
+    return totals_from_payouts(*payouts_from_scores(hero_scores, dealer_scores))
+
+def deal_scores_numpy(hero_cards, flop_cards, dealer, turn_river):
+    # Hero and dealer scores for given deals in one batch: dealer and
+    # turn_river are (n, 2) card arrays
+    vec = exact_ev.get_vector_evaluator()
+    n = len(dealer)
+    boards = np.hstack([np.tile(np.array(flop_cards, dtype=np.int64), (n, 1)), turn_river])
+    hero_scores = vec.evaluate(np.hstack([boards, np.tile(np.array(hero_cards, dtype=np.int64), (n, 1))]))
+    dealer_scores = vec.evaluate(np.hstack([boards, dealer]))
+    return hero_scores, dealer_scores
+
+def deal_totals_numpy(hero_cards, flop_cards, dealer, turn_river):
+    return totals_from_scores(*deal_scores_numpy(hero_cards, flop_cards, dealer, turn_river))
+
+def sample_scores_numpy(hero_cards, flop_cards, simulations, rng):
+    deck = np.array(hand_bonus.create_deck_without_cards(hero_cards + flop_cards), dtype=np.int64)
+    # First two of a random permutation go to the dealer, next two are turn/river
+    picks = np.argsort(rng.random((simulations, len(deck))), axis=1)[:, :4]
+    return deal_scores_numpy(hero_cards, flop_cards, deck[picks[:, :2]], deck[picks[:, 2:]])
+
+def sample_totals_numpy(hero_cards, flop_cards, simulations, rng):
+    return totals_from_scores(*sample_scores_numpy(hero_cards, flop_cards, simulations, rng))
+
+def casino_holdem_vectorized(hero_str, flop_str, simulations=10000, seed=None):
+    if np is None:
+        raise RuntimeError("The vectorized engine needs numpy (pip install numpy)")
+    hero_cards, flop_cards = hand_bonus.parse_hand(hero_str, flop_str)
+    totals = sample_totals_numpy(hero_cards, flop_cards, simulations, np.random.default_rng(seed))
+    return hand_bonus.results_from_totals(totals)
+
+def _parallel_chunk(job):
+    hero_str, flop_str, simulations, seed = job
+    hero_cards, flop_cards = hand_bonus.parse_hand(hero_str, flop_str)
+    return hand_bonus.run_simulations(hero_cards, flop_cards, simulations, exact_ev.get_evaluator(),
+                                      random.Random(seed))
+
+def casino_holdem_parallel(hero_str, flop_str, simulations=10000, seed=None, processes=None):
+    hand_bonus.parse_hand(hero_str, flop_str)  # fail fast, before touching the pool
+    pool = get_pool(processes)
+    # Forked workers share the parent's random state, so every chunk gets its own seed
+    seeds = random.Random(seed) if seed is not None else random.SystemRandom()
+    chunks = [simulations // _pool_size + (1 if i < simulations % _pool_size else 0) for i in range(_pool_size)]
+    jobs = [(hero_str, flop_str, n, seeds.getrandbits(64)) for n in chunks if n]
+    totals = hand_bonus.new_totals()
+    for part in pool.map(_parallel_chunk, jobs):
+        hand_bonus.merge_totals(totals, part)
+    return hand_bonus.results_from_totals(totals)
+
+def casino_holdem_exact(hero_str, flop_str, simulations=None, seed=None):
+    # simulations/seed are accepted (and ignored) so every engine takes the same arguments
+    return exact_ev.casino_holdem_exact(hero_str, flop_str)
+
+class ResultCache:
+    # Small LRU of result dicts keyed on (engine, options, canonical spot).
+    # Pre-warming fills it from a background thread while the GUI or
+    # service reads it, so every access takes the lock; use get()'s None
+    # rather than checking `key in cache` first.
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+result_cache = ResultCache()
+
+def casino_holdem_cached(hero_str, flop_str, engine="exact", **kwargs):
+    if engine == 'cached':
+        raise ValueError("The cached engine can't cache itself; pick the engine to cache")
+    hero_cards, flop_cards = hand_bonus.parse_hand(hero_str, flop_str)
+    options = tuple(sorted((k, v) for k, v in kwargs.items() if k != 'seed'))
+    key = (engine, options, exact_ev.canonical_spot(hero_cards, flop_cards))
+    results = result_cache.get(key)
+    if results is None:
+        results = ENGINES[engine](hero_str, flop_str, **kwargs)
+        result_cache.put(key, results)
+    return copy.deepcopy(results)
+
+ENGINES = {
+    'sampled': casino_holdem_sampled,
+    'vectorized': casino_holdem_vectorized,
+    'parallel': casino_holdem_parallel,
+    'exact': casino_holdem_exact,
+    'cached': casino_holdem_cached,
+}
+
+def available_engines():
+    return [mode for mode in ENGINES if mode != 'vectorized' or np is not None]
+
+def prepare(mode):
+    # Pay one-off setup (lookup tables, worker processes) before timing queries
+    exact_ev.get_evaluator()
+    if np is not None and mode in ('vectorized', 'exact', 'cached'):
+        exact_ev.get_vector_evaluator()
+    if mode == 'parallel':
+        get_pool()
+
+def run_engine(mode, hero_str, flop_str, **kwargs):
+    return ENGINES[mode](hero_str, flop_str, **kwargs)
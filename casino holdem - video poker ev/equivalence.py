@@ -0,0 +1,231 @@
+from contextlib import contextmanager
+from statistics import NormalDist
+import argparse
+import itertools
+import math
+import random
+import sys
+
+from module_loader import load_hand_bonus
+import backends
+import engines
+import exact_ev
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+#   Differential gate between 1_hand_bonus.py's simulate_hand (the reference)
+#   and the fast engines.  Three tiers:
+#
+#   deals    fixed deals on many random spots.  The reference is the real
+#            simulate_hand fed those deals instead of random ones; each
+#            scorer has to match its totals bit for bit.
+#   exact    exact engines against the reference driven over every deal of
+#            a spot, bit for bit (about a minute per spot in pure Python).
+#   sampled  sampled engines against the reference on many random spots.
+#            Per spot they disagree by noise, so each EV field and hand
+#            frequency is tested for a non-zero mean difference across spots
+#            (Bonferroni-corrected two-sided test).
+#
+#   Exits with status 1 if anything fails, so it can gate a change.
+#
+#   run with
+#
+#   python3 equivalence.py
+#   python3 equivalence.py --spots 2000 --simulations 2000 --exact-spots 3
+
+hand_bonus = load_hand_bonus()
+
+RESULT_FIELDS = ['ante_ev', 'play_ev', 'bonus_ev', 'call_ev_with_bonus', 'call_ev_without_bonus',
+                 'fold_ev_with_bonus', 'bonus_hit_rate', 'bonus_average_win', 'win_pct', 'push_pct', 'loss_pct']
+
+def _deal_totals_vectorized(hero_cards, flop_cards, deals):
+    dealer = np.array([d for d, _ in deals], dtype=np.int64)
+    turn_river = np.array([tr for _, tr in deals], dtype=np.int64)
+    return engines.deal_totals_numpy(hero_cards, flop_cards, dealer, turn_river)
+
+def _exact_totals(enumerate_boards):
+    def totals(hero_cards, flop_cards):
+        return exact_ev.spot_totals(hero_cards, flop_cards, enumerate_boards(hero_cards, flop_cards))
+    return totals
+
+# Candidates by tier.  Scorers take explicit deals, exact engines a spot,
+# sampled engines the usual (hero_str, flop_str, simulations, seed).
+DEAL_SCORERS = {}
+EXACT_CANDIDATES = {
+    'exact-python': _exact_totals(exact_ev._enumerate_boards_python),
+}
+SAMPLED_CANDIDATES = {
+    'parallel': engines.casino_holdem_parallel,
+    'stratified': lambda hero_str, flop_str, simulations, seed: engines.casino_holdem_sampled(
+        hero_str, flop_str, simulations, seed, sampling="stratified"),
+    'importance': lambda hero_str, flop_str, simulations, seed: engines.casino_holdem_sampled(
+        hero_str, flop_str, simulations, seed, sampling="importance"),
+}
+if np is not None:
+    DEAL_SCORERS['vectorized'] = _deal_totals_vectorized
+    EXACT_CANDIDATES['exact-direct'] = _exact_totals(exact_ev._enumerate_boards_numpy)
+    EXACT_CANDIDATES['exact'] = _exact_totals(exact_ev._enumerate_boards_indexed)
+    SAMPLED_CANDIDATES['vectorized'] = engines.casino_holdem_vectorized
+if 'numba' in backends.BACKENDS:
+    DEAL_SCORERS['numba'] = backends.numba_deal_totals
+    SAMPLED_CANDIDATES['numba'] = lambda hero_str, flop_str, simulations, seed: backends.casino_holdem_backend(
+        hero_str, flop_str, simulations, seed, backend='numba')
+
+class _ScriptedRandom:
+    # Hands simulate_hand the next scripted draw instead of a random sample
+    def __init__(self, draws):
+        self._draws = iter(draws)
+
+    def sample(self, population, k):
+        return next(self._draws)
+
+@contextmanager
+def scripted_draws(draws):
+    original = hand_bonus.random
+    hand_bonus.random = _ScriptedRandom(draws)
+    try:
+        yield
+    finally:
+        hand_bonus.random = original
+
+def reference_totals(hero_cards, flop_cards, deals, count=None):
+    # Runs the reference loop over (dealer, turn_river) deals; simulate_hand
+    # draws all four cards at once, dealer first, then the turn and river
+    draws = (list(d) + list(tr) for d, tr in deals)
+    count = len(deals) if count is None else count
+    with scripted_draws(draws):
+        return hand_bonus.run_simulations(hero_cards, flop_cards, count, exact_ev.get_evaluator())
+
+def all_deals(hero_cards, flop_cards):
+    deck = hand_bonus.create_deck_without_cards(hero_cards + flop_cards)
+    for turn_river in itertools.combinations(deck, 2):
+        rest = [c for c in deck if c not in turn_river]
+        for dealer in itertools.combinations(rest, 2):
+            yield dealer, turn_river
+
+def random_spot(rng):
+    deck = hand_bonus.create_deck_without_cards([])
+    cards = rng.sample(deck, 5)
+    return cards[:2], cards[2:]
+
+def random_deals(rng, hero_cards, flop_cards, count):
+    deck = hand_bonus.create_deck_without_cards(hero_cards + flop_cards)
+    deals = []
+    for _ in range(count):
+        cards = rng.sample(deck, 4)
+        deals.append((tuple(cards[:2]), tuple(cards[2:])))
+    return deals
+
+def spot_str(hero_cards, flop_cards):
+    return (" ".join(hand_bonus.print_card(c) for c in hero_cards),
+            " ".join(hand_bonus.print_card(c) for c in flop_cards))
+
+def check_deals(scorers, spots, deals_per_spot, seed):
+    failures = []
+    rng = random.Random(seed)
+    for _ in range(spots):
+        hero_cards, flop_cards = random_spot(rng)
+        deals = random_deals(rng, hero_cards, flop_cards, deals_per_spot)
+        expected = reference_totals(hero_cards, flop_cards, deals)
+        for name, scorer in scorers.items():
+            got = scorer(hero_cards, flop_cards, deals)
+            if got != expected:
+                failures.append(f"deals/{name}: {spot_str(hero_cards, flop_cards)} "
+                                f"expected {expected} got {got}")
+    return failures
+
+def check_exact(candidates, spots, seed):
+    failures = []
+    rng = random.Random(seed)
+    for i in range(spots):
+        hero_cards, flop_cards = random_spot(rng)
+        sys.stderr.write(f"exact: reference enumeration {i + 1}/{spots} {spot_str(hero_cards, flop_cards)}\n")
+        expected = reference_totals(hero_cards, flop_cards, all_deals(hero_cards, flop_cards), engines.EXACT_TRIALS)
+        for name, candidate in candidates.items():
+            got = candidate(hero_cards, flop_cards)
+            if got != expected:
+                failures.append(f"exact/{name}: {spot_str(hero_cards, flop_cards)} expected {expected} got {got}")
+    return failures
+
+def _flatten(results):
+    values = {field: results[field] for field in RESULT_FIELDS}
+    for hand, pct in results['hand_percentages'].items():
+        values[f"hand_percentages[{hand}]"] = pct
+    return values
+
+def paired_test(differences):
+    # z statistic for "mean difference is zero" (spots are independent), and
+    # the standard error, so the smallest detectable shift can be reported
+    n = len(differences)
+    mean = sum(differences) / n
+    var = sum((d - mean) ** 2 for d in differences) / (n - 1) if n > 1 else 0.0
+    se = math.sqrt(var / n)
+    if se == 0:
+        return (0.0 if mean == 0 else math.inf), se
+    return mean / se, se
+
+def check_sampled(candidates, spots, simulations, seed, alpha):
+    failures = []
+    rng = random.Random(seed)
+    differences = {name: {} for name in candidates}
+    for i in range(spots):
+        hero_str, flop_str = spot_str(*random_spot(rng))
+        spot_seed = rng.getrandbits(32)
+        reference = _flatten(hand_bonus.casino_holdem_simulation(hero_str, flop_str, simulations,
+                                                                 rng=random.Random(spot_seed)))
+        for name, candidate in candidates.items():
+            # A different seed, so the two runs are independent draws
+            got = _flatten(candidate(hero_str, flop_str, simulations=simulations, seed=spot_seed + 1))
+            for field, value in got.items():
+                differences[name].setdefault(field, []).append(value - reference[field])
+        if (i + 1) % 50 == 0:
+            sys.stderr.write(f"sampled: {i + 1}/{spots} spots\n")
+
+    tests = sum(len(fields) for fields in differences.values())
+    threshold = NormalDist().inv_cdf(1 - alpha / (2 * max(tests, 1)))
+    for name, fields in differences.items():
+        if not fields:
+            continue  # no spots in this tier
+        worst = 0.0
+        for field, diffs in fields.items():
+            z, se = paired_test(diffs)
+            worst = max(worst, abs(z))
+            if abs(z) > threshold:
+                failures.append(f"sampled/{name}: {field} mean difference {sum(diffs) / len(diffs):+.5f} "
+                                f"(z={z:+.2f}, limit {threshold:.2f})")
+        _, call_se = paired_test(fields['call_ev_with_bonus'])
+        sys.stderr.write(f"sampled/{name}: worst |z| {worst:.2f} of limit {threshold:.2f}; "
+                         f"would catch a call EV shift of about {threshold * call_se:.4f}\n")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Check fast engines against the reference simulate_hand")
+    parser.add_argument("--candidates", nargs="+", help="only these engines")
+    parser.add_argument("--deal-spots", type=int, default=2000)
+    parser.add_argument("--deals", type=int, default=200, help="deals per spot in the deals tier")
+    parser.add_argument("--exact-spots", type=int, default=1)
+    parser.add_argument("--spots", type=int, default=500, help="spots in the sampled tier")
+    parser.add_argument("--simulations", type=int, default=2000)
+    parser.add_argument("--alpha", type=float, default=0.001, help="family-wise false alarm rate")
+    parser.add_argument("--seed", type=int, default=2024)
+    args = parser.parse_args()
+
+    def chosen(candidates):
+        return {k: v for k, v in candidates.items() if not args.candidates or k in args.candidates}
+
+    failures = []
+    failures += check_deals(chosen(DEAL_SCORERS), args.deal_spots, args.deals, args.seed)
+    failures += check_exact(chosen(EXACT_CANDIDATES), args.exact_spots, args.seed)
+    failures += check_sampled(chosen(SAMPLED_CANDIDATES), args.spots, args.simulations, args.seed, args.alpha)
+    engines.shutdown()
+
+    for line in failures:
+        print(f"FAIL {line}")
+    print("equivalence: " + ("FAILED" if failures else "passed"))
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
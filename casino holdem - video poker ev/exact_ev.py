@@ -0,0 +1,758 @@
+from collections import OrderedDict
+from treys import Card, Evaluator
+import argparse
+import itertools
+import json
+import math
+import multiprocessing
+import random
+import sys
+import threading
+import time
+
+from module_loader import load_hand_bonus
+
+try:
+    import numpy as np
+    from vectorized_eval import VectorEvaluator
+except ImportError:
+    np = None
+
+#   Exact (no sampling) EVs for Casino Hold'em with the AA bonus.
+#
+#   For one spot every turn/river (1,081) and every dealer hand (990) is
+#   visited, so the result is exact.  The anytime mode visits the
+#   turn/rivers in a random order and can stop early with an unbiased
+#   estimate and error bar, becoming exact if it runs to the end.  On top
+#   of that there are two long running jobs, both sharded over a process
+#   pool with progress on stderr:
+#
+#   house-edge     every hole+flop deal, reduced to canonical suit patterns
+#                  and weighted by how many real deals each one stands for,
+#                  played with the engine's call/fold decision
+#   preflop-bonus  exact bonus bet EV for the 169 starting hands (the bonus
+#                  is placed before the flop, so it only depends on those)
+#
+#   Both price the bonus the way 1_hand_bonus.py does, on the best five of
+#   all seven cards.  Tables that settle the AA bonus on the hole cards and
+#   flop alone pay it far less often, so the bonus EVs here are much higher
+#   than theirs.
+#
+#   shards.py splits house-edge over several machines and merges the parts
+#   exactly.
+#
+#   run with
+#
+#   python3 exact_ev.py spot "As Kd" "2c Jh 9s"
+#   python3 exact_ev.py spot "As Kd" "2c Jh 9s" --by-turn
+#   python3 exact_ev.py anytime "As Kd" "2c Jh 9s" --deadline-ms 100
+#   python3 exact_ev.py house-edge --processes 8
+#   python3 exact_ev.py preflop-bonus --processes 8 --json preflop_bonus.json
+#
+#   NumPy is used when installed (much faster), otherwise treys is called
+#   directly.  With NumPy the dealer scores of a flop are scored once into a
+#   sorted index (FlopIndex), after which every other hole on that flop is a
+#   few binary searches per turn/river; house-edge walks the holes flop by
+#   flop, so it gets that for all but the first hole.
+
+hand_bonus = load_hand_bonus()
+
+RANKS = "23456789TJQKA"
+SUITS = "shdc"
+SUIT_INDEX = {1: 0, 2: 1, 4: 2, 8: 3}  # treys suit bits -> position in SUITS
+SUIT_PERMUTATIONS = list(itertools.permutations(range(4)))
+
+# Dealer hands scored per chunk of turn/river boards in the NumPy path
+BOARD_CHUNK = 64
+# Turn/rivers the anytime mode enumerates between checks of its deadline
+ANYTIME_CHUNK = 64
+# Flops whose FlopIndex is kept; a fully scored one takes about 10 MB
+FLOP_INDEX_CACHE = 4
+# Worst treys score (7-5-4-3-2 offsuit); SCORE_SENTINEL is above any score
+# and marks dealer hands that share a card with the board
+MAX_SCORE = hand_bonus.HAND_CLASS_MAX_SCORES[-1]
+SCORE_SENTINEL = 9999
+ROW_STRIDE = 10000
+
+# Hole+flop deals in the whole game; house-edge covers all of them
+ALL_DEALS = math.comb(52, 3) * math.comb(49, 2)
+BONUS_RULE_NOTE = ("The bonus is priced on the best five of all seven cards (1_hand_bonus.py's rule), "
+                   "not on hole + flop alone")
+
+# Bonus payout by hand class, read off the reference paytable
+BONUS_BY_CLASS = [hand_bonus.get_bonus_payout(c, [], []) for c in range(12)]
+PAIR_OF_ACES_BONUS = hand_bonus.get_bonus_payout(9, [Card.new("As"), Card.new("Ah")], [])
+
+_evaluator = None
+_vector_evaluator = None
+
+def get_evaluator():
+    global _evaluator
+    if _evaluator is None:
+        _evaluator = Evaluator()
+    return _evaluator
+
+def get_vector_evaluator():
+    global _vector_evaluator
+    if _vector_evaluator is None:
+        _vector_evaluator = VectorEvaluator(get_evaluator())
+    return _vector_evaluator
+
+def card_index(card):
+    # 0..51, rank major: 2s 2h 2d 2c 3s ... Ac
+    return Card.get_rank_int(card) * 4 + SUIT_INDEX[Card.get_suit_int(card)]
+
+def index_to_card(index):
+    return Card.new(RANKS[index // 4] + SUITS[index % 4])
+
+def _permute(cards, perm):
+    return tuple(sorted(c - c % 4 + perm[c % 4] for c in cards))
+
+def canonical_spot(hero_cards, flop_cards):
+    # Smallest (flop, hole) image over the 24 suit relabellings.  Every spot
+    # with the same key has the same EVs.
+    flop = [card_index(c) for c in flop_cards]
+    hole = [card_index(c) for c in hero_cards]
+    return min((_permute(flop, p), _permute(hole, p)) for p in SUIT_PERMUTATIONS)
+
+def spot_suit_map(hero_cards, flop_cards):
+    # A suit relabelling (suit s -> perm[s]) that takes this spot to its
+    # canonical_spot
+    flop = [card_index(c) for c in flop_cards]
+    hole = [card_index(c) for c in hero_cards]
+    return min(SUIT_PERMUTATIONS, key=lambda p: (_permute(flop, p), _permute(hole, p)))
+
+def inverse_suit_map(perm):
+    return tuple(perm.index(s) for s in range(4))
+
+def relabel_board_sums(board_sums, perm):
+    # board_sums rows (see spot_totals) with the turn/river suits relabelled
+    return [[*_permute((turn, river), perm), dealers, call] for turn, river, dealers, call in board_sums]
+
+def spot_cards(key):
+    flop, hole = key
+    return [index_to_card(i) for i in hole], [index_to_card(i) for i in flop]
+
+def canonical_flops():
+    counts = {}
+    for flop in itertools.combinations(range(52), 3):
+        key = min(_permute(flop, p) for p in SUIT_PERMUTATIONS)
+        counts[key] = counts.get(key, 0) + 1
+    return sorted(counts.items())
+
+def hole_orbits(flop):
+    # Holes on a flop (sorted card indices) grouped by the suit relabellings
+    # that leave the flop unchanged: (smallest hole, every hole in the group).
+    # Holes in a group have the same EVs.
+    stabilizer = [p for p in SUIT_PERMUTATIONS if _permute(flop, p) == tuple(flop)]
+    orbits = {}
+    remaining = [c for c in range(52) if c not in flop]
+    for hole in itertools.combinations(remaining, 2):
+        key = min(_permute(hole, p) for p in stabilizer)
+        orbits.setdefault(key, []).append(hole)
+    return sorted(orbits.items())
+
+def canonical_holes(flop):
+    # Holes on a canonical flop with how many real holes each stands for.
+    # Matches canonical_spot() key for key.
+    return [(key, len(holes)) for key, holes in hole_orbits(flop)]
+
+def _enumerate_boards_python(hero_cards, flop_cards, board_indices=None):
+    evaluator = get_evaluator()
+    deck = hand_bonus.create_deck_without_cards(hero_cards + flop_cards)
+    turn_rivers = list(itertools.combinations(deck, 2))
+    if board_indices is not None:
+        turn_rivers = [turn_rivers[i] for i in board_indices]
+    boards = []
+    for turn_river in turn_rivers:
+        board = flop_cards + list(turn_river)
+        hero_score = evaluator.evaluate(board, hero_cards)
+        win_q = win_nq = tie = lose_nq = lose_q = 0
+        dealer_deck = [c for c in deck if c not in turn_river]
+        for dealer_cards in itertools.combinations(dealer_deck, 2):
+            score = evaluator.evaluate(board, list(dealer_cards))
+            qualifies = score <= hand_bonus.DEALER_QUALIFY_MAX_SCORE
+            if hero_score < score:
+                if qualifies:
+                    win_q += 1
+                else:
+                    win_nq += 1
+            elif hero_score == score:
+                tie += 1
+            elif qualifies:
+                lose_q += 1
+            else:
+                lose_nq += 1
+        boards.append((turn_river, hero_score, win_q, win_nq, tie, lose_nq, lose_q))
+    return boards
+
+def _enumerate_boards_numpy(hero_cards, flop_cards, board_indices=None):
+    vec = get_vector_evaluator()
+    deck = np.array(hand_bonus.create_deck_without_cards(hero_cards + flop_cards), dtype=np.int64)
+    pairs = np.array(list(itertools.combinations(range(len(deck)), 2)))
+    pair_cards = deck[pairs]
+    n = len(pairs)
+    rows = np.arange(n) if board_indices is None else np.asarray(board_indices, dtype=np.int64)
+    board_pairs = pair_cards[rows]
+    m = len(rows)
+
+    boards = np.hstack([np.tile(np.array(flop_cards, dtype=np.int64), (m, 1)), board_pairs])
+    hero_scores = vec.evaluate(np.hstack([boards, np.tile(np.array(hero_cards, dtype=np.int64), (m, 1))]))
+
+    # Every pair of the 47 unseen cards is used both as a turn/river and as a
+    # dealer hand; a dealer hand is only live if it shares no card with the board
+    first, second = pairs[:, 0], pairs[:, 1]
+    board_first, board_second = first[rows], second[rows]
+    overlap = ((board_first[:, None] == first) | (board_first[:, None] == second) |
+               (board_second[:, None] == first) | (board_second[:, None] == second))
+
+    counts = np.empty((m, 5), dtype=np.int64)
+    cards = np.empty((BOARD_CHUNK, n, 7), dtype=np.int64)
+    for start in range(0, m, BOARD_CHUNK):
+        stop = min(start + BOARD_CHUNK, m)
+        chunk = cards[:stop - start]
+        chunk[:, :, :5] = boards[start:stop, None, :]
+        chunk[:, :, 5:] = pair_cards[None, :, :]
+        scores = vec.evaluate(chunk.reshape(-1, 7)).reshape(stop - start, n)
+
+        live = ~overlap[start:stop]
+        hero = hero_scores[start:stop, None]
+        qualifies = scores <= hand_bonus.DEALER_QUALIFY_MAX_SCORE
+        win = live & (hero < scores)
+        lose = live & (hero > scores)
+        counts[start:stop, 0] = (win & qualifies).sum(axis=1)
+        counts[start:stop, 1] = (win & ~qualifies).sum(axis=1)
+        counts[start:stop, 2] = (live & (hero == scores)).sum(axis=1)
+        counts[start:stop, 3] = (lose & ~qualifies).sum(axis=1)
+        counts[start:stop, 4] = (lose & qualifies).sum(axis=1)
+
+    return [(tuple(tr), score, *row)
+            for tr, score, row in zip(board_pairs.tolist(), hero_scores.tolist(), counts.tolist())]
+
+class FlopIndex:
+    # Dealer scores for one flop, shared by every hole on it.  For each
+    # turn/river from the 49 unseen cards, the scores of all dealer hands
+    # from those cards are kept raw and sorted (hands that overlap the board
+    # get SCORE_SENTINEL, which sorts last).  Qualifying means a score of at
+    # most DEALER_QUALIFY_MAX_SCORE, so the qualifying hands are a prefix of
+    # each sorted row and one count per row covers them.  A hero's showdown
+    # counts on a board are then two binary searches, less the few dealer
+    # hands that use the hero's own cards.  Rows are scored when first asked
+    # for.
+    def __init__(self, flop_cards):
+        self.flop_cards = flop_cards
+        self.deck = np.array(hand_bonus.create_deck_without_cards(flop_cards), dtype=np.int64)
+        self.positions = {card: i for i, card in enumerate(self.deck.tolist())}
+        self.pairs = np.array(list(itertools.combinations(range(len(self.deck)), 2)))
+        first, second = self.pairs[:, 0], self.pairs[:, 1]
+        self.overlap = ((first[:, None] == first) | (first[:, None] == second) |
+                        (second[:, None] == first) | (second[:, None] == second))
+        n = len(self.pairs)
+        self.raw = np.empty((n, n), dtype=np.int16)
+        # Sorted rows laid end to end, row r offset by r * ROW_STRIDE so the
+        # whole array is sorted and one searchsorted call serves every row;
+        # rows not scored yet hold sentinels to keep it that way
+        self.keys = np.repeat(np.arange(n, dtype=np.int32) * ROW_STRIDE + SCORE_SENTINEL, n)
+        self.qualifying = np.zeros(n, dtype=np.int64)
+        self.live = np.zeros(n, dtype=np.int64)
+        self.built = np.zeros(n, dtype=bool)
+
+    def coverage(self):
+        return float(self.built.mean())
+
+    def build(self, rows):
+        vec = get_vector_evaluator()
+        missing = rows[~self.built[rows]]
+        n = len(self.pairs)
+        pair_cards = self.deck[self.pairs]
+        cards = np.empty((BOARD_CHUNK, n, 7), dtype=np.int64)
+        for start in range(0, len(missing), BOARD_CHUNK):
+            chunk_rows = missing[start:start + BOARD_CHUNK]
+            chunk = cards[:len(chunk_rows)]
+            chunk[:, :, :3] = np.array(self.flop_cards, dtype=np.int64)
+            chunk[:, :, 3:5] = pair_cards[chunk_rows, None, :]
+            chunk[:, :, 5:] = pair_cards[None, :, :]
+            scores = vec.evaluate(chunk.reshape(-1, 7)).reshape(len(chunk_rows), n)
+            scores[self.overlap[chunk_rows]] = SCORE_SENTINEL
+            self.raw[chunk_rows] = scores
+            offsets = (chunk_rows * ROW_STRIDE)[:, None]
+            self.keys.reshape(n, n)[chunk_rows] = np.sort(scores, axis=1) + offsets
+            self.qualifying[chunk_rows] = (scores <= hand_bonus.DEALER_QUALIFY_MAX_SCORE).sum(axis=1)
+            self.live[chunk_rows] = (scores != SCORE_SENTINEL).sum(axis=1)
+            self.built[chunk_rows] = True
+
+    def showdown_counts(self, hero_cards, boundaries, board_indices=None):
+        # Dealer hands on each of the hole's turn/rivers, split into score
+        # bands (band k holds scores above boundaries[k - 1] up to
+        # boundaries[k]; the last boundary should be MAX_SCORE) and by whether
+        # the hero beats, ties or loses to them.  Returns the turn/river
+        # cards, hero scores and three (boards, bands) count arrays.
+        vec = get_vector_evaluator()
+        held = [self.positions[c] for c in hero_cards]
+        first, second = self.pairs[:, 0], self.pairs[:, 1]
+        uses_hero = np.isin(first, held) | np.isin(second, held)
+        # Turn/rivers without the hero's cards, in the hero's combinations order
+        rows = np.flatnonzero(~uses_hero)
+        if board_indices is not None:
+            rows = rows[np.asarray(board_indices, dtype=np.int64)]
+        self.build(rows)
+
+        board_pairs = self.deck[self.pairs[rows]]
+        m = len(rows)
+        boards = np.hstack([np.tile(np.array(self.flop_cards, dtype=np.int64), (m, 1)), board_pairs])
+        hero_scores = vec.evaluate(np.hstack([boards, np.tile(np.array(hero_cards, dtype=np.int64), (m, 1))]))
+
+        n = len(self.pairs)
+        boundaries = np.asarray(boundaries, dtype=np.int64)
+        offsets = (rows * ROW_STRIDE)[:, None]
+        base = (rows * n)[:, None]
+        # Queries in the keys' dtype, or searchsorted converts all the keys
+        # on every call
+        hero_keys = (offsets[:, 0] + hero_scores).astype(self.keys.dtype)
+        upper = np.searchsorted(self.keys, (offsets + boundaries).astype(self.keys.dtype), 'right') - base
+        lower = np.hstack([np.zeros((m, 1), dtype=np.int64), upper[:, :-1]])
+        better = np.searchsorted(self.keys, hero_keys, 'left')[:, None] - base
+        not_worse = np.searchsorted(self.keys, hero_keys, 'right')[:, None] - base
+        losses = np.clip(better, lower, upper) - lower
+        ties = np.clip(not_worse, lower, upper) - lower - losses
+        wins = upper - lower - losses - ties
+
+        # Take back the dealer hands that hold one of the hero's cards
+        blocked = self.raw[np.ix_(rows, np.flatnonzero(uses_hero))]
+        live = blocked != SCORE_SENTINEL
+        bands = len(boundaries)
+        band = np.searchsorted(boundaries, blocked, 'left')
+        outcome = np.where(blocked > hero_scores[:, None], 0, np.where(blocked == hero_scores[:, None], 1, 2))
+        cell = (np.arange(m)[:, None] * bands + band) * 3 + outcome
+        taken = np.bincount(cell[live], minlength=m * bands * 3).reshape(m, bands, 3)
+        wins -= taken[:, :, 0]
+        ties -= taken[:, :, 1]
+        losses -= taken[:, :, 2]
+        return board_pairs, hero_scores, wins, ties, losses
+
+    def showdowns(self, hero_cards, board_indices=None):
+        # enumerate_boards records for one hole on this flop
+        board_pairs, hero_scores, wins, ties, losses = self.showdown_counts(
+            hero_cards, [hand_bonus.DEALER_QUALIFY_MAX_SCORE, MAX_SCORE], board_indices)
+        counts = np.column_stack([wins[:, 0], wins[:, 1], ties.sum(axis=1), losses[:, 1], losses[:, 0]])
+        return [(tuple(tr), score, *row)
+                for tr, score, row in zip(board_pairs.tolist(), hero_scores.tolist(), counts.tolist())]
+
+_flop_indexes = OrderedDict()
+_flop_index_stats = [0, 0]  # hits, misses
+# Pre-warming builds indexes on a background thread
+_flop_index_lock = threading.Lock()
+
+def flop_index(flop_cards):
+    # The FlopIndex for this flop, kept for the last FLOP_INDEX_CACHE flops
+    key = tuple(sorted(card_index(c) for c in flop_cards))
+    with _flop_index_lock:
+        index = _flop_indexes.get(key)
+        if index is not None:
+            _flop_index_stats[0] += 1
+            _flop_indexes.move_to_end(key)
+        else:
+            _flop_index_stats[1] += 1
+            index = _flop_indexes[key] = FlopIndex(flop_cards)
+            if len(_flop_indexes) > FLOP_INDEX_CACHE:
+                _flop_indexes.popitem(last=False)
+    return index
+
+def _cached_flop_index(flop_cards):
+    with _flop_index_lock:
+        return _flop_indexes.get(tuple(sorted(card_index(c) for c in flop_cards)))
+
+def flop_index_coverage(flop_cards):
+    # Share of the flop's turn/rivers already scored (0 if not cached)
+    index = _cached_flop_index(flop_cards)
+    return index.coverage() if index is not None else 0.0
+
+def flop_index_covers(hero_cards, flop_cards):
+    # Whether the cached FlopIndex has scored every turn/river this hole needs
+    index = _cached_flop_index(flop_cards)
+    if index is None:
+        return False
+    held = [index.positions[c] for c in hero_cards]
+    needed = ~(np.isin(index.pairs[:, 0], held) | np.isin(index.pairs[:, 1], held))
+    return bool(index.built[needed].all())
+
+def flop_index_stats():
+    # (hits, misses) of the FlopIndex cache
+    return tuple(_flop_index_stats)
+
+def _enumerate_boards_indexed(hero_cards, flop_cards, board_indices=None):
+    return flop_index(flop_cards).showdowns(hero_cards, board_indices)
+
+def enumerate_boards(hero_cards, flop_cards, board_indices=None):
+    # One record per turn/river, in itertools.combinations order of the deck:
+    # (turn_river, hero_score, win_q, win_nq, tie, lose_nq, lose_q)
+    # where the counts are dealer hands, split by whether the dealer qualifies.
+    # board_indices limits it to those turn/rivers (positions in that order).
+    if np is not None:
+        return _enumerate_boards_indexed(hero_cards, flop_cards, board_indices)
+    return _enumerate_boards_python(hero_cards, flop_cards, board_indices)
+
+def spot_totals(hero_cards, flop_cards, boards, board_sums=None):
+    # Same tallies as hand_bonus.run_simulations, but over every deal.  If a
+    # board_sums list is given, one [turn, river, dealers, call] row per
+    # turn/river is appended to it: card indices, dealer hands, and the summed
+    # ante + play net over them
+    totals = hand_bonus.new_totals()
+    for turn_river, hero_score, win_q, win_nq, tie, lose_nq, lose_q in boards:
+        board = flop_cards + list(turn_river)
+        hero_class = hand_bonus.get_hand_class(hero_score)
+        ante_payout = hand_bonus.get_ante_payout(hero_class)
+        bonus_payout = hand_bonus.get_bonus_payout(hero_class, hero_cards, board)
+        bonus_result = bonus_payout if bonus_payout > 0 else -1
+        dealers = win_q + win_nq + tie + lose_nq + lose_q
+
+        totals['trials'] += dealers
+        # Ante pays whenever the hero wins or the dealer doesn't qualify,
+        # play only pays against a qualifying dealer (see simulate_hand)
+        ante = ante_payout * (win_q + win_nq + lose_nq) - lose_q
+        play = 2 * (win_q - lose_q)
+        totals['ante'] += ante
+        totals['play'] += play
+        if board_sums is not None:
+            board_sums.append([card_index(turn_river[0]), card_index(turn_river[1]), dealers, ante + play])
+        totals['bonus'] += bonus_result * dealers
+        # Squared payouts per outcome; a win against a qualifying dealer
+        # nets ante + 2 on the call, a qualifying loss -3
+        totals['ante_sq'] += ante_payout * ante_payout * (win_q + win_nq + lose_nq) + lose_q
+        totals['play_sq'] += 4 * (win_q + lose_q)
+        totals['bonus_sq'] += bonus_result * bonus_result * dealers
+        totals['call_sq'] += ((ante_payout + 2) ** 2 * win_q + ante_payout * ante_payout * (win_nq + lose_nq)
+                              + 9 * lose_q)
+        totals['hand_frequencies'][hand_bonus.HAND_FREQUENCY_NAMES[hand_bonus.hand_code(hero_class, hero_score)]] += dealers
+        totals['wins'] += win_q + win_nq + lose_nq
+        totals['pushes'] += tie
+        totals['losses'] += lose_q
+        if bonus_result > 0:
+            totals['bonus_wins'] += dealers
+            totals['bonus_amount'] += bonus_result * dealers
+    return totals
+
+def casino_holdem_exact(hero_str, flop_str, breakdown=False):
+    # breakdown=True adds 'board_sums' (see spot_totals), the partial sums
+    # behind turn_evs / board_evs / rank_pair_evs
+    hero_cards, flop_cards = hand_bonus.parse_hand(hero_str, flop_str)
+    board_sums = [] if breakdown else None
+    totals = spot_totals(hero_cards, flop_cards, enumerate_boards(hero_cards, flop_cards), board_sums)
+    results = hand_bonus.results_from_totals(totals, exact=True)
+    if breakdown:
+        results['board_sums'] = board_sums
+    return results
+
+def _stratum_se(means, total):
+    # Standard error of the mean of a simple random sample of len(means)
+    # out of total equal-sized strata, with the finite-population correction
+    n = len(means)
+    if n >= total:
+        return 0.0
+    if n < 2:
+        return math.inf
+    mean = sum(means) / n
+    variance = sum((m - mean) ** 2 for m in means) / (n - 1)
+    return math.sqrt((1 - n / total) * variance / n)
+
+def casino_holdem_anytime(hero_str, flop_str, deadline_ms=None, precision=None, seed=None, field='call_minus_fold'):
+    # Exact enumeration one turn/river (stratum) at a time, in a random
+    # order, every dealer hand of each.  Every turn/river has 990 dealer
+    # hands, so after n of them the plain average is an unbiased estimate
+    # of the exact EV, with the spread of the per-stratum means (less the
+    # share already seen) as its error.  Stops at deadline_ms or once the
+    # 95% half-width on field reaches precision (at least one chunk is
+    # always done); with neither, or time to spare, it is exact.  Stopping
+    # on precision can bias the estimate slightly; stopping on time can't.
+    start = time.perf_counter()
+    hero_cards, flop_cards = hand_bonus.parse_hand(hero_str, flop_str)
+    strata = math.comb(52 - 5, 2)
+    order = list(range(strata))
+    random.Random(seed).shuffle(order)
+    totals = hand_bonus.new_totals()
+    means = {name: [] for name, _, _ in hand_bonus.moment_sums(totals)}
+    done = 0
+    while done < strata:
+        for record in enumerate_boards(hero_cards, flop_cards, order[done:done + ANYTIME_CHUNK]):
+            part = spot_totals(hero_cards, flop_cards, [record])
+            hand_bonus.merge_totals(totals, part)
+            for name, total, _ in hand_bonus.moment_sums(part):
+                means[name].append(total / part['trials'])
+        done = min(done + ANYTIME_CHUNK, strata)
+        if deadline_ms is not None and (time.perf_counter() - start) * 1000 >= deadline_ms:
+            break
+        if precision is not None and hand_bonus.Z_95 * _stratum_se(means[field], strata) <= precision:
+            break
+
+    results = hand_bonus.results_from_totals(totals, exact=done == strata)
+    for name, values in means.items():
+        mean = results['call_minus_fold' if name == 'call_minus_fold' else name + '_ev']
+        se = _stratum_se(values, strata)
+        results[name + '_se'] = se
+        results[name + '_ci95'] = (mean - hand_bonus.Z_95 * se, mean + hand_bonus.Z_95 * se)
+    results['anytime'] = {'strata': done, 'of': strata, 'complete': done == strata,
+                          'elapsed_ms': (time.perf_counter() - start) * 1000}
+    return results
+
+# Call minus fold given part of the runout, from board_sums rows.  Folding
+# costs the ante, so per deal call minus fold is ante + play + 1.
+
+def board_evs(board_sums):
+    # {(turn, river): call minus fold} for the 1,081 turn/rivers
+    return {(turn, river): call / dealers + 1 for turn, river, dealers, call in board_sums}
+
+def turn_evs(board_sums):
+    # [call minus fold given the turn card] indexed by card index, None for
+    # cards already out.  Turn and river are interchangeable, so a card's
+    # boards are every turn/river it is part of.
+    dealers = [0] * 52
+    calls = [0] * 52
+    for turn, river, n, call in board_sums:
+        for card in (turn, river):
+            dealers[card] += n
+            calls[card] += call
+    return [calls[c] / dealers[c] + 1 if dealers[c] else None for c in range(52)]
+
+def rank_pair_evs(board_sums):
+    # 13x13 grid of call minus fold by turn and river rank (suits pooled),
+    # symmetric, None where no board has those ranks
+    dealers = [[0] * 13 for _ in range(13)]
+    calls = [[0] * 13 for _ in range(13)]
+    for turn, river, n, call in board_sums:
+        a, b = turn // 4, river // 4
+        for i, j in ((a, b), (b, a)) if a != b else ((a, a),):
+            dealers[i][j] += n
+            calls[i][j] += call
+    return [[calls[i][j] / dealers[i][j] + 1 if dealers[i][j] else None for j in range(13)] for i in range(13)]
+
+def starting_hands():
+    # The 169 preflop classes with a representative hand and its combo count
+    hands = []
+    for high in range(12, -1, -1):
+        for low in range(high, -1, -1):
+            if high == low:
+                hands.append((RANKS[high] * 2, (high * 4, high * 4 + 1), 6))
+            else:
+                hands.append((RANKS[high] + RANKS[low] + "s", (high * 4, low * 4), 4))
+                hands.append((RANKS[high] + RANKS[low] + "o", (high * 4, low * 4 + 1), 12))
+    return hands
+
+def _bonus_results_numpy(scores):
+    classes = np.searchsorted(np.array(hand_bonus.HAND_CLASS_MAX_SCORES), scores) + 1
+    payouts = np.array(BONUS_BY_CLASS)[classes]
+    payouts[(classes == 9) & (scores <= hand_bonus.PAIR_OF_ACES_MAX_SCORE)] = PAIR_OF_ACES_BONUS
+    return np.where(payouts > 0, payouts, -1)
+
+def _preflop_bonus_shard(hand):
+    label, hole, combos = hand
+    hero_cards = [index_to_card(i) for i in hole]
+    deck = hand_bonus.create_deck_without_cards(hero_cards)
+    total = boards = hits = 0
+    if np is not None:
+        vec = get_vector_evaluator()
+        board_iter = itertools.combinations(deck, 5)
+        while True:
+            chunk = np.fromiter(itertools.chain.from_iterable(itertools.islice(board_iter, 200000)),
+                                dtype=np.int64)
+            if not len(chunk):
+                break
+            chunk = chunk.reshape(-1, 5)
+            cards = np.hstack([chunk, np.tile(np.array(hero_cards, dtype=np.int64), (len(chunk), 1))])
+            results = _bonus_results_numpy(vec.evaluate(cards))
+            total += int(results.sum())
+            hits += int((results > 0).sum())
+            boards += len(chunk)
+    else:
+        evaluator = get_evaluator()
+        for board in itertools.combinations(deck, 5):
+            board = list(board)
+            hero_class = hand_bonus.get_hand_class(evaluator.evaluate(board, hero_cards))
+            payout = hand_bonus.get_bonus_payout(hero_class, hero_cards, board)
+            total += payout if payout > 0 else -1
+            hits += payout > 0
+            boards += 1
+    return {'hand': label, 'combos': combos, 'boards': boards, 'bonus_total': total, 'bonus_hits': hits}
+
+def starting_hand_label(hero_cards):
+    # "AKs", "AKo" or "AA", as in starting_hands()
+    high, low = sorted((card_index(c) for c in hero_cards), reverse=True)
+    if high // 4 == low // 4:
+        return RANKS[high // 4] * 2
+    return RANKS[high // 4] + RANKS[low // 4] + ("s" if high % 4 == low % 4 else "o")
+
+_preflop_bonus = {}
+
+def preflop_bonus(hero_cards):
+    # Exact bonus EV for one starting hand (a few seconds with NumPy),
+    # remembered per hand class; load_preflop_bonus() can fill it up front
+    label = starting_hand_label(hero_cards)
+    if label not in _preflop_bonus:
+        hand = next(h for h in starting_hands() if h[0] == label)
+        row = _preflop_bonus_shard(hand)
+        _preflop_bonus[label] = {
+            'combos': row['combos'],
+            'bonus_ev': row['bonus_total'] / row['boards'],
+            'bonus_hit_rate': row['bonus_hits'] / row['boards'] * 100
+        }
+    return _preflop_bonus[label]
+
+def load_preflop_bonus(path):
+    # Table written by `exact_ev.py preflop-bonus --json`
+    with open(path) as f:
+        _preflop_bonus.update(json.load(f)['table'])
+
+def _house_edge_shard(shard):
+    flop, flop_count = shard
+    flop_cards = [index_to_card(i) for i in flop]
+    sums = {'deals': 0, 'trials': 0, 'optimal': 0, 'always_call': 0, 'bonus': 0, 'call_deals': 0}
+    for hole, hole_count in canonical_holes(flop):
+        hero_cards = [index_to_card(i) for i in hole]
+        weight = flop_count * hole_count
+        totals = spot_totals(hero_cards, flop_cards, enumerate_boards(hero_cards, flop_cards))
+        trials = totals['trials']
+        # Per deal, call is worth (ante + play) / trials and fold is -1 ante
+        call = totals['ante'] + totals['play']
+        calls = call > -trials
+        sums['deals'] += weight
+        sums['trials'] = trials  # same 47C2 * 45C2 for every spot
+        sums['optimal'] += weight * (call if calls else -trials)
+        sums['always_call'] += weight * call
+        sums['bonus'] += weight * totals['bonus']
+        sums['call_deals'] += weight if calls else 0
+    return sums
+
+def run_sharded(worker, shards, processes=None, label="shards"):
+    # Runs worker over shards on a process pool, reporting progress on stderr
+    results = []
+    start = time.time()
+    processes = processes or multiprocessing.cpu_count()
+    if processes == 1:
+        mapped = map(worker, shards)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes)
+        mapped = pool.imap_unordered(worker, shards)
+    try:
+        for done, result in enumerate(mapped, 1):
+            results.append(result)
+            elapsed = time.time() - start
+            remaining = elapsed / done * (len(shards) - done)
+            sys.stderr.write(f"\r{label}: {done}/{len(shards)}  elapsed {elapsed:.0f}s  remaining ~{remaining:.0f}s")
+            sys.stderr.flush()
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    sys.stderr.write("\n")
+    return results
+
+def house_edge_sums(flops, processes=None):
+    # Integer sums over some canonical flops; sums of disjoint sets of flops
+    # add up exactly (merge_house_edge_sums)
+    return merge_house_edge_sums(run_sharded(_house_edge_shard, flops, processes, "flops"))
+
+def merge_house_edge_sums(partials):
+    sums = {key: sum(p[key] for p in partials) for key in partials[0]}
+    sums['trials'] = partials[0]['trials']
+    return sums
+
+def house_edge_results(sums, flop_count):
+    deals, trials = sums['deals'], sums['trials']
+    return {
+        'deals': deals,
+        'canonical_flops': flop_count,
+        'ev_per_ante': sums['optimal'] / (deals * trials),
+        'house_edge': -sums['optimal'] / (deals * trials),
+        'always_call_ev': sums['always_call'] / (deals * trials),
+        'bonus_ev': sums['bonus'] / (deals * trials),
+        'call_rate': sums['call_deals'] / deals,
+        'complete': deals == ALL_DEALS,
+    }
+
+def house_edge(processes=None, max_flops=None):
+    flops = canonical_flops()
+    if max_flops is not None:
+        flops = flops[:max_flops]
+    return house_edge_results(house_edge_sums(flops, processes), len(flops))
+
+def print_house_edge(results):
+    # The edge is on the ante + play only, per ante; the bonus is a separate bet
+    print(f"Deals covered:        {results['deals']} of {ALL_DEALS} ({results['canonical_flops']} canonical flops)")
+    print(f"EV per ante (optimal): {results['ev_per_ante']:.6f}")
+    print(f"House edge:            {results['house_edge'] * 100:.4f}%")
+    print(f"EV if always calling:  {results['always_call_ev']:.6f}")
+    print(f"Bonus bet EV:          {results['bonus_ev']:.6f}")
+    print(f"Call rate:             {results['call_rate'] * 100:.2f}%")
+    print(f"\n{BONUS_RULE_NOTE}.")
+    if not results['complete']:
+        print("Partial run: these flops only (canonical flops come in rank order, so the first few are "
+              "low paired boards), not the game's house edge.  Run without --max-flops, or every shard, for that.")
+
+def preflop_bonus_table(processes=None):
+    rows = run_sharded(_preflop_bonus_shard, starting_hands(), processes, "starting hands")
+    table = {}
+    for row in rows:
+        table[row['hand']] = {
+            'combos': row['combos'],
+            'bonus_ev': row['bonus_total'] / row['boards'],
+            'bonus_hit_rate': row['bonus_hits'] / row['boards'] * 100
+        }
+    overall = sum(t['bonus_ev'] * t['combos'] for t in table.values()) / 1326
+    return table, overall
+
+def main():
+    parser = argparse.ArgumentParser(description="Exact Casino Hold'em EVs")
+    commands = parser.add_subparsers(dest="command", required=True)
+    spot = commands.add_parser("spot", help="exact EVs for one hole+flop")
+    spot.add_argument("hero")
+    spot.add_argument("flop")
+    spot.add_argument("--by-turn", action="store_true", help="also print call minus fold by turn card")
+    anytime = commands.add_parser("anytime", help="exact enumeration in random turn/river order, stoppable early")
+    anytime.add_argument("hero")
+    anytime.add_argument("flop")
+    anytime.add_argument("--deadline-ms", type=float)
+    anytime.add_argument("--precision", type=float, help="95%% half-width wanted on call minus fold")
+    anytime.add_argument("--seed", type=int)
+    edge = commands.add_parser("house-edge", help="whole-game EV with optimal call/fold")
+    edge.add_argument("--processes", type=int)
+    edge.add_argument("--max-flops", type=int, help="only the first N canonical flops (for testing)")
+    preflop = commands.add_parser("preflop-bonus", help="exact bonus EV for the 169 starting hands")
+    preflop.add_argument("--processes", type=int)
+    preflop.add_argument("--json", help="also write the table to this file")
+    args = parser.parse_args()
+
+    if args.command == "spot":
+        results = casino_holdem_exact(args.hero, args.flop, breakdown=args.by_turn)
+        board_sums = results.pop('board_sums', None)
+        for key, value in results.items():
+            print(f"{key + ':':24} {value}")
+        if board_sums is not None:
+            print("\ncall minus fold by turn card:")
+            evs = turn_evs(board_sums)
+            for rank in reversed(range(13)):
+                print("  " + "  ".join(f"{RANKS[rank]}{SUITS[s]} {evs[rank * 4 + s]:+.3f}" if evs[rank * 4 + s] is not None
+                                       else f"{RANKS[rank]}{SUITS[s]}   --  " for s in range(4)))
+    elif args.command == "anytime":
+        results = casino_holdem_anytime(args.hero, args.flop, args.deadline_ms, args.precision, args.seed)
+        run = results['anytime']
+        for name in ('ante', 'play', 'bonus', 'call_minus_fold'):
+            mean = results['call_minus_fold' if name == 'call_minus_fold' else name + '_ev']
+            low, high = results[name + '_ci95']
+            print(f"{name + ':':17} {mean:+.4f}  [{low:+.4f}, {high:+.4f}]")
+        print(f"recommendation:   {results['recommendation']}")
+        print(f"{run['strata']}/{run['of']} turn/rivers in {run['elapsed_ms']:.0f} ms"
+              + (" (exact)" if run['complete'] else ""))
+    elif args.command == "house-edge":
+        print_house_edge(house_edge(args.processes, args.max_flops))
+    else:
+        table, overall = preflop_bonus_table(args.processes)
+        for hand, row in sorted(table.items(), key=lambda x: -x[1]['bonus_ev']):
+            print(f"{hand:4} {row['bonus_ev']:+.5f}  ({row['bonus_hit_rate']:.2f}% hit)")
+        print(f"\nBonus bet EV over all starting hands: {overall:.6f}")
+        print(f"{BONUS_RULE_NOTE}.")
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({'table': table, 'overall_bonus_ev': overall}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
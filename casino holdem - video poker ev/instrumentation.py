@@ -0,0 +1,176 @@
+from contextlib import contextmanager
+import argparse
+import json
+import marshal
+import time
+
+from module_loader import load_hand_bonus
+
+#   Opt-in per-stage timers and call counters for 1_hand_bonus.py.
+#
+#   Nothing in the engine changes when this is off.  While instrument() is
+#   active the engine's module-level functions (and the evaluator it builds,
+#   and the random draws) are swapped for timed wrappers, so every stage of
+#   simulate_hand and casino_holdem_simulation is counted, then the originals
+#   are put back.  Stages nest: "self" time excludes time spent in inner
+#   stages, so dealer_qualifies' self time leaves out its evaluate call and
+#   bookkeeping is the tally loop's own time.
+#
+#   The patching is global, so only instrument one simulation at a time.
+#
+#   run with
+#
+#   python3 instrumentation.py "As Kd" "2c Jh 9s" --json metrics.json --pstats metrics.prof
+#   python3 -m pstats metrics.prof
+
+hand_bonus = load_hand_bonus()
+
+# Module functions that get wrapped, and the stage name they report under
+STAGES = {
+    'parse_hand': 'parse_hand',
+    'create_deck_without_cards': 'create_deck',
+    'run_simulations': 'run_simulations',
+    'run_stratified_simulations': 'run_stratified_simulations',
+    'run_importance_simulations': 'run_importance_simulations',
+    'count_outcomes': 'bookkeeping',
+    'tally_weighted_outcomes': 'bookkeeping',
+    'simulate_hand': 'simulate_hand',
+    'score_deal': 'score_deal',
+    'settle_deal': 'settle_deal',
+    'dealer_qualifies': 'dealer_qualifies',
+    'hand_code': 'hand_code',
+    'get_hand_class': 'get_hand_class',
+    'get_ante_payout': 'get_ante_payout',
+    'get_bonus_payout': 'get_bonus_payout',
+    'summarize_results': 'summarize_results',
+}
+
+class StageMetrics:
+    def __init__(self):
+        self.calls = {}
+        self.total = {}
+        self.self_time = {}
+        self.callers = {}
+        self.wall = 0.0
+        self._stack = []
+
+    def timed(self, name, fn):
+        def wrapper(*args, **kwargs):
+            parent = self._stack[-1] if self._stack else None
+            frame = [name, 0.0]  # stage, time spent in inner stages
+            self._stack.append(frame)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self._stack.pop()
+                self.calls[name] = self.calls.get(name, 0) + 1
+                self.total[name] = self.total.get(name, 0.0) + elapsed
+                self.self_time[name] = self.self_time.get(name, 0.0) + elapsed - frame[1]
+                if parent is not None:
+                    parent[1] += elapsed
+                    edge = self.callers.setdefault(name, {}).setdefault(parent[0], [0, 0.0, 0.0])
+                    edge[0] += 1
+                    edge[1] += elapsed - frame[1]
+                    edge[2] += elapsed
+        return wrapper
+
+    def snapshot(self):
+        stages = {}
+        for name in sorted(self.total, key=lambda n: -self.self_time[n]):
+            stages[name] = {
+                'calls': self.calls[name],
+                'total_s': self.total[name],
+                'self_s': self.self_time[name],
+                'mean_self_us': self.self_time[name] / self.calls[name] * 1e6,
+            }
+        return {'wall_s': self.wall, 'stages': stages}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_text(self):
+        snap = self.snapshot()
+        lines = [f"{'stage':20} {'calls':>10} {'self s':>10} {'total s':>10} {'self us/call':>13} {'% wall':>7}"]
+        for name, s in snap['stages'].items():
+            share = s['self_s'] / snap['wall_s'] * 100 if snap['wall_s'] else 0
+            lines.append(f"{name:20} {s['calls']:>10} {s['self_s']:>10.4f} {s['total_s']:>10.4f} "
+                         f"{s['mean_self_us']:>13.2f} {share:>6.1f}%")
+        lines.append(f"wall time: {snap['wall_s']:.4f} s")
+        return "\n".join(lines)
+
+    def dump_pstats(self, path):
+        # Same marshal layout cProfile writes, so pstats/snakeviz can load it:
+        # {(file, line, func): (prim calls, calls, self, total, {caller: (...)})}
+        def key(name):
+            return ("1_hand_bonus.py", 0, name)
+        stats = {}
+        for name in self.total:
+            callers = {key(parent): (e[0], e[0], e[1], e[2]) for parent, e in self.callers.get(name, {}).items()}
+            stats[key(name)] = (self.calls[name], self.calls[name], self.self_time[name], self.total[name], callers)
+        with open(path, "wb") as f:
+            marshal.dump(stats, f)
+
+class _TimedRandom:
+    # Stands in for the random module inside 1_hand_bonus.py; the sampling
+    # functions look it up when called (rng=None), so the stratified and
+    # importance draws are timed too
+    def __init__(self, module, metrics):
+        self._module = module
+        self.sample = metrics.timed('sampling', module.sample)
+        self.choice = metrics.timed('sampling', module.choice)
+        self.random = metrics.timed('sampling', module.random)
+
+    def __getattr__(self, name):
+        return getattr(self._module, name)
+
+@contextmanager
+def instrument(metrics=None, module=None):
+    metrics = metrics or StageMetrics()
+    module = module or hand_bonus
+    originals = {name: getattr(module, name) for name in STAGES}
+    original_random = module.random
+    original_evaluator = module.Evaluator
+
+    def make_evaluator(*args, **kwargs):
+        evaluator = original_evaluator(*args, **kwargs)
+        evaluator.evaluate = metrics.timed('evaluate', evaluator.evaluate)
+        return evaluator
+
+    for name, stage in STAGES.items():
+        setattr(module, name, metrics.timed(stage, originals[name]))
+    module.random = _TimedRandom(original_random, metrics)
+    module.Evaluator = metrics.timed('evaluator_init', make_evaluator)
+    start = time.perf_counter()
+    try:
+        yield metrics
+    finally:
+        metrics.wall += time.perf_counter() - start
+        for name, fn in originals.items():
+            setattr(module, name, fn)
+        module.random = original_random
+        module.Evaluator = original_evaluator
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage timings of one simulation")
+    parser.add_argument("hero")
+    parser.add_argument("flop")
+    parser.add_argument("--simulations", type=int, default=10000)
+    parser.add_argument("--sampling", choices=["uniform", "stratified", "importance"], default="uniform")
+    parser.add_argument("--json", help="write the metrics snapshot here")
+    parser.add_argument("--pstats", help="write a cProfile-compatible stats file here")
+    args = parser.parse_args()
+
+    with instrument() as metrics:
+        results = hand_bonus.casino_holdem_simulation(args.hero, args.flop, args.simulations, args.sampling)
+    print(metrics.to_text())
+    print(f"\ncall EV with bonus: {results['call_ev_with_bonus']:.4f}  ({results['recommendation']})")
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(metrics.to_json() + "\n")
+    if args.pstats:
+        metrics.dump_pstats(args.pstats)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+import importlib.util
+import os
+import sys
+
+#   1_hand.py and 1_hand_bonus.py aren't importable names, so the tools in
+#   this folder load them by path (like the GUIs do).  Loaded modules are
+#   registered in sys.modules so every tool shares one copy.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def load_hand_module(name, filename):
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(HERE, filename))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def load_hand_bonus():
+    return load_hand_module("hand_bonus", "1_hand_bonus.py")
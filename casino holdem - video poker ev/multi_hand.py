@@ -0,0 +1,273 @@
+import argparse
+import itertools
+import math
+import random
+import time
+
+from module_loader import load_hand_bonus
+import engines
+import exact_ev
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+#   Multi-hand mode: several hero hands played against one dealer hand and
+#   one board, as in multi-hand video hold'em.  The hands remove each
+#   other's cards from the deck, and they win and lose together, so besides
+#   each hand's own EVs you get the joint EV of the round and the covariance
+#   of the hands' results, which is what bet sizing (kelly_criterion.py)
+#   needs.
+#
+#   Every deal draws one turn/river and one dealer hand for all hands, and
+#   the dealer is evaluated once, so N hands cost N + 1 evaluations a deal
+#   instead of 2N.
+#
+#   Each hand is played with its own call/fold recommendation; its result
+#   per round is ante + play + bonus when calling and bonus - 1 when folding.
+#
+#   run with
+#
+#   python3 multi_hand.py "As Kd" "Qh Qc" "7s 6s" --flop "2c Jh 9s"
+#   python3 multi_hand.py "As Kd" "Qh Qc" --flop "2c Jh 9s" --exact
+#
+#   NumPy is used when installed; --exact needs it.
+
+hand_bonus = load_hand_bonus()
+
+# Deals scored per NumPy batch, to keep the random permutations small
+SAMPLE_BATCH = 100_000
+
+def parse_hands(hero_strs, flop_str):
+    if not hero_strs:
+        raise ValueError("Enter at least one hand.")
+    hands = []
+    for hero_str in hero_strs:
+        hero_cards, flop_cards = hand_bonus.parse_hand(hero_str, flop_str)
+        hands.append(hero_cards)
+    all_cards = [c for hand in hands for c in hand] + flop_cards
+    if bin(hand_bonus.card_mask(all_cards)).count("1") != len(all_cards):
+        raise ValueError("Duplicate cards detected.")
+    if len(all_cards) + 4 > 52:
+        raise ValueError("Too many hands for one deck.")
+    return hands, flop_cards
+
+def new_stats(hands):
+    # Per-hand totals dicts, plus the first and second moments of the
+    # per-deal vector (call_1 .. call_N, bonus_1 .. bonus_N), where call is
+    # ante + play; every hand's round result is a linear function of it
+    width = 2 * len(hands)
+    return {
+        'trials': 0,
+        'totals': [hand_bonus.new_totals() for _ in hands],
+        'sums': [0] * width,
+        'products': [[0] * width for _ in range(width)],
+    }
+
+def merge_stats(stats, other):
+    stats['trials'] += other['trials']
+    for totals, part in zip(stats['totals'], other['totals']):
+        hand_bonus.merge_totals(totals, part)
+    stats['sums'] = [a + b for a, b in zip(stats['sums'], other['sums'])]
+    stats['products'] = [[a + b for a, b in zip(row, other_row)]
+                         for row, other_row in zip(stats['products'], other['products'])]
+    return stats
+
+def _stats_from_payouts(payouts):
+    # payouts: per hand, flat (ante, play, bonus, names) arrays over the same deals
+    x = np.column_stack([ante + play for ante, play, _, _ in payouts] + [bonus for _, _, bonus, _ in payouts])
+    x = x.astype(np.int64)
+    return {
+        'trials': int(len(x)),
+        'totals': [engines.totals_from_payouts(*p) for p in payouts],
+        'sums': x.sum(axis=0).tolist(),
+        'products': (x.T @ x).tolist(),
+    }
+
+def add_outcome(tally, outcome):
+    # One settle_deal outcome into an OutcomeTally, as count_outcomes does
+    ante, play, bonus, _, code = outcome
+    call = ante + play
+    tally.trials += 1
+    tally.ante += ante
+    tally.play += play
+    tally.bonus += bonus
+    tally.ante_sq += ante * ante
+    tally.play_sq += play * play
+    tally.bonus_sq += bonus * bonus
+    tally.call_sq += call * call
+    tally.hand_counts[code] += 1
+    if call > 0:
+        tally.wins += 1
+    elif call == 0:
+        tally.pushes += 1
+    else:
+        tally.losses += 1
+    if bonus > 0:
+        tally.bonus_wins += 1
+        tally.bonus_amount += bonus
+
+def sample_stats_python(hands, flop_cards, simulations, evaluator=None, rng=None):
+    # Reference loop: same draw as simulate_hand, the dealer evaluated once a
+    # deal; only running sums are kept, so memory doesn't grow with the trials
+    evaluator = evaluator or exact_ev.get_evaluator()
+    rng = rng or random
+    deck = hand_bonus.create_deck_without_cards([c for hand in hands for c in hand] + flop_cards)
+    n = len(hands)
+    stats = new_stats(hands)
+    sums, products = stats['sums'], stats['products']
+    tallies = [hand_bonus.OutcomeTally() for _ in hands]
+    for _ in range(simulations):
+        drawn = rng.sample(deck, 4)
+        board = flop_cards + drawn[2:]
+        dealer_score = evaluator.evaluate(board, drawn[:2])
+        qualifies = dealer_score <= hand_bonus.DEALER_QUALIFY_MAX_SCORE
+        row = [0] * (2 * n)
+        for i, hero_cards in enumerate(hands):
+            outcome = hand_bonus.settle_deal(hero_cards, board, evaluator.evaluate(board, hero_cards),
+                                             dealer_score, qualifies)
+            add_outcome(tallies[i], outcome)
+            row[i] = outcome[0] + outcome[1]
+            row[n + i] = outcome[2]
+        for i, a in enumerate(row):
+            sums[i] += a
+            products_row = products[i]
+            for j, b in enumerate(row):
+                products_row[j] += a * b
+    stats['trials'] = simulations
+    stats['totals'] = [tally.to_totals() for tally in tallies]
+    return stats
+
+def sample_stats_numpy(hands, flop_cards, simulations, rng):
+    vec = exact_ev.get_vector_evaluator()
+    deck = np.array(hand_bonus.create_deck_without_cards([c for hand in hands for c in hand] + flop_cards),
+                    dtype=np.int64)
+    stats = new_stats(hands)
+    for start in range(0, simulations, SAMPLE_BATCH):
+        size = min(SAMPLE_BATCH, simulations - start)
+        # First two of a random permutation go to the dealer, next two are turn/river
+        picks = deck[np.argsort(rng.random((size, len(deck))), axis=1)[:, :4]]
+        boards = np.hstack([np.tile(np.array(flop_cards, dtype=np.int64), (size, 1)), picks[:, 2:]])
+        dealer_scores = vec.evaluate(np.hstack([boards, picks[:, :2]]))
+        payouts = [engines.payouts_from_scores(
+                       vec.evaluate(np.hstack([boards, np.tile(np.array(hero_cards, dtype=np.int64), (size, 1))])),
+                       dealer_scores)
+                   for hero_cards in hands]
+        merge_stats(stats, _stats_from_payouts(payouts))
+    return stats
+
+def exact_stats(hands, flop_cards):
+    # Every turn/river and every dealer hand from what the hands leave, in
+    # chunks of turn/rivers as in exact_ev._enumerate_boards_numpy
+    vec = exact_ev.get_vector_evaluator()
+    deck = np.array(hand_bonus.create_deck_without_cards([c for hand in hands for c in hand] + flop_cards),
+                    dtype=np.int64)
+    pairs = np.array(list(itertools.combinations(range(len(deck)), 2)))
+    pair_cards = deck[pairs]
+    n = len(pairs)
+
+    boards = np.hstack([np.tile(np.array(flop_cards, dtype=np.int64), (n, 1)), pair_cards])
+    hero_scores = [vec.evaluate(np.hstack([boards, np.tile(np.array(hero_cards, dtype=np.int64), (n, 1))]))
+                   for hero_cards in hands]
+    first, second = pairs[:, 0], pairs[:, 1]
+    overlap = ((first[:, None] == first) | (first[:, None] == second) |
+               (second[:, None] == first) | (second[:, None] == second))
+
+    stats = new_stats(hands)
+    cards = np.empty((exact_ev.BOARD_CHUNK, n, 7), dtype=np.int64)
+    for start in range(0, n, exact_ev.BOARD_CHUNK):
+        stop = min(start + exact_ev.BOARD_CHUNK, n)
+        chunk = cards[:stop - start]
+        chunk[:, :, :5] = boards[start:stop, None, :]
+        chunk[:, :, 5:] = pair_cards[None, :, :]
+        dealer_scores = vec.evaluate(chunk.reshape(-1, 7)).reshape(stop - start, n)
+        live = ~overlap[start:stop]
+        payouts = [tuple(a[live] for a in engines.payouts_from_scores(scores[start:stop, None], dealer_scores))
+                   for scores in hero_scores]
+        merge_stats(stats, _stats_from_payouts(payouts))
+    return stats
+
+def results_from_stats(hero_strs, stats, exact=False):
+    n_hands = len(hero_strs)
+    trials = stats['trials']
+    hands = []
+    for hero_str, totals in zip(hero_strs, stats['totals']):
+        results = hand_bonus.results_from_totals(totals, exact)
+        results['hero'] = hero_str
+        hands.append(results)
+
+    # Round result of hand i: call_i + bonus_i when calling, bonus_i - 1 when folding
+    calls = [results['call_minus_fold'] > 0 for results in hands]
+    weights = [[0.0] * (2 * n_hands) for _ in range(n_hands)]
+    for i, call in enumerate(calls):
+        weights[i][i] = 1.0 if call else 0.0
+        weights[i][n_hands + i] = 1.0
+    means = [s / trials for s in stats['sums']]
+    denominator = trials if exact else trials - 1
+    moments = [[(p - trials * means[a] * means[b]) / denominator if denominator > 0 else 0.0
+                for b, p in enumerate(row)] for a, row in enumerate(stats['products'])]
+    covariance = [[sum(wi[a] * moments[a][b] * wj[b]
+                       for a in range(2 * n_hands) for b in range(2 * n_hands) if wi[a] and wj[b])
+                   for wj in weights] for wi in weights]
+    correlation = [[covariance[i][j] / math.sqrt(covariance[i][i] * covariance[j][j])
+                    if covariance[i][i] > 0 and covariance[j][j] > 0 else 0.0
+                    for j in range(n_hands)] for i in range(n_hands)]
+
+    evs = [r['call_ev_with_bonus'] if call else r['fold_ev_with_bonus'] for r, call in zip(hands, calls)]
+    joint_ev = sum(evs)
+    joint_variance = max(sum(sum(row) for row in covariance), 0.0)
+    joint_se = 0.0 if exact or trials < 2 else math.sqrt(joint_variance / trials)
+    return {
+        'trials': trials,
+        'hands': hands,
+        'decisions': ['CALL' if call else 'FOLD' for call in calls],
+        'hand_evs': evs,
+        'joint_ev': joint_ev,
+        'joint_sd': math.sqrt(joint_variance),
+        'joint_se': joint_se,
+        'joint_ci95': (joint_ev - hand_bonus.Z_95 * joint_se, joint_ev + hand_bonus.Z_95 * joint_se),
+        'covariance': covariance,
+        'correlation': correlation,
+    }
+
+def casino_holdem_multi(hero_strs, flop_str, simulations=10000, seed=None, exact=False):
+    hands, flop_cards = parse_hands(hero_strs, flop_str)
+    if exact:
+        if np is None:
+            raise RuntimeError("Exact multi-hand EVs need numpy (pip install numpy)")
+        return results_from_stats(hero_strs, exact_stats(hands, flop_cards), exact=True)
+    if np is not None:
+        stats = sample_stats_numpy(hands, flop_cards, simulations, np.random.default_rng(seed))
+    else:
+        rng = random.Random(seed) if seed is not None else None
+        stats = sample_stats_python(hands, flop_cards, simulations, rng=rng)
+    return results_from_stats(hero_strs, stats)
+
+def main():
+    parser = argparse.ArgumentParser(description="Several hero hands against one dealer and board")
+    parser.add_argument("hands", nargs="+", help='hole cards per hand, e.g. "As Kd"')
+    parser.add_argument("--flop", required=True)
+    parser.add_argument("--simulations", type=int, default=100000)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--exact", action="store_true", help="enumerate every deal instead of sampling")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = casino_holdem_multi(args.hands, args.flop, args.simulations, args.seed, args.exact)
+    elapsed = time.perf_counter() - start
+
+    print(f"{'hand':8} {'decision':8} {'EV':>9} {'± 95%':>8} {'call - fold':>12}")
+    for i, (hand, decision, ev) in enumerate(zip(results['hands'], results['decisions'], results['hand_evs'])):
+        margin = 0.0 if args.exact else hand_bonus.Z_95 * math.sqrt(results['covariance'][i][i] / results['trials'])
+        print(f"{hand['hero']:8} {decision:8} {ev:>+9.4f} {margin:>8.4f} {hand['call_minus_fold']:>+12.4f}")
+    low, high = results['joint_ci95']
+    print(f"\njoint EV per round: {results['joint_ev']:+.4f}  [{low:+.4f}, {high:+.4f}], "
+          f"sd per round {results['joint_sd']:.4f}")
+    print("correlation of the hands' results:")
+    for hand, row in zip(results['hands'], results['correlation']):
+        print(f"  {hand['hero']:8} " + " ".join(f"{c:+.3f}" for c in row))
+    print(f"({results['trials']:,} deals in {elapsed:.2f} s)")
+
+if __name__ == "__main__":
+    main()
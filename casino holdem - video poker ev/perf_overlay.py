@@ -0,0 +1,151 @@
+from collections import deque
+import time
+
+import pygame
+
+import engines
+import exact_ev
+
+#   Performance overlay shared by the GUIs (F3 toggles it).
+#
+#   frame       time the loop spends updating and drawing a frame
+#   loop lag    how late frames come back compared with the FPS target; a
+#               high lag with a low frame time means another thread (the
+#               engine, holding the GIL) is starving the event loop
+#   job         trials per second, elapsed and estimated remaining time of
+#               the running simulation, from a CountingEvaluator
+#   caches      hits/misses of engines.py's result cache and exact_ev.py's
+#               FlopIndex cache
+#
+#   The panel and its text are rendered into a surface at most every
+#   REFRESH_SECONDS and blitted in between, so a visible overlay costs one
+#   blit a frame and a hidden one nothing.
+
+REFRESH_SECONDS = 0.25
+FRAME_WINDOW = 120  # frames averaged for the frame time and lag
+PANEL_SIZE = (300, 140)
+PANEL_COLOR = (0, 0, 0, 170)
+TEXT_COLOR = (255, 255, 255)
+WARN_COLOR = (255, 200, 0)
+
+class JobProgress:
+    # Trials done by a background job; written by the job thread, read by
+    # the GUI thread (plain int updates, so no lock)
+    def __init__(self):
+        self.total = 0
+        self.done = 0
+        self.started = None
+        self.finished = None
+
+    def start(self, total):
+        self.total = total
+        self.done = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def finish(self):
+        # Stratified sampling rounds the trials to whole strata, so the
+        # total is only known for sure at the end
+        self.finished = time.perf_counter()
+        self.total = self.done
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    def rate(self):
+        elapsed = self.elapsed()
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def remaining(self):
+        rate = self.rate()
+        if self.finished is not None or rate == 0:
+            return 0.0
+        return max(self.total - self.done, 0) / rate
+
+class CountingEvaluator:
+    # Wraps a treys Evaluator and advances a JobProgress by one trial every
+    # evaluations_per_trial evaluate() calls (both engines score hero,
+    # dealer and dealer qualification: 3 per deal)
+    def __init__(self, evaluator, progress, evaluations_per_trial=3):
+        self.evaluator = evaluator
+        self.progress = progress
+        self.evaluations_per_trial = evaluations_per_trial
+        self.evaluations = 0
+
+    def evaluate(self, cards, board):
+        self.evaluations += 1
+        if self.evaluations % self.evaluations_per_trial == 0:
+            self.progress.done += 1
+        return self.evaluator.evaluate(cards, board)
+
+    def __getattr__(self, name):
+        return getattr(self.evaluator, name)
+
+class PerfOverlay:
+    def __init__(self, font, fps, position=(10, 10)):
+        self.font = font
+        self.target_ms = 1000 / fps
+        self.position = position
+        self.visible = False
+        self.frame_ms = deque(maxlen=FRAME_WINDOW)
+        self.lag_ms = deque(maxlen=FRAME_WINDOW)
+        self.surface = None
+        self.rendered_at = 0.0
+
+    def toggle(self):
+        self.visible = not self.visible
+        self.surface = None
+
+    def handle_event(self, event):
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+            self.toggle()
+
+    def record(self, frame_ms, interval_ms):
+        # frame_ms: update + draw time; interval_ms: clock.tick()'s return
+        if self.visible:
+            self.frame_ms.append(frame_ms)
+            self.lag_ms.append(max(interval_ms - self.target_ms, 0.0))
+
+    def _lines(self, progress):
+        frame = sum(self.frame_ms) / len(self.frame_ms) if self.frame_ms else 0.0
+        lag = sum(self.lag_ms) / len(self.lag_ms) if self.lag_ms else 0.0
+        worst_lag = max(self.lag_ms, default=0.0)
+        result_cache = engines.result_cache
+        flop_hits, flop_misses = exact_ev.flop_index_stats()
+        lines = [
+            (f"frame {frame:5.1f} ms   max {max(self.frame_ms, default=0.0):5.1f} ms",
+             frame > self.target_ms),
+            (f"loop lag {lag:5.1f} ms   max {worst_lag:5.1f} ms", worst_lag > self.target_ms),
+        ]
+        if progress is not None and progress.started is not None:
+            state = "done" if progress.finished is not None else "running"
+            lines += [
+                (f"job {state}: {progress.done:,}/{progress.total:,} trials", False),
+                (f"  {progress.rate():,.0f} trials/s", False),
+                (f"  elapsed {progress.elapsed():.1f} s   remaining ~{progress.remaining():.1f} s", False),
+            ]
+        else:
+            lines.append(("job: none yet", False))
+        lines += [
+            (f"result cache {result_cache.hits} hit / {result_cache.misses} miss", False),
+            (f"flop index {flop_hits} hit / {flop_misses} miss", False),
+        ]
+        return lines
+
+    def _render(self, progress):
+        surface = pygame.Surface(PANEL_SIZE, pygame.SRCALPHA)
+        surface.fill(PANEL_COLOR)
+        for i, (line, warn) in enumerate(self._lines(progress)):
+            surface.blit(self.font.render(line, True, WARN_COLOR if warn else TEXT_COLOR), (8, 6 + i * 18))
+        return surface
+
+    def draw(self, surface, progress=None):
+        if not self.visible:
+            return
+        now = time.perf_counter()
+        if self.surface is None or now - self.rendered_at >= REFRESH_SECONDS:
+            self.surface = self._render(progress)
+            self.rendered_at = now
+        surface.blit(self.surface, self.position)
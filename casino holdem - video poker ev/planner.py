@@ -0,0 +1,224 @@
+import argparse
+import math
+import time
+
+from module_loader import load_hand_bonus
+import backends
+import engines
+import exact_ev
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+#   Picks the engine for a query from what the caller needs instead of a
+#   trial count: a precision (half-width of the 95% interval on an EV, e.g.
+#   0.002) and/or a deadline in milliseconds.
+#
+#   A cost model, calibrated by a short microbenchmark on first use, predicts
+#   the time each path would take:
+#
+#   cache       an exact answer for the same canonical spot already computed
+#   exact       full enumeration; zero error, fixed cost per spot, far
+#               lower once the flop's dealer scores are indexed
+#   sampled     the reference loop     \
+#   vectorized  NumPy batches           |  fixed + per-trial cost; trials
+#   parallel    process pool            |  needed come from a pilot run's
+#   numba       compiled backend        /  per-trial spread
+#
+#   The pilot is skipped when exact fits the deadline and no sampler could
+#   beat it (or fit) once the pilot is paid for.
+#
+#   The cheapest path that meets both targets wins.  If none can meet the
+#   precision in time, the deadline wins and the best precision that fits is
+#   served.  Results carry a 'served_by' entry saying which path answered,
+#   how many trials it ran, and the predicted and actual cost.
+#
+#   run with
+#
+#   python3 planner.py "As Kd" "2c Jh 9s" --precision 0.01
+#   python3 planner.py "As Kd" "2c Jh 9s" --deadline-ms 100
+
+hand_bonus = load_hand_bonus()
+
+# Trials for the pilot run that estimates the per-trial spread
+PILOT_TRIALS = 2000
+# Fewest trials worth running when a deadline is too tight for anything
+MIN_TRIALS = 200
+# Share of a deadline the plan fills, leaving room for model error
+DEADLINE_MARGIN = 0.9
+CALIBRATION_TRIALS = (500, 5000)
+# Turn/rivers timed to price exact enumeration (NumPy does them in chunks of 64)
+CALIBRATION_BOARDS = exact_ev.BOARD_CHUNK * 2
+CALIBRATION_BOARDS_PYTHON = 8
+
+RUNNERS = {'sampled': engines.casino_holdem_sampled}
+if np is not None:
+    RUNNERS['vectorized'] = engines.casino_holdem_vectorized
+RUNNERS['parallel'] = engines.casino_holdem_parallel
+if 'numba' in backends.BACKENDS:
+    RUNNERS['numba'] = lambda hero_str, flop_str, simulations, seed=None: backends.casino_holdem_backend(
+        hero_str, flop_str, simulations, seed, backend='numba')
+
+_model = None
+
+def _time_call(fn, *args, **kwargs):
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+def _exact_cost():
+    # Times exact enumeration over a slice of turn/rivers on the calibration
+    # spot and scales it up to all 1,081: once cold, once more now that the
+    # flop's dealer scores are indexed (see exact_ev.FlopIndex)
+    hero_cards, flop_cards = hand_bonus.parse_hand(*backends.SELECTION_SPOT)
+    boards = CALIBRATION_BOARDS if np is not None else CALIBRATION_BOARDS_PYTHON
+    exact_ev.enumerate_boards(hero_cards, flop_cards, range(1))  # warm up tables
+    cold = _time_call(exact_ev.enumerate_boards, hero_cards, flop_cards, range(1, boards + 1))
+    warm = _time_call(exact_ev.enumerate_boards, hero_cards, flop_cards, range(1, boards + 1))
+    return cold * 1081 / boards, warm * 1081 / boards
+
+def calibrate():
+    # Fits fixed + per-trial seconds for every sampler and prices exact
+    # enumeration from a slice of it
+    global _model
+    hero_str, flop_str = backends.SELECTION_SPOT
+    model = {'samplers': {}}
+    small, large = CALIBRATION_TRIALS
+    for path, runner in RUNNERS.items():
+        runner(hero_str, flop_str, simulations=small, seed=0)  # warm up tables, pools, compilation
+        t_small = _time_call(runner, hero_str, flop_str, simulations=small, seed=1)
+        t_large = _time_call(runner, hero_str, flop_str, simulations=large, seed=2)
+        per_trial = max((t_large - t_small) / (large - small), 1e-9)
+        model['samplers'][path] = (max(t_small - per_trial * small, 0.0), per_trial)
+    model['exact'], model['exact_warm'] = _exact_cost()
+    _model = model
+    return model
+
+def get_model():
+    if _model is None:
+        calibrate()
+    return _model
+
+def predicted_seconds(path, trials=0):
+    model = get_model()
+    if path == 'exact':
+        return model['exact']
+    fixed, per_trial = model['samplers'][path]
+    return fixed + per_trial * trials
+
+def exact_seconds(flop_cards):
+    # Exact cost on this flop: the part of its dealer-score index not built
+    # yet at the cold rate, the rest at the warm rate
+    model = get_model()
+    missing = 1 - exact_ev.flop_index_coverage(flop_cards)
+    return model['exact_warm'] + (model['exact'] - model['exact_warm']) * missing
+
+def _trials_within(path, seconds):
+    fixed, per_trial = get_model()['samplers'][path]
+    return int((seconds - fixed) / per_trial) if seconds > fixed else 0
+
+def _cached_exact(hero_cards, flop_cards):
+    key = ('exact', (), exact_ev.canonical_spot(hero_cards, flop_cards))
+    return key in engines.result_cache
+
+def half_width(results, field):
+    low, high = results[field + '_ci95']
+    return (high - low) / 2
+
+def plan(hero_str, flop_str, precision=None, deadline_ms=None, field='call_minus_fold'):
+    # Returns (path, trials, predicted seconds, pilot results or None)
+    if precision is None and deadline_ms is None:
+        raise ValueError("Give a precision, a deadline, or both.")
+    hero_cards, flop_cards = hand_bonus.parse_hand(hero_str, flop_str)
+    if _cached_exact(hero_cards, flop_cards):
+        return 'cache', 0, 0.0, None
+
+    budget = deadline_ms / 1000 * DEADLINE_MARGIN if deadline_ms is not None else math.inf
+    exact_cost = exact_seconds(flop_cards)
+    samplers = get_model()['samplers']
+    fastest = min(samplers, key=lambda p: samplers[p][1])
+
+    pilot = None
+    options = []
+    if exact_cost <= budget:
+        options.append((exact_cost, 'exact', 0))
+    if precision is not None:
+        pilot_cost = predicted_seconds(fastest, PILOT_TRIALS)
+        # Exact fits, and no sampler can beat it (or fit at all) once the
+        # pilot is paid for: skip the pilot
+        cheapest_sampler = pilot_cost + min(predicted_seconds(p, MIN_TRIALS) for p in samplers)
+        if options and (exact_cost <= cheapest_sampler or cheapest_sampler > budget):
+            return 'exact', 0, exact_cost, None
+        # Trials needed for the precision, from the pilot's per-trial spread;
+        # the pilot's cost is charged to every sampling option
+        pilot = RUNNERS[fastest](hero_str, flop_str, simulations=PILOT_TRIALS)
+        spread = half_width(pilot, field) * math.sqrt(PILOT_TRIALS)
+        needed = max(MIN_TRIALS, math.ceil((spread / precision) ** 2))
+        for path in samplers:
+            cost = pilot_cost + predicted_seconds(path, needed)
+            if cost <= budget:
+                options.append((cost, path, needed))
+        budget -= pilot_cost
+    elif exact_cost > budget:
+        # Deadline only: as many trials as fit on the fastest path
+        path = max(samplers, key=lambda p: _trials_within(p, budget))
+        trials = max(MIN_TRIALS, _trials_within(path, budget))
+        options.append((predicted_seconds(path, trials), path, trials))
+
+    if not options:
+        # The precision can't be met in time: best precision that fits
+        path = max(samplers, key=lambda p: _trials_within(p, budget))
+        trials = max(MIN_TRIALS, _trials_within(path, budget))
+        options.append((predicted_seconds(path, trials), path, trials))
+    cost, path, trials = min(options)
+    return path, trials, cost, pilot
+
+def casino_holdem_auto(hero_str, flop_str, precision=None, deadline_ms=None, field='call_minus_fold', seed=None):
+    get_model()  # calibration is a one-off startup cost, not the query's
+    start = time.perf_counter()
+    path, trials, predicted, pilot = plan(hero_str, flop_str, precision, deadline_ms, field)
+    if path in ('cache', 'exact'):
+        results = engines.casino_holdem_cached(hero_str, flop_str, engine="exact")
+    else:
+        results = RUNNERS[path](hero_str, flop_str, simulations=trials, seed=seed)
+    elapsed = time.perf_counter() - start
+    achieved = half_width(results, field)
+    met = (precision is None or achieved <= precision) and (deadline_ms is None or elapsed * 1000 <= deadline_ms)
+    results['served_by'] = {
+        'path': path,
+        'trials': engines.EXACT_TRIALS if path in ('cache', 'exact') else trials,
+        'pilot_trials': PILOT_TRIALS if pilot is not None else 0,
+        'predicted_ms': predicted * 1000,
+        'elapsed_ms': elapsed * 1000,
+        'half_width': achieved,
+        'target_met': met,
+    }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a spot with the cheapest engine that meets a target")
+    parser.add_argument("hero")
+    parser.add_argument("flop")
+    parser.add_argument("--precision", type=float, help="95%% half-width wanted on the EV field")
+    parser.add_argument("--deadline-ms", type=float)
+    parser.add_argument("--field", default="call_minus_fold", choices=["ante", "play", "bonus", "call_minus_fold"])
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    model = get_model()
+    print(f"calibrated in {time.perf_counter() - start:.2f} s: exact {model['exact'] * 1000:.0f} ms "
+          f"({model['exact_warm'] * 1000:.0f} ms on an indexed flop), " +
+          ", ".join(f"{p} {per * 1e6:.1f} us/trial + {fixed * 1000:.1f} ms"
+                    for p, (fixed, per) in model['samplers'].items()))
+    results = casino_holdem_auto(args.hero, args.flop, args.precision, args.deadline_ms, args.field)
+    served = results['served_by']
+    engines.shutdown()
+    print(f"served by {served['path']} ({served['trials']} trials): predicted {served['predicted_ms']:.0f} ms, "
+          f"took {served['elapsed_ms']:.0f} ms, ±{served['half_width']:.4f} "
+          f"({'target met' if served['target_met'] else 'target missed'})")
+    print(f"call minus fold: {results['call_minus_fold']:.4f}  ({results['recommendation']})")
+
+if __name__ == "__main__":
+    main()
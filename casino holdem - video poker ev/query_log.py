@@ -0,0 +1,193 @@
+from collections import Counter
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+from module_loader import HERE, load_hand_bonus
+import engines
+import exact_ev
+
+#   Query-frequency log and result-cache pre-warming.
+#
+#   Real play keeps coming back to the same few canonical spots, so the
+#   session, the service and the bonus GUI append the canonical key of every
+#   query they answer (engine, options, suit-free flop and hole, the same key
+#   engines' result cache uses) to query_log.jsonl, one short JSON line each:
+#
+#       ["exact", [], [0, 33, 37], [48, 50], 1]
+#
+#   The last field is a count: appends are always 1, and compact() folds the
+#   file into one line per key.  Lines are written with a single append, so
+#   several processes can share the file.  Logging is off until a program
+#   calls enable(); benchmarks and one-off scripts leave no trace.
+#
+#   At startup those programs call start_prewarm(), which computes the
+#   hottest spots on a background thread and puts them in engines'
+#   result_cache, hottest first, until it runs out of spots, time or memory
+#   (the summed size of the results it added).  The flop dealer-score
+#   indexes exact queries build along the way are bounded by exact_ev's own
+#   FLOP_INDEX_CACHE.
+#
+#   run with
+#
+#   python3 query_log.py top --limit 20
+#   python3 query_log.py prewarm --top 50 --seconds 30
+#   python3 query_log.py compact
+
+hand_bonus = load_hand_bonus()
+
+LOG_PATH = os.path.join(HERE, "query_log.jsonl")
+# enable() folds the log into per-key counts once it grows past this
+COMPACT_BYTES = 1 << 20
+PREWARM_TOP = 64
+PREWARM_SECONDS = 30.0
+PREWARM_BYTES = 16 << 20
+
+_log_path = None
+_lock = threading.Lock()
+
+def enable(path=LOG_PATH):
+    # Start logging this process's queries to path
+    global _log_path
+    if os.path.exists(path) and os.path.getsize(path) > COMPACT_BYTES:
+        compact(path)
+    _log_path = path
+
+def cache_key(engine, options, hero_cards, flop_cards):
+    # engines.casino_holdem_cached's key; options without the seed
+    kept = tuple(sorted((k, v) for k, v in options if k != 'seed'))
+    return (engine, kept, exact_ev.canonical_spot(hero_cards, flop_cards))
+
+def record(engine, options, hero_cards, flop_cards):
+    if _log_path is None:
+        return
+    engine, kept, (flop, hole) = cache_key(engine, options, hero_cards, flop_cards)
+    line = json.dumps([engine, kept, flop, hole, 1]) + "\n"
+    with _lock, open(_log_path, "a") as f:
+        f.write(line)
+
+def load_counts(path=LOG_PATH):
+    # Counter of cache keys; lines cut short by a crash are skipped
+    counts = Counter()
+    if not os.path.exists(path):
+        return counts
+    with open(path) as f:
+        for line in f:
+            try:
+                engine, options, flop, hole, count = json.loads(line)
+            except ValueError:
+                continue
+            counts[(engine, tuple(tuple(o) for o in options), (tuple(flop), tuple(hole)))] += count
+    return counts
+
+def compact(path=LOG_PATH):
+    counts = load_counts(path)
+    with open(path + ".tmp", "w") as f:
+        for (engine, options, (flop, hole)), count in counts.most_common():
+            f.write(json.dumps([engine, options, flop, hole, count]) + "\n")
+    os.replace(path + ".tmp", path)
+    return counts
+
+def hottest(limit, path=LOG_PATH):
+    # [(key, count)], most asked first; keys 'cached' can't be replayed are left out
+    counts = load_counts(path)
+    return [(key, count) for key, count in counts.most_common() if key[0] in engines.ENGINES
+            and key[0] != 'cached'][:limit]
+
+def _card_name(index):
+    return exact_ev.RANKS[index // 4] + exact_ev.SUITS[index % 4]
+
+def spot_strings(key):
+    # (hero_str, flop_str) of a cache key's canonical spot
+    flop, hole = key[2]
+    return " ".join(map(_card_name, hole)), " ".join(map(_card_name, flop))
+
+def _size(value):
+    # Rough bytes held by a result dict
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_size(k) + _size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_size(v) for v in value)
+    return sys.getsizeof(value)
+
+class Prewarm:
+    # Progress of one pre-warm run; read by whoever started it
+    def __init__(self, top, seconds, max_bytes):
+        self.top = top
+        self.seconds = seconds
+        self.max_bytes = max_bytes
+        self.warmed = 0
+        self.skipped = 0
+        self.bytes = 0
+        self.stopped_by = None
+        self.elapsed = 0.0
+        self.finished = False
+
+    def run(self, path=LOG_PATH, compute=None):
+        # compute(engine, hero_str, flop_str, options) -> results; defaults
+        # to running the engine here
+        compute = compute or (lambda engine, hero_str, flop_str, options:
+                              engines.run_engine(engine, hero_str, flop_str, **dict(options)))
+        start = time.perf_counter()
+        try:
+            for key, _ in hottest(self.top, path):
+                if time.perf_counter() - start >= self.seconds:
+                    self.stopped_by = "time"
+                    break
+                if self.bytes >= self.max_bytes:
+                    self.stopped_by = "memory"
+                    break
+                if key in engines.result_cache:
+                    self.skipped += 1
+                    continue
+                engine, options, _ = key
+                results = compute(engine, *spot_strings(key), options)
+                if 'error' in results:
+                    continue
+                engines.result_cache.put(key, results)
+                self.warmed += 1
+                self.bytes += _size(results)
+        finally:
+            self.elapsed = time.perf_counter() - start
+            self.finished = True
+        return self
+
+def start_prewarm(top=PREWARM_TOP, seconds=PREWARM_SECONDS, max_bytes=PREWARM_BYTES, path=LOG_PATH, compute=None):
+    # Pre-warms on a daemon thread; returns its Prewarm
+    prewarm = Prewarm(top, seconds, max_bytes)
+    threading.Thread(target=prewarm.run, args=(path, compute), daemon=True).start()
+    return prewarm
+
+def main():
+    parser = argparse.ArgumentParser(description="Query-frequency log and result-cache pre-warming")
+    parser.add_argument("--log", default=LOG_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    top = commands.add_parser("top", help="most asked spots")
+    top.add_argument("--limit", type=int, default=20)
+    warm = commands.add_parser("prewarm", help="time a pre-warm run in the foreground")
+    warm.add_argument("--top", type=int, default=PREWARM_TOP)
+    warm.add_argument("--seconds", type=float, default=PREWARM_SECONDS)
+    warm.add_argument("--mb", type=float, default=PREWARM_BYTES / (1 << 20))
+    commands.add_parser("compact", help="fold the log into one line per spot")
+    args = parser.parse_args()
+
+    if args.command == "top":
+        total = sum(load_counts(args.log).values())
+        for key, count in hottest(args.limit, args.log):
+            hero_str, flop_str = spot_strings(key)
+            options = " ".join(f"{k}={v}" for k, v in key[1])
+            print(f"{count:>8}  {count / total * 100:5.1f}%  {hero_str} | {flop_str}  {key[0]} {options}")
+    elif args.command == "prewarm":
+        engines.prepare('exact')
+        prewarm = Prewarm(args.top, args.seconds, args.mb * (1 << 20)).run(args.log)
+        print(f"warmed {prewarm.warmed} spots ({prewarm.bytes / 1024:.0f} KiB) in {prewarm.elapsed:.1f} s"
+              + (f", stopped by the {prewarm.stopped_by} budget" if prewarm.stopped_by else ""))
+    else:
+        counts = compact(args.log)
+        print(f"{len(counts)} spots, {sum(counts.values())} queries -> {args.log}")
+
+if __name__ == "__main__":
+    main()
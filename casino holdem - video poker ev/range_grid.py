@@ -0,0 +1,244 @@
+import argparse
+import time
+
+import pygame
+
+from module_loader import load_hand_bonus
+import engines
+import exact_ev
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+#   Whole-range grid: exact call EV of every hole on one flop, shown as the
+#   13x13 starting-hand grid (pairs on the diagonal, suited above it,
+#   offsuit below).
+#
+#   Every hole is priced off the flop's FlopIndex, built in full: the dealer
+#   scores of all 1,176 turn/rivers are computed once, and they already hold
+#   every hole's own score, so no hand is evaluated twice.  Per turn/river a
+#   cumulative count of dealer scores turns each hole's showdown counts into
+#   table lookups, and its payouts are summed in NumPy.  Holes that are suit
+#   relabellings of each other on this flop are priced once.
+#   RangeGrid.run() fills the grid one hole at a time, first one combo per
+#   cell and then the rest, so the GUI can draw it while it runs.
+#
+#   Cells are coloured by call minus fold (green: call, red: fold; a gold
+#   border marks cells whose combos don't all agree).  Hovering a cell shows
+#   its numbers.
+#
+#   run with
+#
+#   python3 range_grid.py "2c Jh 9s"
+#
+#   Needs numpy.
+
+hand_bonus = load_hand_bonus()
+
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+GREY = (170, 170, 170)
+BLUE = (0, 0, 220)
+GOLD = (218, 165, 32)
+CALL_COLOR = (30, 170, 30)
+FOLD_COLOR = (220, 30, 30)
+
+RANK_LABELS = "23456789TJQKA"
+
+def cell_of(hole):
+    # (row, col) of a hole (card indices); ranks run A..2 down and across
+    (high, low) = sorted(hole, reverse=True)
+    row, col = 12 - high // 4, 12 - low // 4
+    if high % 4 == low % 4:
+        return row, col   # suited: above the diagonal
+    return col, row       # offsuit (or a pair, on the diagonal)
+
+def cell_label(row, col):
+    high, low = RANK_LABELS[12 - min(row, col)], RANK_LABELS[12 - max(row, col)]
+    return high + low + ("s" if row < col else "o" if row > col else "")
+
+class FlopRange:
+    # Every hole on one flop at once.  A hole's score on a turn/river is the
+    # FlopIndex's score for that pair of cards as a dealer hand, so nothing
+    # is evaluated again, and per turn/river a table of how many dealer
+    # hands score below each value turns every showdown count into a lookup
+    # instead of a binary search.
+    def __init__(self, flop_cards):
+        self.index = exact_ev.flop_index(flop_cards)
+        n = len(self.index.pairs)
+        self.index.build(np.arange(n))
+        self.pair_of = {tuple(pair): i for i, pair in enumerate(self.index.pairs.tolist())}
+        width = exact_ev.MAX_SCORE + 2  # scores run 1..MAX_SCORE; board overlaps go in the last column
+        raw = np.minimum(self.index.raw, width - 1).astype(np.int64)
+        counts = np.bincount((np.arange(n)[:, None] * width + raw).ravel(), minlength=n * width).reshape(n, width)
+        # below[b, s]: live dealer hands on turn/river b scoring under s
+        self.below = (np.cumsum(counts, axis=1) - counts).astype(np.int16)
+
+    def hole_evs(self, hero_cards):
+        # (call EV, bonus EV) of one hole; the same sums as spot_totals
+        index = self.index
+        hole = self.pair_of[tuple(sorted(index.positions[c] for c in hero_cards))]
+        boards = np.flatnonzero(~index.overlap[hole])
+        # raw is symmetric (board and dealer pairs swap), so read rows, not columns
+        scores = index.raw[hole, boards].astype(np.int64)
+        qualify = hand_bonus.DEALER_QUALIFY_MAX_SCORE
+        below = self.below
+        lt = below[boards, scores].astype(np.int64)
+        le = below[boards, scores + 1].astype(np.int64)
+        lose_q = below[boards, np.minimum(scores, qualify + 1)].astype(np.int64)
+        win_q = below[boards, qualify + 1].astype(np.int64) - below[boards, np.minimum(scores, qualify) + 1]
+        ties = le - lt
+        lose_nq = lt - lose_q
+        win_nq = index.live[boards] - le - win_q
+
+        # Take back the dealer hands that hold one of the hero's cards
+        blocked = index.raw[np.flatnonzero(index.overlap[hole])][:, boards]
+        live = blocked != exact_ev.SCORE_SENTINEL
+        qualifies = blocked <= qualify
+        better = blocked < scores
+        worse = (blocked > scores) & live
+        lose_q -= (better & qualifies).sum(axis=0)
+        lose_nq -= (better & ~qualifies).sum(axis=0)
+        ties -= (blocked == scores).sum(axis=0)
+        win_q -= (worse & qualifies).sum(axis=0)
+        win_nq -= (worse & ~qualifies).sum(axis=0)
+
+        classes = np.searchsorted(np.array(hand_bonus.HAND_CLASS_MAX_SCORES), scores) + 1
+        ante_payout = np.array(engines.ANTE_BY_CLASS)[classes]
+        bonus = np.array(exact_ev.BONUS_BY_CLASS)[classes]
+        bonus[(classes == 9) & (scores <= hand_bonus.PAIR_OF_ACES_MAX_SCORE)] = exact_ev.PAIR_OF_ACES_BONUS
+        bonus = np.where(bonus > 0, bonus, -1)
+
+        # Ante pays when the hero wins or the dealer doesn't qualify, play
+        # only moves against a qualifying dealer
+        dealers = win_q + win_nq + ties + lose_q + lose_nq
+        trials = int(dealers.sum())
+        ante = int((ante_payout * (win_q + win_nq + lose_nq)).sum() - lose_q.sum())
+        play = int(2 * (win_q.sum() - lose_q.sum()))
+        return (ante + play) / trials, int((bonus * dealers).sum()) / trials
+
+class RangeGrid:
+    # Filled in by run() (usually on a worker thread) and read by draw();
+    # cells map (row, col) to [combos, combos done, summed call EV, calls]
+    def __init__(self, flop_str):
+        if np is None:
+            raise RuntimeError("The range grid needs numpy (pip install numpy)")
+        self.flop_cards = [hand_bonus.parse_card(c) for c in flop_str.split()]
+        if len(self.flop_cards) != 3 or len(set(self.flop_cards)) != 3:
+            raise ValueError("Enter 3 different flop cards.")
+        self.flop_str = flop_str
+        flop = tuple(sorted(exact_ev.card_index(c) for c in self.flop_cards))
+        by_cell = {}
+        for key, holes in exact_ev.hole_orbits(flop):
+            by_cell.setdefault(cell_of(key), []).append((key, len(holes)))
+        self.cells = {cell: [sum(n for _, n in orbits), 0, 0.0, 0] for cell, orbits in by_cell.items()}
+        # One group per cell first, then the rest, so the grid fills in coarse to fine
+        queues = list(by_cell.items())
+        self.order = []
+        while queues:
+            self.order += [(cell, orbits.pop(0)) for cell, orbits in queues]
+            queues = [(cell, orbits) for cell, orbits in queues if orbits]
+        self.total = sum(cell[0] for cell in self.cells.values())
+        self.done = 0
+        self.started = None
+        self.finished = None
+        self.cancelled = False
+        self.error = None
+
+    def run(self):
+        self.started = time.perf_counter()
+        try:
+            flop_range = FlopRange(self.flop_cards)
+            for cell, (key, combos) in self.order:
+                if self.cancelled:
+                    return
+                call_ev, _ = flop_range.hole_evs([exact_ev.index_to_card(i) for i in key])
+                stats = self.cells[cell]
+                stats[1] += combos
+                stats[2] += call_ev * combos
+                stats[3] += combos if call_ev > -1 else 0
+                self.done += combos
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            self.finished = time.perf_counter()
+
+    def cell_call_ev(self, cell):
+        # Mean call EV of the combos done so far, or None
+        combos, done, total, _ = self.cells.get(cell, (0, 0, 0.0, 0))
+        return total / done if done else None
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+def _color(value, scale):
+    # White at zero, blending to CALL_COLOR / FOLD_COLOR at +/- scale
+    if value is None:
+        return GREY
+    weight = min(abs(value) / scale, 1.0)
+    target = CALL_COLOR if value >= 0 else FOLD_COLOR
+    return tuple(int(255 + (c - 255) * weight) for c in target)
+
+def draw(surface, rect, grid, font, mouse_pos=None):
+    pygame.draw.rect(surface, WHITE, rect, border_radius=10)
+    pygame.draw.rect(surface, BLACK, rect, 2, border_radius=10)
+    state = "done" if grid.finished is not None else "running"
+    title = font.render(f"Call minus fold, every hole on {grid.flop_str}: {grid.done}/{grid.total} combos, "
+                        f"{grid.elapsed():.1f} s ({state})", True, BLUE)
+    surface.blit(title, (rect.left + 15, rect.top + 10))
+
+    size_h = min((rect.height - 45) // 13, 24)
+    size_w = size_h * 2
+    left, top = rect.left + 15, rect.top + 35
+    hovered = None
+    for row in range(13):
+        for col in range(13):
+            cell = pygame.Rect(left + col * size_w, top + row * size_h, size_w - 1, size_h - 1)
+            combos, done, _, calls = grid.cells.get((row, col), (0, 0, 0.0, 0))
+            call_ev = grid.cell_call_ev((row, col))
+            pygame.draw.rect(surface, _color(None if call_ev is None else call_ev + 1, 1.0), cell)
+            if done and 0 < calls < done:
+                pygame.draw.rect(surface, GOLD, cell, 2)
+            label = font.render(cell_label(row, col), True, BLACK)
+            surface.blit(label, label.get_rect(center=cell.center))
+            if mouse_pos is not None and cell.collidepoint(mouse_pos):
+                hovered = (row, col)
+
+    # Summary and the hovered cell on the right
+    x = left + 13 * size_w + 20
+    calls = sum(c[3] for c in grid.cells.values())
+    lines = [f"call with {calls}/{grid.done} combos done" if grid.done else "starting..."]
+    if grid.error:
+        lines.append(f"Error: {grid.error}")
+    if hovered is not None:
+        combos, done, _, cell_calls = grid.cells.get(hovered, (0, 0, 0.0, 0))
+        call_ev = grid.cell_call_ev(hovered)
+        lines += ["", cell_label(*hovered), f"{combos} live combos, {done} done"]
+        if call_ev is not None:
+            lines += [f"call EV          {call_ev:+.4f}", f"call minus fold  {call_ev + 1:+.4f}",
+                      f"call with {cell_calls} of {done} combos"]
+    for i, line in enumerate(lines):
+        surface.blit(font.render(line, True, BLACK), (x, top + i * 18))
+
+def main():
+    parser = argparse.ArgumentParser(description="Exact call minus fold of every hole on a flop")
+    parser.add_argument("flop")
+    args = parser.parse_args()
+
+    grid = RangeGrid(args.flop)
+    grid.run()
+    if grid.error:
+        raise SystemExit(f"Error: {grid.error}")
+    print("      " + "".join(f"{RANK_LABELS[12 - col]:>7}" for col in range(13)))
+    for row in range(13):
+        values = [grid.cell_call_ev((row, col)) for col in range(13)]
+        print(f"{RANK_LABELS[12 - row]:>6}" + "".join(f"{v + 1:>+7.2f}" if v is not None else "     --"
+                                                     for v in values))
+    print(f"\n{grid.total} combos in {grid.elapsed():.1f} s; suited above the diagonal, offsuit below")
+
+if __name__ == "__main__":
+    main()
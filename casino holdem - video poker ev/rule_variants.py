@@ -0,0 +1,176 @@
+import argparse
+
+from module_loader import load_hand_bonus
+import engines
+import exact_ev
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+#   Rule-variant sweep: one enumeration (or one simulation) of a spot priced
+#   under every dealer-qualification threshold and every pair-bonus rule.
+#
+#   Instead of payouts, each deal is counted in a histogram keyed by
+#
+#   hero key     hand class, with one pair split by pair rank (22 keys)
+#   dealer band  two pair or better, pair of aces ... pair of 2s, high card
+#   outcome      hero wins, ties or loses the showdown
+#
+#   Qualification only decides which dealer bands count as qualifying, and
+#   the pair bonus only which hero pair ranks pay, so every variant is a
+#   weighted sum over the same histogram.  Ante and play depend only on the
+#   qualification rule and the bonus only on the bonus rule, so the two are
+#   swept separately; the call/fold decision doesn't involve the bonus.
+#
+#   The house rules (pair of 4s, pair bonus on aces only) are marked with *.
+#
+#   run with
+#
+#   python3 rule_variants.py "As Kd" "2c Jh 9s"
+#   python3 rule_variants.py "As Kd" "2c Jh 9s" --simulations 200000
+#
+#   Needs numpy.
+
+hand_bonus = load_hand_bonus()
+
+RANK_NAMES = ["2s", "3s", "4s", "5s", "6s", "7s", "8s", "9s", "10s", "Js", "Qs", "Ks", "Aces"]
+TWO_PAIR_MAX_SCORE = hand_bonus.HAND_CLASS_MAX_SCORES[7]
+PAIR_RANK_OF_QUALIFIER = 2  # house rule: pair of 4s (ranks run 0=2 .. 12=A)
+PAIR_RANK_OF_BONUS = 12     # house rule: pair bonus on aces only
+
+# Dealer bands by worst score: two pair or better, then one band per pair
+# rank from aces down to 2s, then high card
+DEALER_BAND_MAX_SCORES = ([TWO_PAIR_MAX_SCORE] +
+                          [TWO_PAIR_MAX_SCORE + (k + 1) * hand_bonus.PAIR_SCORES_PER_RANK for k in range(13)] +
+                          [exact_ev.MAX_SCORE])
+HIGH_CARD_BAND = len(DEALER_BAND_MAX_SCORES) - 1
+
+# Hero keys: classes 1-8, then one pair by rank 2s..aces, then high card
+PAIR_KEY_BASE = 8
+HIGH_CARD_KEY = PAIR_KEY_BASE + 13
+HERO_KEYS = HIGH_CARD_KEY + 1
+
+def _band_of_pair_rank(rank):
+    return 13 - rank
+
+def qualify_rules():
+    # (label, dealer bands that qualify): no qualifier, pair of 2s ... aces,
+    # two pair
+    rules = [("any hand", HIGH_CARD_BAND + 1)]
+    for rank in range(13):
+        rules.append((f"pair of {RANK_NAMES[rank]}+", _band_of_pair_rank(rank) + 1))
+    rules.append(("two pair+", 1))
+    return rules
+
+def bonus_rules():
+    # (label, lowest pair rank the pair bonus pays on; 13 = never)
+    rules = [(f"pair of {RANK_NAMES[rank]}+", rank) for rank in range(13)]
+    rules.append(("no pair bonus", 13))
+    return rules
+
+def hero_keys(scores):
+    scores = np.asarray(scores)
+    classes = np.searchsorted(np.array(hand_bonus.HAND_CLASS_MAX_SCORES), scores) + 1
+    pair_rank = 12 - (scores - TWO_PAIR_MAX_SCORE - 1) // hand_bonus.PAIR_SCORES_PER_RANK
+    return np.where(classes <= 8, classes - 1,
+                    np.where(classes == 9, PAIR_KEY_BASE + pair_rank, HIGH_CARD_KEY))
+
+def histogram_from_scores(hero_scores, dealer_scores):
+    hero_scores = np.asarray(hero_scores)
+    dealer_scores = np.asarray(dealer_scores)
+    bands = np.searchsorted(np.array(DEALER_BAND_MAX_SCORES), dealer_scores, 'left')
+    outcome = np.where(hero_scores < dealer_scores, 0, np.where(hero_scores == dealer_scores, 1, 2))
+    cell = (hero_keys(hero_scores) * len(DEALER_BAND_MAX_SCORES) + bands) * 3 + outcome
+    counts = np.bincount(cell, minlength=HERO_KEYS * len(DEALER_BAND_MAX_SCORES) * 3)
+    return counts.reshape(HERO_KEYS, len(DEALER_BAND_MAX_SCORES), 3)
+
+def sample_histogram(hero_cards, flop_cards, simulations, rng):
+    return histogram_from_scores(*engines.sample_scores_numpy(hero_cards, flop_cards, simulations, rng))
+
+def exact_histogram(hero_cards, flop_cards):
+    # Every deal of the spot, counted per band straight off the flop's
+    # dealer-score index
+    index = exact_ev.flop_index(flop_cards)
+    _, hero_scores, wins, ties, losses = index.showdown_counts(hero_cards, DEALER_BAND_MAX_SCORES)
+    histogram = np.zeros((HERO_KEYS, len(DEALER_BAND_MAX_SCORES), 3), dtype=np.int64)
+    np.add.at(histogram, hero_keys(hero_scores), np.stack([wins, ties, losses], axis=2))
+    return histogram
+
+def _key_payouts():
+    # Ante payout and bonus payout (pair bonus aside) per hero key
+    classes = list(range(1, 9)) + [9] * 13 + [10]
+    ante = np.array([engines.ANTE_BY_CLASS[c] for c in classes])
+    bonus = np.array([exact_ev.BONUS_BY_CLASS[c] for c in classes])
+    return ante, np.where(bonus > 0, bonus, -1)
+
+def sweep(histogram):
+    trials = int(histogram.sum())
+    ante_payout, bonus_payout = _key_payouts()
+    wins, ties, losses = histogram[:, :, 0], histogram[:, :, 1], histogram[:, :, 2]
+
+    qualify = []
+    for label, qualifying_bands in qualify_rules():
+        q = np.arange(len(DEALER_BAND_MAX_SCORES)) < qualifying_bands
+        # Ante pays when the hero wins or the dealer doesn't qualify; play
+        # only moves against a qualifying dealer (see score_deal)
+        ante = int((ante_payout[:, None] * (wins + losses * ~q)).sum() - (losses * q).sum())
+        play = int(2 * (wins * q).sum() - 2 * (losses * q).sum())
+        call_minus_fold = (ante + play) / trials + 1
+        qualify.append({
+            'rule': label,
+            'house': qualifying_bands == _band_of_pair_rank(PAIR_RANK_OF_QUALIFIER) + 1,
+            'ante_ev': ante / trials,
+            'play_ev': play / trials,
+            'call_minus_fold': call_minus_fold,
+            'recommendation': "CALL" if call_minus_fold > 0 else "FOLD",
+            # Ante + play EV per hand played well, before the bonus
+            'optimal_ev': max((ante + play) / trials, -1.0),
+        })
+
+    per_key = histogram.sum(axis=(1, 2))
+    bonus = []
+    for label, lowest_rank in bonus_rules():
+        payouts = bonus_payout.copy()
+        payouts[PAIR_KEY_BASE + lowest_rank:PAIR_KEY_BASE + 13] = exact_ev.PAIR_OF_ACES_BONUS
+        hits = int(per_key[payouts > 0].sum())
+        bonus.append({
+            'rule': label,
+            'house': lowest_rank == PAIR_RANK_OF_BONUS,
+            'bonus_ev': int((per_key * payouts).sum()) / trials,
+            'bonus_hit_rate': hits / trials * 100,
+        })
+    return {'trials': trials, 'qualify': qualify, 'bonus': bonus}
+
+def casino_holdem_variants(hero_str, flop_str, simulations=None, seed=None):
+    # simulations=None enumerates every deal
+    if np is None:
+        raise RuntimeError("The rule-variant sweep needs numpy (pip install numpy)")
+    hero_cards, flop_cards = hand_bonus.parse_hand(hero_str, flop_str)
+    if simulations is None:
+        histogram = exact_histogram(hero_cards, flop_cards)
+    else:
+        histogram = sample_histogram(hero_cards, flop_cards, simulations, np.random.default_rng(seed))
+    return sweep(histogram)
+
+def main():
+    parser = argparse.ArgumentParser(description="Price a spot under every qualification and pair-bonus rule")
+    parser.add_argument("hero")
+    parser.add_argument("flop")
+    parser.add_argument("--simulations", type=int, help="sample instead of enumerating every deal")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    results = casino_holdem_variants(args.hero, args.flop, args.simulations, args.seed)
+    print(f"{results['trials']:,} deals\n")
+    print(f"  {'dealer qualifies with':22} {'ante EV':>9} {'play EV':>9} {'call-fold':>10}  decision")
+    for row in results['qualify']:
+        print(f"{'*' if row['house'] else ' '} {row['rule']:22} {row['ante_ev']:>+9.4f} {row['play_ev']:>+9.4f} "
+              f"{row['call_minus_fold']:>+10.4f}  {row['recommendation']}")
+    print(f"\n  {'pair bonus pays on':22} {'bonus EV':>9} {'hit rate':>9}")
+    for row in results['bonus']:
+        print(f"{'*' if row['house'] else ' '} {row['rule']:22} {row['bonus_ev']:>+9.4f} {row['bonus_hit_rate']:>8.2f}%")
+
+if __name__ == "__main__":
+    main()
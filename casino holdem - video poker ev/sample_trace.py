@@ -0,0 +1,230 @@
+import argparse
+import json
+import os
+import random
+import sys
+
+from module_loader import load_hand_bonus
+import engines
+import exact_ev
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+#   Binary traces of the reference simulation, for looking at the samples
+#   behind an estimate and pricing them again without re-running it.
+#
+#   record   runs the reference run_simulations with a sink that writes
+#            every trial as one fixed-width record (so a seed gives the
+#            same deals and totals as casino_holdem_simulation's rng)
+#   show     prints records
+#   replay   scores every recorded deal again with the reference evaluator
+#            and settle_deal, checking the scores and qualification flags
+#            against the recorded ones
+#   reprice  prices one or more traces of the same spot under a paytable,
+#            without evaluating anything: every deal's scores are recorded
+#
+#   File layout (little-endian): a 32-byte header
+#
+#       magic "CHTRACE1", hero cards (2 x u1), flop cards (3 x u1), 3 pad
+#       bytes, seed (i8, -1 for none), 8 reserved bytes
+#
+#   then 9 bytes per trial
+#
+#       dealer cards (2 x u1), turn and river (2 x u1), hero score (u2),
+#       dealer score (u2), dealer qualifies (u1)
+#
+#   Cards are exact_ev card indices (rank * 4 + suit).  read_trace() maps the
+#   records with numpy.memmap, so nothing is copied until it is used.
+#
+#   A paytable for reprice is a JSON object with any of the keys of
+#   engines.HOUSE_PAYTABLE; missing keys keep the house values.
+#
+#   run with
+#
+#   python3 sample_trace.py record "As Kd" "2c Jh 9s" --simulations 100000 --seed 7 --output spot.trace
+#   python3 sample_trace.py show spot.trace --limit 10
+#   python3 sample_trace.py replay spot.trace
+#   python3 sample_trace.py reprice spot.trace --paytable rules.json
+#
+#   Needs numpy.
+
+hand_bonus = load_hand_bonus()
+
+MAGIC = b"CHTRACE1"
+if np is not None:
+    HEADER_DTYPE = np.dtype([('magic', 'S8'), ('hero', 'u1', 2), ('flop', 'u1', 3), ('pad', 'u1', 3),
+                             ('seed', '<i8'), ('reserved', 'u1', 8)])
+    RECORD_DTYPE = np.dtype([('dealer', 'u1', 2), ('turn_river', 'u1', 2), ('hero_score', '<u2'),
+                             ('dealer_score', '<u2'), ('qualifies', 'u1')])
+# Records buffered before each write
+RECORD_CHUNK = 65536
+
+def record(hero_cards, flop_cards, simulations, path, seed=None, evaluator=None):
+    # The totals casino_holdem_simulation would give, writing the trace as
+    # it goes
+    if np is None:
+        raise RuntimeError("Sample traces need numpy (pip install numpy)")
+    rng = random.Random(seed) if seed is not None else None
+    evaluator = evaluator or exact_ev.get_evaluator()
+    index = {card: exact_ev.card_index(card) for card in hand_bonus.create_deck_without_cards(hero_cards + flop_cards)}
+
+    header = np.zeros(1, HEADER_DTYPE)
+    header['magic'] = MAGIC
+    header['hero'] = [exact_ev.card_index(c) for c in hero_cards]
+    header['flop'] = [exact_ev.card_index(c) for c in flop_cards]
+    header['seed'] = -1 if seed is None else seed
+    buffer = np.empty(RECORD_CHUNK, RECORD_DTYPE)
+
+    filled = 0
+    with open(path, "wb") as f:
+        f.write(header.tobytes())
+
+        def sink(villain_cards, turn_river, hero_score, villain_score, villain_qualifies):
+            nonlocal filled
+            buffer[filled] = ((index[villain_cards[0]], index[villain_cards[1]]),
+                              (index[turn_river[0]], index[turn_river[1]]),
+                              hero_score, villain_score, villain_qualifies)
+            filled += 1
+            if filled == RECORD_CHUNK:
+                f.write(buffer.tobytes())
+                filled = 0
+
+        totals = hand_bonus.run_simulations(hero_cards, flop_cards, simulations, evaluator, rng, sink)
+        f.write(buffer[:filled].tobytes())
+    return totals
+
+def read_trace(path):
+    # (header, records): records is a read-only memmap
+    if np is None:
+        raise RuntimeError("Sample traces need numpy (pip install numpy)")
+    header = np.fromfile(path, HEADER_DTYPE, count=1)
+    if len(header) != 1 or header['magic'][0] != MAGIC:
+        raise ValueError(f"{path}: not a sample trace")
+    size = os.path.getsize(path) - HEADER_DTYPE.itemsize
+    if size % RECORD_DTYPE.itemsize:
+        raise ValueError(f"{path}: truncated ({size % RECORD_DTYPE.itemsize} stray bytes)")
+    if size == 0:
+        return header[0], np.empty(0, RECORD_DTYPE)
+    return header[0], np.memmap(path, RECORD_DTYPE, mode="r", offset=HEADER_DTYPE.itemsize)
+
+def card_name(index):
+    return exact_ev.RANKS[index // 4] + exact_ev.SUITS[index % 4]
+
+def spot_of(header):
+    hero = [exact_ev.index_to_card(int(i)) for i in header['hero']]
+    flop = [exact_ev.index_to_card(int(i)) for i in header['flop']]
+    return hero, flop
+
+def load_paytable(path=None):
+    paytable = dict(engines.HOUSE_PAYTABLE)
+    if path is not None:
+        with open(path) as f:
+            overrides = json.load(f)
+        unknown = set(overrides) - set(paytable)
+        if unknown:
+            raise ValueError(f"Unknown paytable keys: {', '.join(sorted(unknown))}")
+        paytable.update(overrides)
+    return paytable
+
+def reprice(paths, paytable=engines.HOUSE_PAYTABLE):
+    # Totals over every record of the traces, priced under paytable
+    spot = None
+    totals = None
+    for path in paths:
+        header, records = read_trace(path)
+        if spot is None:
+            spot = spot_of(header)
+        elif spot_of(header) != spot:
+            raise ValueError(f"{path}: a different spot from {paths[0]}")
+        payouts = engines.payouts_from_scores(records['hero_score'].astype(np.int64),
+                                              records['dealer_score'].astype(np.int64), paytable)
+        part = engines.totals_from_payouts(*payouts)
+        totals = part if totals is None else hand_bonus.merge_totals(totals, part)
+    return totals
+
+def replay(path, evaluator=None):
+    # Re-scores every record with the reference; returns (totals, indices of
+    # records whose scores or flag differ from what was recorded)
+    evaluator = evaluator or exact_ev.get_evaluator()
+    header, records = read_trace(path)
+    hero_cards, flop_cards = spot_of(header)
+    cards = [exact_ev.index_to_card(i) for i in range(52)]
+    mismatches = []
+
+    def deals():
+        for i, (dealer, turn_river, hero_score, dealer_score, qualifies) in enumerate(records.tolist()):
+            villain_cards = [cards[c] for c in dealer]
+            board = flop_cards + [cards[c] for c in turn_river]
+            scored = (evaluator.evaluate(board, hero_cards), evaluator.evaluate(board, villain_cards),
+                      hand_bonus.dealer_qualifies(board, villain_cards, evaluator))
+            if scored != (hero_score, dealer_score, bool(qualifies)):
+                mismatches.append(i)
+            yield hand_bonus.settle_deal(hero_cards, board, *scored)
+
+    return hand_bonus.tally_outcomes(deals(), len(records)), mismatches
+
+def print_summary(totals):
+    results = hand_bonus.results_from_totals(totals)
+    low, high = results['call_minus_fold_ci95']
+    print(f"trials:            {totals['trials']:,}")
+    print(f"ante EV:           {results['ante_ev']:+.4f}")
+    print(f"play EV:           {results['play_ev']:+.4f}")
+    print(f"bonus EV:          {results['bonus_ev']:+.4f}")
+    print(f"call minus fold:   {results['call_minus_fold']:+.4f}  [{low:+.4f}, {high:+.4f}]")
+    print(f"recommendation:    {results['recommendation']} | bonus: {results['bonus_recommendation']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Record, replay and re-price binary sample traces")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_cmd = commands.add_parser("record", help="simulate a spot, writing every trial to a trace")
+    record_cmd.add_argument("hero")
+    record_cmd.add_argument("flop")
+    record_cmd.add_argument("--simulations", type=int, default=10000)
+    record_cmd.add_argument("--seed", type=int)
+    record_cmd.add_argument("--output", required=True)
+    show = commands.add_parser("show", help="print records")
+    show.add_argument("trace")
+    show.add_argument("--start", type=int, default=0)
+    show.add_argument("--limit", type=int, default=20)
+    replay_cmd = commands.add_parser("replay", help="score every recorded deal again and compare")
+    replay_cmd.add_argument("trace")
+    reprice_cmd = commands.add_parser("reprice", help="price traces of one spot under a paytable")
+    reprice_cmd.add_argument("traces", nargs="+")
+    reprice_cmd.add_argument("--paytable", help="JSON with any of: " + ", ".join(engines.HOUSE_PAYTABLE))
+    args = parser.parse_args()
+
+    if args.command == "record":
+        hero_cards, flop_cards = hand_bonus.parse_hand(args.hero, args.flop)
+        print_summary(record(hero_cards, flop_cards, args.simulations, args.output, args.seed))
+        print(f"wrote {args.output} ({os.path.getsize(args.output):,} bytes)")
+    elif args.command == "show":
+        header, records = read_trace(args.trace)
+        hero_cards, flop_cards = spot_of(header)
+        seed = int(header['seed'])
+        print(f"{' '.join(map(hand_bonus.print_card, hero_cards))} on {' '.join(map(hand_bonus.print_card, flop_cards))}: "
+              f"{len(records):,} trials, seed {'none' if seed < 0 else seed}")
+        for i in range(args.start, min(args.start + args.limit, len(records))):
+            r = records[i]
+            print(f"{i:>9}  dealer {card_name(r['dealer'][0])} {card_name(r['dealer'][1])}  "
+                  f"turn/river {card_name(r['turn_river'][0])} {card_name(r['turn_river'][1])}  "
+                  f"hero {r['hero_score']:>4}  dealer {r['dealer_score']:>4}  "
+                  f"{'qualifies' if r['qualifies'] else 'no qualify'}")
+    elif args.command == "replay":
+        totals, mismatches = replay(args.trace)
+        print_summary(totals)
+        if mismatches:
+            print(f"{len(mismatches)} records score differently now, first at {mismatches[0]}")
+        else:
+            print("every record scores as recorded")
+    else:
+        try:
+            paytable = load_paytable(args.paytable)
+        except (OSError, ValueError) as e:
+            sys.exit(f"Error: {e}")
+        print_summary(reprice(args.traces, paytable))
+
+if __name__ == "__main__":
+    main()
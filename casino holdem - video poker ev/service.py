@@ -0,0 +1,333 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+import argparse
+import asyncio
+import json
+import multiprocessing
+import time
+
+from module_loader import load_hand_bonus
+import engines
+import exact_ev
+import query_log
+
+#   Local HTTP/JSON service around the engines, so other tools on this host
+#   can ask for a spot without starting Python per hand.
+#
+#   POST /query    {"hero": "As Kd", "flop": "2c Jh 9s", "engine": "exact",
+#                   "simulations": 10000}  ->  the usual result dict
+#   GET  /metrics  counters, latency percentiles, throughput, queue depth
+#   GET  /health   {"ok": true}
+#
+#   Identical in-flight queries are answered once, and so are isomorphic
+#   ones (same canonical suit pattern), the way engines' result cache keys
+#   them; finished answers stay in that cache.  Queries that do need work
+#   are collected for a few milliseconds and sent to a process pool one job
+#   per query, except exact queries on the same flop, which go to one
+#   worker together so they share its FlopIndex.  When more than
+#   --max-queue queries are waiting, new ones get 503 with Retry-After
+#   instead of piling up.
+#
+#   Every query is logged to query_log.jsonl, and at startup the --prewarm
+#   most asked spots are computed on the pool into the cache (within
+#   --prewarm-seconds and --prewarm-mb), so they are hits from the start.
+#
+#   run with
+#
+#   python3 service.py --port 8765
+#   curl -s localhost:8765/query -d '{"hero": "As Kd", "flop": "2c Jh 9s"}'
+
+hand_bonus = load_hand_bonus()
+
+# Engines a query may ask for; the service does its own caching, and the
+# parallel engine would nest a pool inside the pool
+SERVICE_ENGINES = [mode for mode in engines.available_engines() if mode not in ('cached', 'parallel')]
+MAX_SIMULATIONS = 10_000_000
+# How long the batcher waits for more queries to join a batch
+BATCH_WINDOW = 0.005
+BATCH_SIZE = 16
+LATENCY_WINDOW = 1000
+
+def batch_group(engine, flop_cards):
+    # Queries with the same group run on one worker, one after another.
+    # Only exact queries on the same flop gain from that (the second one
+    # reuses the first one's FlopIndex); everything else is its own job.
+    if engine == 'exact':
+        return tuple(sorted(exact_ev.card_index(c) for c in flop_cards))
+    return None
+
+def _answer_batch(queries):
+    # Runs in a pool worker: one result (or error) per (engine, hero, flop, options)
+    answers = []
+    for engine, hero_str, flop_str, options in queries:
+        try:
+            answers.append(engines.run_engine(engine, hero_str, flop_str, **dict(options)))
+        except Exception as e:
+            answers.append({'error': str(e)})
+    return answers
+
+def _worker_init():
+    engines.prepare('exact')
+
+class Metrics:
+    def __init__(self):
+        self.started = time.time()
+        self.requests = 0
+        self.computed = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+        self.rejected = 0
+        self.errors = 0
+        self.batches = 0
+        self.batched_queries = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.finished = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, seconds):
+        self.latencies.append(seconds)
+        self.finished.append(time.time())
+
+    def snapshot(self, queue_depth, in_flight):
+        ordered = sorted(self.latencies)
+
+        def pct(p):
+            return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000 if ordered else None
+
+        now = time.time()
+        recent = [t for t in self.finished if now - t <= 60]
+        return {
+            'uptime_s': now - self.started,
+            'requests': self.requests,
+            'computed': self.computed,
+            'coalesced': self.coalesced,
+            'cache_hits': self.cache_hits,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'batches': self.batches,
+            'mean_batch_size': self.batched_queries / self.batches if self.batches else None,
+            'queue_depth': queue_depth,
+            'in_flight': in_flight,
+            'p50_ms': pct(50),
+            'p99_ms': pct(99),
+            'requests_per_second_60s': len(recent) / 60,
+        }
+
+class Overloaded(Exception):
+    pass
+
+class AnalyzerService:
+    def __init__(self, processes=None, max_queue=256):
+        self.processes = processes or multiprocessing.cpu_count()
+        self.pool = ProcessPoolExecutor(self.processes, initializer=_worker_init)
+        self.queue = asyncio.Queue(max_queue)
+        self.in_flight = {}
+        self.running = asyncio.Semaphore(self.processes)
+        self.metrics = Metrics()
+        self.batcher = None
+        self.prewarming = None
+
+    def start(self):
+        self.batcher = asyncio.get_running_loop().create_task(self._batch_loop())
+
+    async def close(self):
+        self.batcher.cancel()
+        self.pool.shutdown(cancel_futures=True)
+
+    def _prewarm_one(self, engine, hero_str, flop_str, options):
+        # Prewarm's compute: runs on the pool like any other query
+        if engine not in SERVICE_ENGINES:
+            return {'error': f"engine {engine} isn't served"}
+        return self.pool.submit(_answer_batch, [(engine, hero_str, flop_str, options)]).result()[0]
+
+    def prewarm(self, top, seconds, max_bytes):
+        self.prewarming = query_log.start_prewarm(top, seconds, max_bytes, compute=self._prewarm_one)
+
+    async def query(self, engine, hero_str, flop_str, options):
+        hero_cards, flop_cards = hand_bonus.parse_hand(hero_str, flop_str)
+        # Same key as engines.casino_holdem_cached: the seed doesn't matter
+        key = query_log.cache_key(engine, options, hero_cards, flop_cards)
+        query_log.record(engine, options, hero_cards, flop_cards)
+        results = engines.result_cache.get(key)
+        if results is not None:
+            self.metrics.cache_hits += 1
+            return results
+        if key in self.in_flight:
+            self.metrics.coalesced += 1
+            return await asyncio.shield(self.in_flight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait(((engine, hero_str, flop_str, options), batch_group(engine, flop_cards), future))
+        except asyncio.QueueFull:
+            self.metrics.rejected += 1
+            raise Overloaded()
+        self.in_flight[key] = future
+        try:
+            results = await future
+        finally:
+            del self.in_flight[key]
+        if 'error' not in results:
+            engines.result_cache.put(key, results)
+        return results
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + BATCH_WINDOW
+            while len(batch) < BATCH_SIZE:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            groups = {}
+            for n, (query, group, future) in enumerate(batch):
+                groups.setdefault(n if group is None else group, []).append((query, future))
+            for jobs in groups.values():
+                # At most one job per worker in flight, so the queue (and
+                # with it the backpressure) builds up here rather than in
+                # the pool
+                await self.running.acquire()
+                loop.create_task(self._run_batch(jobs))
+
+    async def _run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        self.metrics.batches += 1
+        self.metrics.batched_queries += len(batch)
+        try:
+            answers = await loop.run_in_executor(self.pool, _answer_batch, [q for q, _ in batch])
+        except Exception as e:
+            answers = [{'error': str(e)}] * len(batch)
+        finally:
+            self.running.release()
+        self.metrics.computed += len(batch)
+        for (_, future), answer in zip(batch, answers):
+            if not future.done():
+                future.set_result(answer)
+
+    async def handle(self, method, path, body):
+        # Returns (status, payload, extra headers)
+        route = urlsplit(path).path
+        if method == 'GET' and route == '/health':
+            return 200, {'ok': True}, {}
+        if method == 'GET' and route == '/metrics':
+            snapshot = self.metrics.snapshot(self.queue.qsize(), len(self.in_flight))
+            if self.prewarming is not None:
+                snapshot['prewarmed'] = self.prewarming.warmed
+            return 200, snapshot, {}
+        if route != '/query':
+            return 404, {'error': f"no route {method} {route}"}, {}
+        if method != 'POST':
+            return 405, {'error': "POST a JSON query to /query"}, {}
+
+        start = time.perf_counter()
+        self.metrics.requests += 1
+        try:
+            request = json.loads(body or b'{}')
+            engine, hero_str, flop_str, options = parse_query(request)
+            results = await self.query(engine, hero_str, flop_str, options)
+        except Overloaded:
+            return 503, {'error': "too many queued queries, retry shortly"}, {'Retry-After': '1'}
+        except (ValueError, KeyError, TypeError) as e:
+            self.metrics.errors += 1
+            return 400, {'error': str(e)}, {}
+        self.metrics.record(time.perf_counter() - start)
+        if 'error' in results:
+            self.metrics.errors += 1
+            return 400, results, {}
+        return 200, results, {}
+
+def parse_query(request):
+    if not isinstance(request, dict):
+        raise ValueError("The query must be a JSON object.")
+    engine = request.get('engine', 'exact')
+    if engine not in SERVICE_ENGINES:
+        raise ValueError(f"engine must be one of {', '.join(SERVICE_ENGINES)}")
+    hero_str, flop_str = request['hero'], request['flop']
+    if not isinstance(hero_str, str) or not isinstance(flop_str, str):
+        raise ValueError("hero and flop must be strings of cards, e.g. \"As Kd\" and \"2c Jh 9s\"")
+    hand_bonus.parse_hand(hero_str, flop_str)
+    options = []
+    if engine != 'exact':
+        simulations = int(request.get('simulations', 10000))
+        if not 1 <= simulations <= MAX_SIMULATIONS:
+            raise ValueError(f"simulations must be between 1 and {MAX_SIMULATIONS}")
+        options.append(('simulations', simulations))
+        if request.get('seed') is not None:
+            options.append(('seed', int(request['seed'])))
+    return engine, hero_str, flop_str, tuple(options)
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 503: 'Service Unavailable'}
+MAX_BODY = 1 << 16
+
+async def serve_connection(service, reader, writer):
+    # Minimal HTTP/1.1 with keep-alive: request line, headers, Content-Length body
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                break
+            method, path, _ = request_line.decode('latin-1').split(' ', 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length', 0))
+            if length > MAX_BODY:
+                status, payload, extra = 413, {'error': "query too large"}, {}
+                body = b''
+            else:
+                body = await reader.readexactly(length) if length else b''
+                status, payload, extra = await service.handle(method, path, body)
+            data = json.dumps(payload).encode()
+            head = [f"HTTP/1.1 {status} {REASONS[status]}", "Content-Type: application/json",
+                    f"Content-Length: {len(data)}"] + [f"{k}: {v}" for k, v in extra.items()]
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + data)
+            await writer.drain()
+            if headers.get('connection', '').lower() == 'close' or length > MAX_BODY:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+async def run(host, port, processes, max_queue, prewarm=0, prewarm_seconds=0.0, prewarm_bytes=0):
+    service = AnalyzerService(processes, max_queue)
+    service.start()
+    query_log.enable()
+    if prewarm:
+        service.prewarm(prewarm, prewarm_seconds, prewarm_bytes)
+    server = await asyncio.start_server(lambda r, w: serve_connection(service, r, w), host, port)
+    print(f"listening on http://{host}:{port} ({service.processes} workers)", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Local HTTP/JSON service for the Casino Hold'em engines")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--processes", type=int)
+    parser.add_argument("--max-queue", type=int, default=256, help="queued queries before answering 503")
+    parser.add_argument("--prewarm", type=int, default=query_log.PREWARM_TOP, help="most asked spots to pre-warm (0: none)")
+    parser.add_argument("--prewarm-seconds", type=float, default=query_log.PREWARM_SECONDS)
+    parser.add_argument("--prewarm-mb", type=float, default=query_log.PREWARM_BYTES / (1 << 20))
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args.host, args.port, args.processes, args.max_queue,
+                        args.prewarm, args.prewarm_seconds, args.prewarm_mb * (1 << 20)))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
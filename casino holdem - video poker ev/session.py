@@ -0,0 +1,157 @@
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import os
+import time
+
+from module_loader import HERE, load_hand_bonus
+import decision_model
+import engines
+import exact_ev
+import planner
+import query_log
+
+#   Interactive session: one long-lived process answers hand after hand, so
+#   the interpreter, treys, the lookup tables, compiled kernels, the planner's
+#   cost model and the result cache are paid for once.
+#
+#   As soon as the hole cards are in, the exact preflop bonus EV (it only
+#   depends on them) is worked out in a low-priority worker process while
+#   the flop is being typed, so it doesn't hold the GIL or the CPU the flop
+#   answer needs.  The flop answer comes from planner.py within a deadline
+#   and is printed at once; the bonus line follows as soon as it is ready
+#   (a few seconds for a new starting hand), even at the next prompt.  A
+#   preflop_bonus.json from `exact_ev.py preflop-bonus --json` is loaded if
+#   present and turns the bonus into a lookup.  Likewise a decision_table.py from
+#   `decision_model.py build` gives the call/fold answer before the engine
+#   has run.  Every spot asked is logged to query_log.jsonl, and at startup
+#   the most asked ones are worked out exactly in the background (within
+#   --prewarm-seconds), so common hands are answered from the cache.
+#
+#   Enter the hole cards, then the flop, or all five cards on one line.  A
+#   blank line or "q" quits.
+#
+#   run with
+#
+#   python3 session.py
+#   python3 session.py --deadline-ms 500
+
+hand_bonus = load_hand_bonus()
+
+PREFLOP_TABLE = os.path.join(HERE, "preflop_bonus.json")
+# Niceness of the preflop bonus worker
+BONUS_NICE = 10
+
+def warm_up():
+    # Flop-independent state: evaluator tables, kernels, the cost model
+    exact_ev.get_evaluator()
+    if exact_ev.np is not None:
+        exact_ev.get_vector_evaluator()
+    planner.get_model()
+    decision_model.load_table()
+
+def _bonus_worker_init():
+    if hasattr(os, 'nice'):
+        os.nice(BONUS_NICE)
+    if exact_ev.np is not None:
+        exact_ev.get_vector_evaluator()
+    if os.path.exists(PREFLOP_TABLE):
+        exact_ev.load_preflop_bonus(PREFLOP_TABLE)
+
+# The prompt input() is waiting at, so a late bonus line can show it again
+_prompt = ""
+
+def read_cards(prompt, counts):
+    global _prompt
+    _prompt = prompt.lstrip("\n")
+    line = input(prompt).strip()
+    if line.lower() in ("", "q", "quit", "exit"):
+        return None
+    cards = line.split()
+    if len(cards) not in counts:
+        raise ValueError(f"Enter {' or '.join(map(str, counts))} cards.")
+    return cards
+
+def parse_hole(cards):
+    hero_cards = [hand_bonus.parse_card(c) for c in cards]
+    if len(set(hero_cards)) != 2:
+        raise ValueError("Duplicate cards detected.")
+    return hero_cards
+
+def print_bonus(hero_str, bonus):
+    print(f"  Bonus bet on {hero_str} (exact, preflop): {bonus['bonus_ev']:+.4f} EV, {bonus['bonus_hit_rate']:.2f}% hit"
+          f"  -> {'PLACE BONUS BET' if bonus['bonus_ev'] > -1 else 'SKIP BONUS BET'}")
+
+def print_late_bonus(hero_str, future):
+    # Runs on the executor's thread once the bonus is in, usually while the
+    # next prompt is waiting
+    if not future.cancelled() and future.exception() is None:
+        print()
+        print_bonus(hero_str, future.result())
+        print(_prompt, end="", flush=True)
+
+def print_answer(results):
+    served = results['served_by']
+    low, high = results['call_minus_fold_ci95']
+    print(f"  Ante EV:          {results['ante_ev']:+.4f} ± {planner.half_width(results, 'ante'):.4f}")
+    print(f"  Play EV:          {results['play_ev']:+.4f} ± {planner.half_width(results, 'play'):.4f}")
+    print(f"  Call minus Fold:  {results['call_minus_fold']:+.4f}  [{low:+.4f}, {high:+.4f}]")
+    print(f"  Recommendation:   {results['recommendation']}")
+    print(f"  ({served['path']}, {served['trials']} trials, {served['elapsed_ms']:.0f} ms)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Interactive Casino Hold'em session with warm state")
+    parser.add_argument("--deadline-ms", type=float, default=250, help="time allowed per flop answer")
+    parser.add_argument("--precision", type=float, help="95%% half-width wanted on call minus fold")
+    parser.add_argument("--prewarm", type=int, default=query_log.PREWARM_TOP, help="most asked spots to pre-warm (0: none)")
+    parser.add_argument("--prewarm-seconds", type=float, default=query_log.PREWARM_SECONDS)
+    parser.add_argument("--prewarm-mb", type=float, default=query_log.PREWARM_BYTES / (1 << 20))
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    print("Warming up...", end="", flush=True)
+    warm_up()
+    query_log.enable()
+    if args.prewarm:
+        query_log.start_prewarm(args.prewarm, args.prewarm_seconds, args.prewarm_mb * (1 << 20))
+    print(f" ready in {time.perf_counter() - start:.1f} s.  Blank line or 'q' quits.")
+
+    background = ProcessPoolExecutor(max_workers=1, initializer=_bonus_worker_init)
+    try:
+        while True:
+            try:
+                cards = read_cards("\nhole> ", (2, 5))
+                if cards is None:
+                    break
+                hero_str = " ".join(cards[:2])
+                # Starts at once; the flop is typed while it runs
+                bonus = background.submit(exact_ev.preflop_bonus, parse_hole(cards[:2]))
+                if len(cards) == 5:
+                    flop_str = " ".join(cards[2:])
+                else:
+                    flop = read_cards("flop> ", (3,))
+                    if flop is None:
+                        break
+                    flop_str = " ".join(flop)
+                hero_cards, flop_cards = hand_bonus.parse_hand(hero_str, flop_str)
+                # Logged under the exact engine's key, the answer the planner serves from the cache
+                query_log.record("exact", (), hero_cards, flop_cards)
+                instant = decision_model.lookup(hero_cards, flop_cards)
+                if instant is not None:
+                    print(f"  Distilled model:  {instant}")
+                results = planner.casino_holdem_auto(hero_str, flop_str, args.precision, args.deadline_ms)
+                print_answer(results)
+                if bonus.done():
+                    print_bonus(hero_str, bonus.result())
+                else:
+                    print(f"  Bonus bet on {hero_str}: still being worked out, printed when ready")
+                    bonus.add_done_callback(lambda f, hero_str=hero_str: print_late_bonus(hero_str, f))
+            except ValueError as e:
+                print(f"  Error: {e}")
+    except (EOFError, KeyboardInterrupt):
+        print()
+    finally:
+        background.shutdown(wait=False, cancel_futures=True)
+        engines.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import decision_model
+import exact_ev
+
+#   Splitting the long whole-game jobs over several machines.
+#
+#   plan    writes a manifest: the job, and the canonical flops cut into
+#           numbered shards of consecutive flops (every hole of a flop stays
+#           in one shard, so each node keeps its FlopIndex warm).  The
+#           manifest carries a fingerprint of the flop list and the cuts, so
+#           a node running different code can't slip in a partial.
+#   work    runs some shards of a manifest and writes one partial file per
+#           shard (job, fingerprint, shard, flop range, integer results,
+#           host, time taken).  Files are written whole or not at all, and
+#           shards that already have a partial are skipped, so a node can be
+#           restarted.
+#   merge   checks the partials against the manifest (every shard present
+#           once, same fingerprint, same flop ranges) and adds them up.  The
+#           partials hold integer sums (house-edge) or the exact per-spot
+#           decisions (decision-table), so the merged result is the same,
+#           bit for bit, as one machine doing the whole job.
+#   local   runs every shard on local processes standing in for nodes, then
+#           merges.
+#
+#   Copy the manifest to each node, run `work` with that node's shard ids,
+#   collect the partial files in one directory and merge.
+#
+#   run with
+#
+#   python3 shards.py plan house-edge --shards 64 --manifest edge.json
+#   python3 shards.py work edge.json --shards 0 1 2 3 --output-dir parts
+#   python3 shards.py merge edge.json parts
+#   python3 shards.py local edge.json --nodes 4 --output-dir parts
+
+MANIFEST_FORMAT = 1
+JOBS = ("house-edge", "decision-table")
+
+def fingerprint(job, flops, shards):
+    text = json.dumps({'job': job, 'flops': flops, 'shards': shards}, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+def plan(job, shard_count, max_flops=None):
+    if job not in JOBS:
+        raise ValueError(f"Unknown job {job!r}; pick one of {', '.join(JOBS)}")
+    flops = exact_ev.canonical_flops()
+    if max_flops is not None:
+        flops = flops[:max_flops]
+    shard_count = max(1, min(shard_count, len(flops)))
+    cuts = [len(flops) * i // shard_count for i in range(shard_count + 1)]
+    shards = [{'id': i, 'start': cuts[i], 'stop': cuts[i + 1]} for i in range(shard_count)]
+    return {
+        'format': MANIFEST_FORMAT,
+        'job': job,
+        'canonical_flops': len(flops),
+        'max_flops': max_flops,
+        'fingerprint': fingerprint(job, flops, shards),
+        'shards': shards,
+    }
+
+def load_manifest(path):
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != MANIFEST_FORMAT:
+        raise ValueError(f"{path}: not a format {MANIFEST_FORMAT} manifest")
+    return manifest
+
+def manifest_flops(manifest):
+    # The manifest's flops, checked against this machine's code
+    flops = exact_ev.canonical_flops()
+    if manifest['max_flops'] is not None:
+        flops = flops[:manifest['max_flops']]
+    if fingerprint(manifest['job'], flops, manifest['shards']) != manifest['fingerprint']:
+        raise ValueError("Manifest fingerprint doesn't match this code's canonical flops")
+    return flops
+
+def partial_path(output_dir, manifest, shard_id):
+    return os.path.join(output_dir, f"{manifest['job']}-{manifest['fingerprint'][:12]}-{shard_id:05d}.json")
+
+def shard_result(job, flops, processes=None):
+    # Exact, JSON-ready result for some flops
+    if job == "house-edge":
+        return exact_ev.house_edge_sums(flops, processes)
+    covered, rows = decision_model.decision_rows(flops, processes)
+    return {'flops': covered, 'rows': rows}
+
+def work(manifest, shard_ids, output_dir, processes=None):
+    flops = manifest_flops(manifest)
+    os.makedirs(output_dir, exist_ok=True)
+    shards = {s['id']: s for s in manifest['shards']}
+    written = []
+    for shard_id in shard_ids:
+        if shard_id not in shards:
+            raise ValueError(f"No shard {shard_id} in the manifest (0-{len(shards) - 1})")
+        path = partial_path(output_dir, manifest, shard_id)
+        if os.path.exists(path):
+            continue
+        shard = shards[shard_id]
+        start = time.time()
+        result = shard_result(manifest['job'], flops[shard['start']:shard['stop']], processes)
+        partial = {
+            'format': MANIFEST_FORMAT,
+            'job': manifest['job'],
+            'fingerprint': manifest['fingerprint'],
+            'shard': shard_id,
+            'start': shard['start'],
+            'stop': shard['stop'],
+            'host': platform.node(),
+            'elapsed_seconds': time.time() - start,
+            'result': result,
+        }
+        # Written under a temporary name and renamed, so a killed worker
+        # never leaves a partial that looks complete
+        with open(path + ".tmp", "w") as f:
+            json.dump(partial, f)
+        os.replace(path + ".tmp", path)
+        written.append(path)
+    return written
+
+def load_partials(manifest, paths):
+    # The partials for the manifest, one per shard; raises on anything
+    # missing, duplicated or from another manifest
+    by_shard = {}
+    duplicates = []
+    for path in paths:
+        with open(path) as f:
+            partial = json.load(f)
+        if partial.get('job') != manifest['job'] or partial.get('fingerprint') != manifest['fingerprint']:
+            raise ValueError(f"{path}: belongs to another manifest")
+        if not 0 <= partial['shard'] < len(manifest['shards']):
+            raise ValueError(f"{path}: no shard {partial['shard']} in the manifest")
+        shard = manifest['shards'][partial['shard']]
+        if (partial['start'], partial['stop']) != (shard['start'], shard['stop']):
+            raise ValueError(f"{path}: flop range doesn't match shard {shard['id']}")
+        if partial['shard'] in by_shard:
+            duplicates.append(partial['shard'])
+        by_shard[partial['shard']] = partial
+    missing = [s['id'] for s in manifest['shards'] if s['id'] not in by_shard]
+    if duplicates or missing:
+        raise ValueError(f"Duplicate shards: {sorted(set(duplicates)) or 'none'}; missing shards: {missing or 'none'}")
+    return [by_shard[s['id']] for s in manifest['shards']]
+
+def merge(manifest, paths, output=None):
+    partials = load_partials(manifest, paths)
+    results = [p['result'] for p in partials]
+    if manifest['job'] == "house-edge":
+        results = exact_ev.house_edge_results(exact_ev.merge_house_edge_sums(results), manifest['canonical_flops'])
+        exact_ev.print_house_edge(results)
+        return results
+    rows = [(tuple(features), calls, weight) for r in results for features, calls, weight in r['rows']]
+    covered = sorted(tuple(flop) for r in results for flop in r['flops'])
+    output = output or decision_model.TABLE_PATH
+    tree, stats, holdout = decision_model.distil(rows, None if manifest['max_flops'] is None else covered, output)
+    decision_model.print_build(tree, stats, holdout, len(rows), output)
+    return tree
+
+def partial_files(output_dir, manifest):
+    return sorted(glob.glob(os.path.join(output_dir, f"{manifest['job']}-{manifest['fingerprint'][:12]}-*.json")))
+
+def run_local(manifest_path, nodes, output_dir, output=None):
+    # One worker process per node, each with every nodes-th shard
+    manifest = load_manifest(manifest_path)
+    ids = [s['id'] for s in manifest['shards']]
+    workers = [subprocess.Popen([sys.executable, os.path.abspath(__file__), "work", manifest_path,
+                                 "--output-dir", output_dir, "--processes", "1", "--shards"] +
+                                [str(i) for i in ids[node::nodes]])
+               for node in range(nodes) if ids[node::nodes]]
+    failed = sum(worker.wait() != 0 for worker in workers)
+    if failed:
+        raise RuntimeError(f"{failed} of {len(workers)} workers failed")
+    return merge(manifest, partial_files(output_dir, manifest), output)
+
+def main():
+    parser = argparse.ArgumentParser(description="Shard the whole-game jobs over several machines")
+    commands = parser.add_subparsers(dest="command", required=True)
+    plan_cmd = commands.add_parser("plan", help="write a shard manifest")
+    plan_cmd.add_argument("job", choices=JOBS)
+    plan_cmd.add_argument("--shards", type=int, default=64)
+    plan_cmd.add_argument("--max-flops", type=int, help="only the first N canonical flops (for testing)")
+    plan_cmd.add_argument("--manifest", required=True)
+    work_cmd = commands.add_parser("work", help="run some shards, writing one partial file each")
+    work_cmd.add_argument("manifest")
+    work_cmd.add_argument("--shards", type=int, nargs="+", required=True)
+    work_cmd.add_argument("--output-dir", default="parts")
+    work_cmd.add_argument("--processes", type=int)
+    merge_cmd = commands.add_parser("merge", help="check and combine the partial files")
+    merge_cmd.add_argument("manifest")
+    merge_cmd.add_argument("partials", nargs="+", help="partial files, or directories of them")
+    merge_cmd.add_argument("--output", help="decision table path (decision-table job)")
+    local_cmd = commands.add_parser("local", help="run every shard on local worker processes, then merge")
+    local_cmd.add_argument("manifest")
+    local_cmd.add_argument("--nodes", type=int, default=os.cpu_count())
+    local_cmd.add_argument("--output-dir", default="parts")
+    local_cmd.add_argument("--output", help="decision table path (decision-table job)")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "plan":
+            manifest = plan(args.job, args.shards, args.max_flops)
+            with open(args.manifest, "w") as f:
+                json.dump(manifest, f, indent=2)
+            print(f"{len(manifest['shards'])} shards over {manifest['canonical_flops']} canonical flops "
+                  f"-> {args.manifest}")
+        elif args.command == "work":
+            work(load_manifest(args.manifest), args.shards, args.output_dir, args.processes)
+        elif args.command == "merge":
+            manifest = load_manifest(args.manifest)
+            paths = []
+            for path in args.partials:
+                paths += partial_files(path, manifest) if os.path.isdir(path) else [path]
+            merge(manifest, paths, args.output)
+        else:
+            run_local(args.manifest, args.nodes, args.output_dir, args.output)
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
+
+if __name__ == "__main__":
+    main()
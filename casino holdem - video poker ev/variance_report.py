@@ -0,0 +1,80 @@
+import argparse
+import math
+import random
+
+from module_loader import load_hand_bonus
+
+#   Measures how much sampling noise each sampling method leaves, by running
+#   the same spot many times and taking the spread of the estimates.  The
+#   spread is scaled to one trial (sd * sqrt(trials)) so methods that round
+#   the trial count differently still compare fairly.  A reduction factor of
+#   k (columns after the sds, against uniform) means the same precision
+#   with k^2 times fewer trials.
+#
+#   run with
+#
+#   python3 variance_report.py "As Kd" "2c Jh 9s" --simulations 5000 --replicates 40
+
+hand_bonus = load_hand_bonus()
+
+METHODS = ["uniform", "stratified", "importance"]
+
+def _fields(results):
+    return {
+        'ante_ev': results['ante_ev'],
+        'play_ev': results['play_ev'],
+        'bonus_ev': results['bonus_ev'],
+        'call_minus_fold': results['call_ev_with_bonus'] - results['fold_ev_with_bonus'],
+        'bonus_hit_rate': results['bonus_hit_rate'] / 100,
+    }
+
+def per_trial_sd(hero_str, flop_str, simulations, replicates, sampling, seed):
+    random.seed(seed)
+    hero_cards, flop_cards = hand_bonus.parse_hand(hero_str, flop_str)
+    runs = []
+    trials = simulations
+    for _ in range(replicates):
+        if sampling == "stratified":
+            totals = hand_bonus.run_stratified_simulations(hero_cards, flop_cards, simulations)
+        elif sampling == "importance":
+            totals, _ = hand_bonus.run_importance_simulations(hero_cards, flop_cards, simulations)
+        else:
+            totals = hand_bonus.run_simulations(hero_cards, flop_cards, simulations)
+        trials = totals['trials']
+        runs.append(_fields(hand_bonus.results_from_totals(totals)))
+    sds = {}
+    for field in runs[0]:
+        values = [r[field] for r in runs]
+        mean = sum(values) / len(values)
+        sd = math.sqrt(sum((v - mean) ** 2 for v in values) / (len(values) - 1))
+        sds[field] = sd * math.sqrt(trials)
+    return trials, sds
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-trial standard error of each sampling method")
+    parser.add_argument("hero")
+    parser.add_argument("flop")
+    parser.add_argument("--simulations", type=int, default=5000)
+    parser.add_argument("--replicates", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    report = {}
+    for method in METHODS:
+        report[method] = per_trial_sd(args.hero, args.flop, args.simulations, args.replicates, method, args.seed)
+
+    base_trials, base = report["uniform"]
+    others = METHODS[1:]
+    print(f"{'field':16}" + "".join(f"{m + ' sd/trial':>22}" for m in METHODS)
+          + "".join(f"{m[:10] + ' x':>14}" for m in others))
+    for field in base:
+        row = f"{field:16}" + "".join(f"{report[m][1][field]:>22.4f}" for m in METHODS)
+        for m in others:
+            sd = report[m][1][field]
+            # Anything below float rounding noise means the method removed the variance
+            row += f"{base[field] / sd:>13.1f}x" if sd > 1e-4 * base[field] + 1e-9 else f"{'exact':>14}"
+        print(row)
+    print(f"\ntrials per run: " + ", ".join(f"{m} {report[m][0]}" for m in METHODS))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+from treys import Evaluator
+import itertools
+import numpy as np
+
+#   NumPy version of treys' Evaluator for scoring many hands at once.
+#   Scores are bit-for-bit the same as evaluator.evaluate(board, hand):
+#   every 5-card subset is looked up by its prime product in the treys
+#   tables and the best (lowest) score wins.
+
+MAX_HIGH_CARD = 7462
+
+# 5-card subsets for each supported hand size
+COMBINATIONS = {k: np.array(list(itertools.combinations(range(k), 5))) for k in (5, 6, 7)}
+
+def _sorted_table(lookup):
+    keys = np.array(sorted(lookup), dtype=np.int64)
+    scores = np.array([lookup[k] for k in keys.tolist()], dtype=np.int64)
+    return keys, scores
+
+class VectorEvaluator:
+    def __init__(self, evaluator=None):
+        table = (evaluator or Evaluator()).table
+        self.flush_keys, self.flush_scores = _sorted_table(table.flush_lookup)
+        self.unsuited_keys, self.unsuited_scores = _sorted_table(table.unsuited_lookup)
+
+    def _lookup(self, keys, scores, primes):
+        # Products that aren't in the table (e.g. a masked-out hand holding the
+        # same card twice) just get clipped to a valid slot
+        idx = np.minimum(np.searchsorted(keys, primes), len(keys) - 1)
+        return scores[idx]
+
+    def evaluate(self, cards):
+        # cards: (n, k) array of treys card ints, 5 <= k <= 7
+        cards = np.asarray(cards, dtype=np.int64)
+        primes = cards & 0xFF
+        suits = cards & 0xF000
+        best = np.full(cards.shape[0], MAX_HIGH_CARD, dtype=np.int64)
+        for combo in COMBINATIONS[cards.shape[1]]:
+            a, b, c, d, e = combo
+            product = primes[:, a] * primes[:, b] * primes[:, c] * primes[:, d] * primes[:, e]
+            flush = (suits[:, a] & suits[:, b] & suits[:, c] & suits[:, d] & suits[:, e]) != 0
+            score = np.where(flush,
+                             self._lookup(self.flush_keys, self.flush_scores, product),
+                             self._lookup(self.unsuited_keys, self.unsuited_scores, product))
+            np.minimum(best, score, out=best)
+        return best